@@ -3,19 +3,100 @@
 # Check if any input files provided
 if [ $# -eq 0 ]; then
     echo "Usage: $0 <file1.gpg> [file2.gpg] [file3.gpg] ..."
+    echo "Set TRACE_START, optionally TRACE_END, and UART_LOG to only decode the trace"
+    echo "captured between those UART log milestones"
     exit 1
 fi
 
+# Decompress a .gz or .zst trace into $2. When the "<trace>.frames" index written
+# by TraceWriter is available, frames are decompressed in parallel.
+decompress_trace() {
+    local input=$1
+    local output=$2
+    local tool
+    case "$input" in
+        *.gz) tool="gzip -dc" ;;
+        *.zst) tool="zstd -dcq" ;;
+        *) return 1 ;;
+    esac
+
+    if [ ! -f "$input.frames" ]; then
+        $tool "$input" > "$output"
+        return
+    fi
+
+    local tmpdir
+    tmpdir=$(mktemp -d)
+    local jobs
+    jobs=$(nproc)
+    local n=0
+    while read -r offset length _; do
+        n=$((n + 1))
+        tail -c +$((offset + 1)) "$input" | head -c "$length" | $tool > "$tmpdir/$(printf '%08d' $n)" &
+        if (( n % jobs == 0 )); then
+            wait
+        fi
+    done < "$input.frames"
+    wait
+    # Data after the last complete frame (capture stopped mid frame)
+    local end=0
+    if [ $n -gt 0 ]; then
+        end=$(tail -n 1 "$input.frames" | awk '{print $1 + $2}')
+    fi
+    if [ "$(stat -c %s "$input")" -gt "$end" ]; then
+        tail -c +$((end + 1)) "$input" | $tool > "$tmpdir/$(printf '%08d' $((n + 1)))" 2>/dev/null || true
+    fi
+    cat "$tmpdir"/* > "$output"
+    rm -rf "$tmpdir"
+}
+
+TARGET_DIR=$(cd "$(dirname "$0")/../tests/on_target" && pwd)
+
+# Cut $1 down to the part captured between the TRACE_START and TRACE_END milestones
+# of UART_LOG, using the "<trace>.index" written by UartBinary
+extract_window() {
+    local binfile=$1
+    if [ -z "$TRACE_START" ] || [ ! -f "$binfile.index" ]; then
+        return
+    fi
+    local abs_bin abs_log
+    abs_bin=$(realpath "$binfile")
+    abs_log=$(realpath "$UART_LOG")
+    (cd "$TARGET_DIR" && python3 utils/trace_index.py "$abs_bin" --log "$abs_log" \
+        --start "$TRACE_START" ${TRACE_END:+--end "$TRACE_END"} -o "$abs_bin.window") \
+        && mv "$binfile.window" "$binfile"
+}
+
 # Process each input file
 for input_file in "$@"; do
+    case "$input_file" in
+        # Frame and time indexes are decrypted along with their trace
+        *.frames.gpg|*.index.gpg) continue ;;
+    esac
     echo "Processing: $input_file"
 
-    BINFILE=${input_file%.gpg}
-    PCAPNGFILE=${input_file%.gpg}.pcapng
+    DECRYPTED=${input_file%.gpg}
+    BINFILE=${DECRYPTED%.gz}
+    BINFILE=${BINFILE%.zst}
+    PCAPNGFILE=${BINFILE}.pcapng
 
-    rm -rf "$BINFILE" || true
+    rm -rf "$DECRYPTED" || true
 
-    gpg --decrypt --output "$BINFILE" "$input_file"
+    gpg --decrypt --output "$DECRYPTED" "$input_file"
+    # Kept for extracting milestone windows with utils/trace_index.py
+    if [ -f "$DECRYPTED.index.gpg" ]; then
+        gpg --decrypt --output "$DECRYPTED.index" "$DECRYPTED.index.gpg"
+    fi
+    if [ "$DECRYPTED" != "$BINFILE" ]; then
+        if [ -f "$DECRYPTED.frames.gpg" ]; then
+            gpg --decrypt --output "$DECRYPTED.frames" "$DECRYPTED.frames.gpg"
+        fi
+        decompress_trace "$DECRYPTED" "$BINFILE" && rm -f "$DECRYPTED" "$DECRYPTED.frames"
+        if [ -f "$DECRYPTED.index" ]; then
+            mv "$DECRYPTED.index" "$BINFILE.index"
+        fi
+    fi
+    extract_window "$BINFILE"
     nrfutil trace lte --input-file "$BINFILE" --output-pcapng "$PCAPNGFILE" && rm -rf "$BINFILE" || true
 
     echo "Completed: $PCAPNGFILE"
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+"""
+Compare boot to cloud benchmark results of two firmware versions.
+
+Both directories hold the outcomes/benchmark_<sample>.json files written by
+tests/test_benchmark. Exits with 1 if any phase got slower than the threshold allows.
+
+Run from tests/on_target:
+    python benchmarks/compare_boot_to_cloud.py baseline/ outcomes/ --threshold 0.2
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+sys.path.append(os.getcwd())
+from utils.benchmark import DEFAULT_REGRESSION_THRESHOLD, compare, load
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("baseline", help="Directory with the baseline results")
+    parser.add_argument("results", help="Directory with the new results")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Allowed slowdown as a fraction of the baseline")
+    args = parser.parse_args()
+
+    regressed = False
+    for path in sorted(glob.glob(os.path.join(args.results, "benchmark_*.json"))):
+        baseline_path = os.path.join(args.baseline, os.path.basename(path))
+        if not os.path.isfile(baseline_path):
+            print(f"{os.path.basename(path)}: no baseline")
+            continue
+        results, baseline = load(path), load(baseline_path)
+        print(f"{results['benchmark']}: {baseline.get('version')} -> {results.get('version')}")
+        for phase, stats in results["phases"].items():
+            base = baseline["phases"].get(phase)
+            before = f"{base['p50']:7.2f} s" if base else "      -  "
+            print(f"  {phase:<70} p50 {before} -> {stats['p50']:7.2f} s")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"  REGRESSION {regression}")
+        regressed = regressed or bool(regressions)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
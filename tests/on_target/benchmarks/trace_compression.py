@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+"""
+Measure on-disk size and CPU cost of modem trace compression.
+
+Feeds a trace through TraceWriter with every compression setting the way UartBinary
+does, and reports output size, compression ratio and CPU time.
+Without --input, a synthetic trace approximating an hour long FMFU run is generated:
+modem trace packets with a small header, sequence number and timestamp, and payloads
+mixing repeated protocol data with random bytes.
+
+Run from tests/on_target:
+    python benchmarks/trace_compression.py --input outcomes/trace_test_coap_mfw_full_fota.bin
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+import utils.uart
+from utils.uart import TraceWriter
+
+SETTINGS = ["gzip:1", "gzip:6", "gzip:9", "zstd:1", "zstd:3", "zstd:9"]
+
+
+def synthetic_trace(path: str, seconds: int, rate: int) -> None:
+    rng = random.Random(0)
+    templates = [rng.randbytes(rng.randint(16, 200)) for _ in range(64)]
+    with open(path, "wb") as f:
+        seq = 0
+        for second in range(seconds):
+            written = 0
+            while written < rate:
+                payload = bytearray(rng.choice(templates))
+                # Vary a part of each packet, like counters and measurements do
+                for i in rng.sample(range(len(payload)), len(payload) // 4):
+                    payload[i] = rng.randrange(256)
+                packet = struct.pack("<BHHI", 0xef, len(payload), seq & 0xffff,
+                                     second * 1000 + written % 1000) + payload
+                f.write(packet)
+                written += len(packet)
+                seq += 1
+
+
+def run(path: str, compression: str, outdir: str) -> dict:
+    writer = TraceWriter(os.path.join(outdir, "trace.bin"), compression=compression)
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    with open(path, "rb") as f:
+        while True:
+            buf = writer.get_buffer()
+            length = f.readinto(buf)
+            if not length:
+                break
+            writer.submit(buf, length)
+    writer.close()
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - cpu_start
+    size = os.path.getsize(writer.path)
+    os.remove(writer.path)
+    if writer.codec:
+        os.remove(writer.path + ".frames")
+    return {"size": size, "elapsed": elapsed, "cpu": cpu}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--input", help="Raw trace to compress instead of a synthetic one")
+    parser.add_argument("--seconds", type=int, default=3600, help="Synthetic trace length")
+    parser.add_argument("--rate", type=int, default=12000, help="Synthetic trace bytes/s")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as outdir:
+        path = args.input
+        if not path:
+            path = os.path.join(outdir, "synthetic.bin")
+            synthetic_trace(path, args.seconds, args.rate)
+        raw = os.path.getsize(path)
+        print(f"Input {raw / 1e6:.1f} MB")
+        for compression in [None] + SETTINGS:
+            if compression and compression.startswith("zstd") and utils.uart.zstandard is None:
+                print(f"{compression:>8}: skipped, zstandard not installed")
+                continue
+            result = run(path, compression, outdir)
+            print(f"{compression or 'raw':>8}: {result['size'] / 1e6:8.1f} MB "
+                  f"(ratio {raw / result['size']:5.2f}), cpu {result['cpu']:6.2f} s, "
+                  f"wall {result['elapsed']:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
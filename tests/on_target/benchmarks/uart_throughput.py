@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+"""
+Measure Uart read throughput and CPU usage.
+
+Synthetic debug log lines are written to a pseudo-terminal paced at the given baud rate
+(10 bits per byte). The legacy one byte per read thread is compared against the chunked
+reader on the serial engine. A pty applies backpressure instead of dropping data, so a reader that cannot
+keep up shows up as a lower effective rate than the target.
+
+Run from tests/on_target:
+    python benchmarks/uart_throughput.py --baudrate 1000000
+"""
+
+import argparse
+import logging
+import os
+import pty
+import sys
+import threading
+import time
+import tty
+
+import serial
+
+sys.path.append(os.getcwd())
+import utils.uart
+from utils.uart import Uart
+
+LINE = b"[00:01:02.345,678] <dbg> lte_link_control: at_handler: +CEREG: 5,\"8E0D\",\"01BF3B0B\",7\r\n"
+
+
+class ByteUart(Uart):
+    """Uart with the legacy reader thread: one blocking read and one decode per byte"""
+
+    # Read timeout of the legacy reader thread
+    serial_timeout = 1
+
+    def _open(self) -> None:
+        self._serial = serial.Serial(self.uart, baudrate=self.baudrate, timeout=self.serial_timeout)
+        self._t = threading.Thread(target=self._read_bytes, args=(self._serial,), daemon=True)
+        self._t.start()
+
+    def _close_port(self) -> None:
+        if self._serial is not None:
+            self._t.join()
+            self._serial.close()
+            self._serial = None
+
+    def _read_bytes(self, s: serial.Serial) -> None:
+        line = ""
+        while not self._evt.is_set():
+            try:
+                data = s.read(1).decode("utf-8")
+            except UnicodeDecodeError:
+                continue
+            if not data:
+                continue
+            line = line + data
+            if data != "\n":
+                continue
+            self._append_line(line.strip())
+            line = ""
+
+
+def feed(master_fd: int, total: int, baudrate: int) -> None:
+    # Write in 1 ms slices to approximate a UART running at 'baudrate'
+    bytes_per_slice = max(baudrate // 10 // 1000, 1)
+    data = LINE * (total // len(LINE))
+    start = time.monotonic()
+    for i in range(0, len(data), bytes_per_slice):
+        os.write(master_fd, data[i:i + bytes_per_slice])
+        delay = start + (i + bytes_per_slice) * 10 / baudrate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run(uart_cls, total: int, baudrate: int) -> dict:
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    uart = uart_cls(os.ttyname(slave_fd), name=uart_cls.__name__)
+    time.sleep(0.5)
+    lines = total // len(LINE)
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    feeder = threading.Thread(target=feed, args=(master_fd, total, baudrate))
+    feeder.start()
+    expected = lines * (len(LINE.strip()) + 1)
+    while uart.get_size() < expected and time.monotonic() - start < 600:
+        uart._wait_for_update(uart._log_gen, 1)
+    elapsed = time.monotonic() - start
+    feeder.join()
+    cpu = time.process_time() - cpu_start
+    received = uart.get_size()
+    uart.stop()
+    os.close(master_fd)
+    os.close(slave_fd)
+    return {"rate": received / elapsed, "cpu": cpu, "elapsed": elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--baudrate", type=int, default=1000000)
+    parser.add_argument("--bytes", type=int, default=1000000, help="Amount of data to send")
+    args = parser.parse_args()
+
+    # Per line debug logging would dominate the measurement
+    utils.uart.logger.setLevel(logging.INFO)
+
+    print(f"Target rate {args.baudrate // 10} B/s, {args.bytes} bytes")
+    for uart_cls in [ByteUart, Uart]:
+        result = run(uart_cls, args.bytes, args.baudrate)
+        print(f"{uart_cls.__name__:>9}: {result['rate']:10.0f} B/s, "
+              f"elapsed {result['elapsed']:.2f} s, cpu {result['cpu']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+"""
+Measure milestone detection latency of Uart waits.
+
+A recorded UART log is replayed over a pseudo-terminal while the main thread waits for
+a list of milestones. Each milestone's latency is the time from writing its line to the
+pty until the wait returns. The run is done once with the legacy once-per-second polling
+and once with the event-driven waits.
+
+Run from tests/on_target:
+    python benchmarks/uart_wait_latency.py
+"""
+
+import argparse
+import os
+import pty
+import statistics
+import sys
+import threading
+import time
+import tty
+
+sys.path.append(os.getcwd())
+from utils.uart import Uart
+
+DEFAULT_LOG = os.path.join(os.path.dirname(__file__), "data", "nrf_cloud_coap_device_message.log")
+DEFAULT_MILESTONES = [
+    "Connected to LTE",
+    "nrf_cloud_coap_transport: Authorized",
+    "Sent Hello World message with ID",
+]
+
+
+class PollingUart(Uart):
+    """Uart with the legacy fixed one second polling between log checks"""
+
+    def _wait_for_update(self, gen: int, timeout: float) -> None:
+        time.sleep(1)
+
+
+def replay(master_fd: int, lines: list, interval: float, written: dict) -> None:
+    for line in lines:
+        for msg in written:
+            if msg in line and written[msg] is None:
+                written[msg] = time.monotonic()
+        os.write(master_fd, line.encode("utf-8") + b"\r\n")
+        time.sleep(interval)
+
+
+def run(uart_cls, lines: list, milestones: list, interval: float) -> dict:
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    uart = uart_cls(os.ttyname(slave_fd), name=uart_cls.__name__)
+    # Let the reader thread open the port before the replay starts
+    time.sleep(0.5)
+    written = {msg: None for msg in milestones}
+    feeder = threading.Thread(target=replay, args=(master_fd, lines, interval, written))
+    cpu_start = time.process_time()
+    feeder.start()
+    latencies = []
+    try:
+        for msg in milestones:
+            uart.wait_for_str(msg, timeout=60)
+            latencies.append(time.monotonic() - written[msg])
+    finally:
+        feeder.join()
+        cpu = time.process_time() - cpu_start
+        uart.stop()
+        os.close(master_fd)
+        os.close(slave_fd)
+    return {"latencies": latencies, "cpu": cpu}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--log", default=DEFAULT_LOG, help="Recorded UART log to replay")
+    parser.add_argument("--interval", type=float, default=0.05, help="Delay between lines (s)")
+    parser.add_argument("--milestone", action="append", dest="milestones",
+                        help="Milestone string to wait for (repeatable)")
+    args = parser.parse_args()
+
+    with open(args.log, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    milestones = args.milestones or DEFAULT_MILESTONES
+
+    for uart_cls in [PollingUart, Uart]:
+        result = run(uart_cls, lines, milestones, args.interval)
+        latencies = result["latencies"]
+        print(f"{uart_cls.__name__}:")
+        for msg, latency in zip(milestones, latencies):
+            print(f"  {latency * 1000:9.2f} ms  {msg}")
+        print(f"  mean {statistics.mean(latencies) * 1000:.2f} ms, "
+              f"max {max(latencies) * 1000:.2f} ms, cpu {result['cpu']:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
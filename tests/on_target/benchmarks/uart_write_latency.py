@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+"""
+Measure Uart write-to-wire latency.
+
+Short commands are written through a pseudo-terminal while the device side stays silent,
+the worst case for the legacy reader thread that only looked at its write queue between
+blocking one byte reads. Latency is the time from write() until the bytes can be read on
+the other end of the pty. For Uart the time until write() reports the data as
+flushed is shown too.
+
+Run from tests/on_target:
+    python benchmarks/uart_write_latency.py --writes 20
+"""
+
+import argparse
+import logging
+import os
+import pty
+import queue
+import random
+import select
+import statistics
+import sys
+import threading
+import time
+import tty
+
+import serial
+
+sys.path.append(os.getcwd())
+import utils.uart
+from utils.uart import Uart
+
+
+class LegacyUart(Uart):
+    """Uart with the legacy reader thread that also serves the write queue between reads"""
+
+    # Read timeout of the legacy reader thread, set from --serial-timeout
+    serial_timeout = 1
+
+    def _open(self) -> None:
+        self._serial = serial.Serial(self.uart, baudrate=self.baudrate, timeout=self.serial_timeout)
+        self._legacy_writeq = queue.Queue()
+        self._t = threading.Thread(target=self._read_write, args=(self._serial,), daemon=True)
+        self._t.start()
+
+    def _close_port(self) -> None:
+        if self._serial is not None:
+            self._t.join()
+            self._serial.close()
+            self._serial = None
+
+    def write(self, data: bytes) -> None:
+        self._legacy_writeq.put(data)
+
+    def _read_write(self, s: serial.Serial) -> None:
+        line = b""
+        while not self._evt.is_set():
+            if not self._legacy_writeq.empty():
+                s.write(self._legacy_writeq.get_nowait())
+            data = s.read(1)
+            if not data:
+                continue
+            line += data
+            if data == b"\n":
+                self._append_line(line.decode("utf-8", errors="ignore").strip())
+                line = b""
+
+
+def wait_readable(master_fd: int, length: int) -> None:
+    received = 0
+    while received < length:
+        select.select([master_fd], [], [])
+        received += len(os.read(master_fd, length - received))
+
+
+def run(uart_cls, writes: int, serial_timeout: float) -> dict:
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    uart = uart_cls(os.ttyname(slave_fd), name=uart_cls.__name__)
+    time.sleep(0.5)
+    wire = []
+    flushed = []
+    for _ in range(writes):
+        # Random phase against the reader's read timeout
+        time.sleep(random.uniform(0.05, serial_timeout))
+        cmd = b"AT+CFUN?\r\n"
+        start = time.monotonic()
+        fut = uart.write(cmd)
+        wait_readable(master_fd, len(cmd))
+        wire.append(time.monotonic() - start)
+        if fut is not None:
+            flushed.append(fut.result(5) - start)
+    uart.stop()
+    os.close(master_fd)
+    os.close(slave_fd)
+    return {"wire": wire, "flushed": flushed}
+
+
+def describe(latencies: list) -> str:
+    ms = sorted(x * 1000 for x in latencies)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    return f"mean {statistics.mean(ms):8.2f} ms, p95 {p95:8.2f} ms, max {ms[-1]:8.2f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writes", type=int, default=20)
+    parser.add_argument("--serial-timeout", type=float, default=1,
+                        help="Read timeout of the legacy reader, 5 s for UartBinary")
+    args = parser.parse_args()
+
+    # Keep per write debug logging out of the measurement
+    utils.uart.logger.setLevel(logging.INFO)
+
+    LegacyUart.serial_timeout = args.serial_timeout
+    for uart_cls in [LegacyUart, Uart]:
+        result = run(uart_cls, args.writes, args.serial_timeout)
+        print(f"{uart_cls.__name__:>10} to wire: {describe(result['wire'])}")
+        if result["flushed"]:
+            print(f"{uart_cls.__name__:>10} flushed: {describe(result['flushed'])}")
+
+
+if __name__ == "__main__":
+    main()
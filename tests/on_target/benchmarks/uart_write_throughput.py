@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+"""
+Measure Uart.write_chunked throughput.
+
+A simulated device on the other end of a pseudo-terminal consumes data at the given baud
+rate (10 bits per byte) and echoes it back like the device shell does, or stays silent
+with --no-echo. The legacy fixed 16 byte chunks with 100 ms pauses are compared against
+the echo paced writer.
+
+Run from tests/on_target:
+    python benchmarks/uart_write_throughput.py --bytes 8192
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import pty
+import select
+import sys
+import threading
+import time
+import tty
+
+import serial
+
+sys.path.append(os.getcwd())
+import utils.uart
+from utils.uart import Uart
+
+
+class FixedChunkUart(Uart):
+    """Uart with the legacy write_chunked pacing"""
+
+    async def _write_paced(self, s: serial.Serial, data: bytes) -> None:
+        start = time.monotonic()
+        for i in range(0, len(data), 16):
+            await self._write_nonblocking(s, data[i:i + 16])
+            await asyncio.sleep(0.1)
+        self.write_throughput = len(data) / (time.monotonic() - start)
+
+
+def device(master_fd: int, baudrate: int, echo: bool, received: bytearray, stop: threading.Event) -> None:
+    while not stop.is_set():
+        if not select.select([master_fd], [], [], 0.1)[0]:
+            continue
+        data = os.read(master_fd, 256)
+        time.sleep(len(data) * 10 / baudrate)
+        received += data
+        if echo:
+            os.write(master_fd, data)
+
+
+def run(uart_cls, total: int, baudrate: int, echo: bool) -> float:
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    uart = uart_cls(os.ttyname(slave_fd), name=uart_cls.__name__, baudrate=baudrate)
+    received = bytearray()
+    stop = threading.Event()
+    t = threading.Thread(target=device, args=(master_fd, baudrate, echo, received, stop))
+    t.start()
+    payload = bytes(i % 64 + 0x30 for i in range(total))
+    uart.write_chunked(payload).result(total)
+    stop.set()
+    t.join()
+    uart.stop()
+    os.close(master_fd)
+    os.close(slave_fd)
+    assert received == payload, "Payload corrupted"
+    return uart.write_throughput
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--bytes", type=int, default=8192, help="Payload size")
+    parser.add_argument("--no-echo", action="store_true", help="Device does not echo")
+    args = parser.parse_args()
+
+    # Keep per chunk debug logging out of the measurement
+    utils.uart.logger.setLevel(logging.WARNING)
+
+    print(f"Line rate {args.baudrate // 10} B/s, {args.bytes} bytes")
+    for uart_cls in [FixedChunkUart, Uart]:
+        rate = run(uart_cls, args.bytes, args.baudrate, not args.no_echo)
+        print(f"{uart_cls.__name__:>14}: {rate:8.0f} B/s")
+
+
+if __name__ == "__main__":
+    main()
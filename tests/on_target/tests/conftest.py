@@ -1,9 +1,11 @@
+import json
 import os
 import re
 import pytest
 import types
-from utils.flash_tools import recover_device
-from utils.uart import Uart, UartBinary
+from utils.flash_tools import recover_device, reset_device
+from utils.uart import FaultDetector, InactivityWatchdog, SerialEngine, Uart, UartBinary
+from utils.log_dictionary import DictionaryLogDecoder
 import sys
 sys.path.append(os.getcwd())
 from utils.logger import get_logger
@@ -11,7 +13,28 @@ from utils.nrfcloud import NRFCloud, NRFCloudFOTA
 
 logger = get_logger()
 
-UART_TIMEOUT = 60 * 30
+# Overall deadline of the UART capture, beyond the longest test: a full modem FOTA is
+# given 60 minutes plus the cloud connections around it. After UART_SILENCE_TIMEOUT
+# seconds without output the inactivity watchdog runs UART_SILENCE_ACTIONS, comma
+# separated "warn", "reset" and "abort". "abort" only fails the UART waits running at
+# the time, so a DUT quiet while flashing or during a cloud side wait is not failed, and
+# the window is longer than a network search stays quiet
+UART_TIMEOUT = int(os.getenv('UART_TIMEOUT', 60 * 90))
+UART_SILENCE_TIMEOUT = float(os.getenv('UART_SILENCE_TIMEOUT', 300))
+UART_SILENCE_ACTIONS = os.getenv('UART_SILENCE_ACTIONS', 'warn,abort').split(',')
+# Receive buffer of the DUT's UART in bytes, the largest chunk Uart.write_chunked() sends
+UART_RX_BUFFER = int(os.getenv('UART_RX_BUFFER', 64))
+# Characters of DUT log kept in memory, older output is spilled to outcomes/logs/
+UART_LOG_MEMORY = int(os.getenv('UART_LOG_MEMORY', 4 * 1024 * 1024))
+# Optional modem trace compression, "gzip[:level]" or "zstd[:level]"
+TRACE_COMPRESSION = os.getenv('TRACE_COMPRESSION')
+# log_dictionary.json of firmware with dictionary-based binary logging on the UART,
+# decoding needs Zephyr's dictionary_parser through ZEPHYR_BASE
+LOG_DICTIONARY = os.getenv('LOG_DICTIONARY')
+# Boots since the last uart.flush() and within FAULT_BOOT_WINDOW seconds after which the DUT
+# is considered stuck in a reboot loop, more than a FOTA flow takes
+FAULT_MAX_BOOTS = int(os.getenv('FAULT_MAX_BOOTS', 8))
+FAULT_BOOT_WINDOW = float(os.getenv('FAULT_BOOT_WINDOW', 300))
 
 SEGGER = os.getenv('SEGGER')
 UART_ID = os.getenv('UART_ID', SEGGER)
@@ -31,20 +54,34 @@ else:
     HEX_FILE_NAME = "merged.hex"
 
 def get_uarts():
-    base_path = "/dev/serial/by-id"
-    try:
-        serial_paths = [os.path.join(base_path, entry) for entry in os.listdir(base_path)]
-    except (FileNotFoundError, PermissionError) as e:
-        raise RuntimeError("Failed to list serial devices") from e
+    # From the by-id listing cached by the port watcher, which follows re-enumeration
     if not UART_ID:
         raise RuntimeError("UART_ID not set")
-    uarts = [x for x in sorted(serial_paths) if UART_ID in x]
-    return uarts
-
-def scan_log_for_assertions(log):
-    assert_counts = log.count("ASSERT")
-    if assert_counts > 0:
-        pytest.fail(f"{assert_counts} ASSERT found in log: {log}")
+    return SerialEngine.get().port_watcher().ports(UART_ID)
+
+# Literals counted as assertions in the DUT log, matched in one pass as lines arrive
+ASSERT_PATTERNS = ["ASSERT"]
+
+def watch_for_assertions(uart):
+    hits = []
+    uart.watch(ASSERT_PATTERNS, lambda pattern, pos: hits.append(pos))
+    return hits
+
+def scan_log_for_assertions(uart, hits):
+    if hits:
+        context = "\n...\n".join(uart.lines_around(pos) for pos in hits[:5])
+        pytest.fail(f"{len(hits)} ASSERT found in log {uart.log_file}:\n{context}")
+
+def write_timing_summary(uart, sample_name):
+    # Milestones the test waited on, in seconds since the last uart.flush() and since the
+    # previous milestone
+    for t in uart.timings:
+        if t["time"] is not None:
+            logger.info(f"Milestone {t['milestone']!r} at {t['time']:.2f} s (+{t['delta']:.2f} s)")
+    path = os.path.join("outcomes", f"timing_{sample_name}.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"test": sample_name, "milestones": uart.timings}, f, indent=2)
 
 @pytest.hookimpl(tryfirst=True)
 def pytest_runtest_logstart(nodeid, location):
@@ -60,22 +97,42 @@ def dut_board(request):
     if not all_uarts:
         pytest.fail("No UARTs found")
     log_uart_string = all_uarts[0]
-    uart = Uart(log_uart_string, timeout=UART_TIMEOUT)
-    modem_traces_uart = UartBinary(all_uarts[TRACEPORT_INDEX], timeout=UART_TIMEOUT)
+    sample_name = request.node.name
+    uart = Uart(
+        log_uart_string,
+        timeout=UART_TIMEOUT,
+        log_file=os.path.join("outcomes/logs", f"uart_{sample_name}.txt"),
+        max_log_memory=UART_LOG_MEMORY,
+        log_decoder=DictionaryLogDecoder(LOG_DICTIONARY) if LOG_DICTIONARY else None,
+        watchdog=InactivityWatchdog(UART_SILENCE_TIMEOUT, UART_SILENCE_ACTIONS, reset_device),
+        rx_buffer=UART_RX_BUFFER,
+    )
+    assert_hits = watch_for_assertions(uart)
+    # Fail waits as soon as the DUT crashes instead of at their timeout
+    FaultDetector(uart, max_boots=FAULT_MAX_BOOTS, boot_window=FAULT_BOOT_WINDOW)
+    # Traces are streamed to outcomes/ while capturing, so a crashed test keeps a partial trace.
+    # The trace index refers to lines of the uart log, see utils/trace_index.py
+    trace_file = os.path.join("outcomes/", f"trace_{sample_name}.bin")
+    modem_traces_uart = UartBinary(
+        all_uarts[TRACEPORT_INDEX],
+        timeout=UART_TIMEOUT,
+        capture_file=trace_file,
+        compression=TRACE_COMPRESSION,
+        log_uart=uart,
+    )
 
     yield types.SimpleNamespace(
         uart=uart,
         device_type=RUNNER_DEVICE_TYPE
     )
 
-    uart_log = uart.whole_log
     uart.stop()
 
-    scan_log_for_assertions(uart_log)
+    write_timing_summary(uart, sample_name)
+    scan_log_for_assertions(uart, assert_hits)
 
-    sample_name = request.node.name
     modem_traces_uart.stop()
-    modem_traces_uart.save_to_file(os.path.join("outcomes/", f"trace_{sample_name}.bin"))
+    modem_traces_uart.save_to_file(trace_file)
 
 @pytest.fixture(scope="function")
 def dut_cloud(dut_board):
@@ -0,0 +1,80 @@
+import os
+import pytest
+import sys
+import time
+sys.path.append(os.getcwd())
+from utils.logger import get_logger
+from utils.flash_tools import flash_device, reset_device
+from utils.benchmark import (BenchmarkResults, DEFAULT_REGRESSION_THRESHOLD, compare, load,
+                             phase_durations)
+
+logger = get_logger()
+
+CLOUD_TIMEOUT = 60 * 3
+# Resets per sample
+BENCHMARK_ITERATIONS = int(os.getenv('BENCHMARK_ITERATIONS', 5))
+# Directory with benchmark_<sample>.json files of an earlier run to compare against
+BENCHMARK_BASELINE = os.getenv('BENCHMARK_BASELINE')
+BENCHMARK_THRESHOLD = float(os.getenv('BENCHMARK_THRESHOLD', DEFAULT_REGRESSION_THRESHOLD))
+ARTIFACT_VERSION = os.getenv('ARTIFACT_VERSION')
+
+# Milestones of the functional tests, from reset to the first message or location fix
+SAMPLES = {
+    "coap_device_message": [
+        "Connected to LTE",
+        "nrf_cloud_coap_transport: Authorized",
+        "Sent Hello World message with ID",
+    ],
+    "rest_device_message": [
+        "Connected to LTE",
+        "Sent Hello World message with ID",
+    ],
+    "coap_cell_location": [
+        "Connected to network",
+        "nrf_cloud_coap_transport: Authorized",
+        "Current cell info: Cell ID: ",
+        "nrf_cloud_coap_cell_location_sample: Lat:",
+    ],
+    "rest_cell_location": [
+        "Connected to network",
+        "Current cell info: Cell ID: ",
+        "nrf_cloud_rest_cell_location_sample: Lat:",
+    ],
+}
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("sample", SAMPLES)
+def test_boot_to_cloud(dut_board, sample, request):
+    '''
+    Benchmark reset to cloud latency, BENCHMARK_ITERATIONS resets per sample.
+    Results go to outcomes/benchmark_<sample>.json, with BENCHMARK_BASELINE set
+    phases slower than BENCHMARK_THRESHOLD over the baseline fail the test.
+    '''
+    hex_file = request.getfixturevalue(f"{sample}_hex_file")
+    milestones = SAMPLES[sample]
+
+    flash_device(os.path.abspath(hex_file))
+    dut_board.uart.xfactoryreset()
+
+    results = BenchmarkResults(sample, ARTIFACT_VERSION)
+    for i in range(BENCHMARK_ITERATIONS):
+        # Phases are timed from the moment the reset command returns, the flush right
+        # before it only keeps earlier output out of the search
+        dut_board.uart.flush()
+        reset_device()
+        reset_done = time.monotonic()
+        dut_board.uart.wait_for_str_ordered(milestones, timeout=CLOUD_TIMEOUT)
+        results.add(phase_durations(dut_board.uart.milestones(milestones, since=reset_done)))
+        logger.info(f"{sample} iteration {i + 1}/{BENCHMARK_ITERATIONS} done")
+
+    logger.info(results.report())
+    results.save(os.path.join("outcomes", f"benchmark_{sample}.json"))
+
+    if not BENCHMARK_BASELINE:
+        return
+    baseline_file = os.path.join(BENCHMARK_BASELINE, f"benchmark_{sample}.json")
+    if not os.path.isfile(baseline_file):
+        logger.warning(f"No baseline {baseline_file}, not comparing")
+        return
+    regressions = compare(results.to_dict(), load(baseline_file), BENCHMARK_THRESHOLD)
+    assert not regressions, f"{sample} boot to cloud regressed:\n" + "\n".join(regressions)
@@ -10,6 +10,18 @@ logger = get_logger()
 
 CLOUD_TIMEOUT = 60 * 3
 
+def await_hello_message(dut_cloud, test_start_time, text):
+    stream = dut_cloud.cloud.message_stream(dut_cloud.device_id, start=test_start_time)
+    start = time.time()
+    while time.time() - start < CLOUD_TIMEOUT:
+        time.sleep(5)
+        for received, message in stream.poll():
+            logger.debug(f"Found message: {message}")
+            if text in message.get('sample_message', ''):
+                return
+        logger.debug("No new matching message, retrying...")
+    raise RuntimeError("No new message to cloud observed")
+
 def test_coap_device_message(dut_cloud, coap_device_message_hex_file):
     '''
     Test that verifies that device can connect to nRF Cloud CoAP and send device messages.
@@ -31,24 +43,8 @@ def test_coap_device_message(dut_cloud, coap_device_message_hex_file):
         timeout=CLOUD_TIMEOUT
     )
 
-    # Poll for message to be reported to cloud
-    start = time.time()
-    while time.time() - start < CLOUD_TIMEOUT:
-        time.sleep(5)
-        messages = dut_cloud.cloud.get_messages(dut_cloud.device_id, appname=None, max_records=20, start=test_start_time)
-        logger.debug(f"Found messages: {messages}")
-
-        if messages:
-            message_object = messages[0][1]
-            message_content = message_object.get('sample_message', '')
-
-            if "Hello World, from the CoAP Device Message Sample!" in message_content:
-                break
-        else:
-            logger.debug("No message with recent timestamp, retrying...")
-            continue
-    else:
-        raise RuntimeError("No new message to cloud observed")
+    # Poll for message to be reported to cloud, each poll only fetches new messages
+    await_hello_message(dut_cloud, test_start_time, "Hello World, from the CoAP Device Message Sample!")
 
 def test_rest_device_message(dut_cloud, rest_device_message_hex_file):
     '''
@@ -70,21 +66,5 @@ def test_rest_device_message(dut_cloud, rest_device_message_hex_file):
         timeout=CLOUD_TIMEOUT
     )
 
-    # Poll for message to be reported to cloud
-    start = time.time()
-    while time.time() - start < CLOUD_TIMEOUT:
-        time.sleep(5)
-        messages = dut_cloud.cloud.get_messages(dut_cloud.device_id, appname=None, max_records=20, start=test_start_time)
-        logger.debug(f"Found messages: {messages}")
-
-        if messages:
-            message_object = messages[0][1]
-            message_content = message_object.get('sample_message', '')
-
-            if "Hello World, from the REST Device Message Sample!" in message_content:
-                break
-        else:
-            logger.debug("No message with recent timestamp, retrying...")
-            continue
-    else:
-        raise RuntimeError("No new message to cloud observed")
+    # Poll for message to be reported to cloud, each poll only fetches new messages
+    await_hello_message(dut_cloud, test_start_time, "Hello World, from the REST Device Message Sample!")
@@ -2,7 +2,6 @@ import os
 import pytest
 import time
 import sys
-import re
 import functools
 sys.path.append(os.getcwd())
 from utils.logger import get_logger
@@ -86,12 +85,10 @@ def await_nrfcloud(func, expected, field, timeout, break_value="CANCELLED"):
             break
 
 def get_appversion(dut_fota):
-    shadow = dut_fota.fota.get_device(dut_fota.device_id)
-    return shadow["state"]["reported"]["device"]["deviceInfo"]["appVersion"]
+    return dut_fota.fota.get_device_field(dut_fota.device_id, "state.reported.device.deviceInfo.appVersion")
 
 def get_modemversion(dut_fota):
-    shadow = dut_fota.fota.get_device(dut_fota.device_id)
-    return shadow["state"]["reported"]["device"]["deviceInfo"]["modemFirmware"]
+    return dut_fota.fota.get_device_field(dut_fota.device_id, "state.reported.device.deviceInfo.modemFirmware")
 
 def setup_fota_sample(dut_fota, hex_file):
     flash_device(os.path.abspath(hex_file))
@@ -109,9 +106,10 @@ def setup_fota_sample(dut_fota, hex_file):
         timeout=CLOUD_TIMEOUT
     )
 
-def parse_mfw_version_from_log(log):
-    for match in re.finditer(r"Modem FW:\s+(mfw_nrf9..._\d\.\d\.\d(-FOTA-TEST)?)", log, re.MULTILINE):
-        return match.group(1)
+def parse_mfw_version_from_log(uart):
+    # Version printed by the boot that setup_fota_sample() waited for
+    version = uart.extract_dict(r"Modem FW:\s+(?P<version>mfw_nrf9..._\d\.\d\.\d(-FOTA-TEST)?)")
+    return version["version"] if version else None
 
 def perform_any_fota(dut_fota, bundle_id, timeout=CLOUD_TIMEOUT):
     try:
@@ -148,7 +146,7 @@ def test_coap_mfw_delta_fota(dut_fota, coap_fota_hex_file):
 
     dut_fota.uart.wait_for_str("nrf_cloud_coap_transport: Authorized")
 
-    current_version = parse_mfw_version_from_log(dut_fota.uart.whole_log)
+    current_version = parse_mfw_version_from_log(dut_fota.uart)
 
     if not current_version:
         raise RuntimeError(f"Failed to find current modem FW version")
@@ -176,7 +174,7 @@ def test_rest_mfw_delta_fota(dut_fota, rest_fota_hex_file):
 
     setup_fota_sample(dut_fota, rest_fota_hex_file)
 
-    current_version = parse_mfw_version_from_log(dut_fota.uart.whole_log)
+    current_version = parse_mfw_version_from_log(dut_fota.uart)
 
     if not current_version:
         raise RuntimeError(f"Failed to find current modem FW version")
@@ -207,7 +205,7 @@ def test_coap_mfw_full_fota(dut_fota, coap_fota_fmfu_hex_file):
 
     dut_fota.uart.wait_for_str("nrf_cloud_coap_transport: Authorized")
 
-    current_version = parse_mfw_version_from_log(dut_fota.uart.whole_log)
+    current_version = parse_mfw_version_from_log(dut_fota.uart)
 
     if not current_version:
         raise RuntimeError(f"Failed to find current modem FW version")
@@ -237,7 +235,7 @@ def test_rest_mfw_full_fota(dut_fota, rest_fota_fmfu_hex_file):
 
     setup_fota_sample(dut_fota, rest_fota_fmfu_hex_file)
 
-    current_version = parse_mfw_version_from_log(dut_fota.uart.whole_log)
+    current_version = parse_mfw_version_from_log(dut_fota.uart)
 
     if not current_version:
         raise RuntimeError(f"Failed to find current modem FW version")
@@ -280,7 +278,7 @@ def test_coap_app_fota(dut_fota, coap_fota_hex_file, coap_fota_test_zip_file):
     finally:
         dut_fota.fota.delete_bundle(bundle_id)
 
-    if "1.0.0-fotatest" not in dut_fota.uart.whole_log:
+    if dut_fota.uart.whole_log_find("1.0.0-fotatest") < 0:
         raise RuntimeError("Couldn't verify that correct APP is running after FOTA")
 
 def test_rest_app_fota(dut_fota, rest_fota_hex_file, rest_fota_test_zip_file):
@@ -303,7 +301,7 @@ def test_rest_app_fota(dut_fota, rest_fota_hex_file, rest_fota_test_zip_file):
     finally:
         dut_fota.fota.delete_bundle(bundle_id)
 
-    if "1.0.0-fotatest" not in dut_fota.uart.whole_log:
+    if dut_fota.uart.whole_log_find("1.0.0-fotatest") < 0:
         raise RuntimeError("Couldn't verify that correct APP is running after FOTA")
 
 #TODO: bootloader FOTA
@@ -0,0 +1,125 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import json
+import math
+import os
+import statistics
+import sys
+sys.path.append(os.getcwd())
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Allowed slowdown of a phase against the baseline, as a fraction of the baseline value
+DEFAULT_REGRESSION_THRESHOLD = 0.2
+# Statistics compared against the baseline
+COMPARED_STATS = ["p50", "p95"]
+
+
+def percentile(values: list, p: float) -> float:
+    """ Nearest-rank percentile of 'values', p in 0-100 """
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(durations: list) -> dict:
+    """
+    :param durations: Seconds per iteration
+    :return: Dict with n, p50, p95, max and mean
+    """
+    return {
+        "n": len(durations),
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "max": max(durations),
+        "mean": statistics.mean(durations),
+    }
+
+
+def phase_durations(milestones: list, start: str = "reset") -> dict:
+    """
+    Turn the output of Uart.milestones() into named phases.
+
+    :return: Dict of "<previous milestone> -> <milestone>" to seconds, plus
+             "<start> -> <last milestone>" for the whole run
+    """
+    phases = {}
+    prev = start
+    for msg, since_start, delta in milestones:
+        if delta is None:
+            raise ValueError(f"Milestone {msg!r} not found in UART log")
+        phases[f"{prev} -> {msg}"] = delta
+        prev = msg
+    phases[f"{start} -> {prev}"] = milestones[-1][1]
+    return phases
+
+
+class BenchmarkResults:
+    """
+    Durations of repeated runs, grouped by phase, saved as JSON:
+
+        {"benchmark": name, "version": ..., "phases": {phase: {"runs": [...], "p50": ...}}}
+
+    Files from different firmware versions can be compared with compare().
+    """
+
+    def __init__(self, name: str, version: str = None) -> None:
+        self.name = name
+        self.version = version
+        self.runs = {}
+
+    def add(self, phases: dict) -> None:
+        for phase, seconds in phases.items():
+            self.runs.setdefault(phase, []).append(seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            "benchmark": self.name,
+            "version": self.version,
+            "phases": {
+                phase: {"runs": runs, **summarize(runs)} for phase, runs in self.runs.items()
+            },
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self) -> str:
+        lines = [f"{self.name} ({self.version or 'unknown version'})"]
+        for phase, stats in self.to_dict()["phases"].items():
+            lines.append(f"  {phase}: p50 {stats['p50']:.2f} s, p95 {stats['p95']:.2f} s, "
+                         f"max {stats['max']:.2f} s, n {stats['n']}")
+        return "\n".join(lines)
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_REGRESSION_THRESHOLD) -> list:
+    """
+    Compare two result dicts as written by BenchmarkResults.save().
+
+    :param threshold: Allowed slowdown as a fraction, 0.2 allows 20 % over the baseline
+    :return: Regressions as human readable strings, empty if none
+    """
+    regressions = []
+    for phase, stats in results["phases"].items():
+        base = baseline["phases"].get(phase)
+        if base is None:
+            continue
+        for stat in COMPARED_STATS:
+            limit = base[stat] * (1 + threshold)
+            if stats[stat] > limit:
+                regressions.append(
+                    f"{phase}: {stat} {stats[stat]:.2f} s > {limit:.2f} s "
+                    f"(baseline {base[stat]:.2f} s from {baseline.get('version')})"
+                )
+    return regressions
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
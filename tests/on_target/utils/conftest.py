@@ -0,0 +1,10 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import os
+
+# Unit tests log to the console only, outcomes/ is for on-target test runs. Set before
+# any test module imports utils.logger
+os.environ["LOG_FILENAME"] = ""
@@ -0,0 +1,153 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import contextlib
+import io
+import os
+import re
+import struct
+import sys
+sys.path.append(os.getcwd())
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Data kept waiting for the rest of a message before its first byte is taken for text,
+# well beyond Zephyr's default CONFIG_LOG_BUFFER_SIZE of 1 KiB, which bounds a message
+MAX_PENDING = 4 * 1024
+# Message types of the binary log stream, as in dictionary_parser
+MSG_TYPE_NORMAL = 0
+MSG_TYPE_DROPPED = 1
+ANSI_ESCAPE_RE = re.compile(r"\x1b\[[0-9;]*m")
+# Control characters of text between messages, the ANSI escape character aside
+CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1a\x1c-\x1f\x7f]")
+
+
+def import_dictionary_parser():
+    """
+    Zephyr's dictionary_parser package, from $ZEPHYR_BASE/scripts/logging/dictionary
+    unless it is importable already. Returns None if it is not available.
+    """
+    zephyr_base = os.getenv("ZEPHYR_BASE")
+    if zephyr_base:
+        path = os.path.join(zephyr_base, "scripts", "logging", "dictionary")
+        if path not in sys.path:
+            sys.path.append(path)
+    try:
+        import dictionary_parser
+        from dictionary_parser.log_database import LogDatabase
+    except ImportError:
+        return None
+    return dictionary_parser, LogDatabase
+
+
+class DictionaryLogDecoder:
+    """
+    Decoder for Zephyr dictionary-based binary logs, turning received bytes into the
+    text lines the UART would have carried with text logging.
+
+    Uses the log_dictionary.json of the build and Zephyr's dictionary_parser, which
+    prints what it decodes. Received data is decoded one message at a time, the tail
+    holding an incomplete message is kept until the rest of it arrives. Bytes that do
+    not start a message pass as text, which covers shell prompts and AT responses on
+    the same UART and resyncs the decoder after corrupt data.
+    """
+
+    def __init__(self, dictionary_path: str) -> None:
+        modules = import_dictionary_parser()
+        if modules is None:
+            raise RuntimeError(
+                "Zephyr dictionary_parser not found, set ZEPHYR_BASE to decode binary logs"
+            )
+        dictionary_parser, LogDatabase = modules
+        database = LogDatabase.read_json_database(dictionary_path)
+        if database is None:
+            raise RuntimeError(f"Failed to read log dictionary {dictionary_path}")
+        self._parser = dictionary_parser.get_parser(database)
+        if self._parser is None:
+            raise RuntimeError(f"Unsupported log dictionary version in {dictionary_path}")
+        # What _parse_one() needs to decode message by message
+        if not all(hasattr(self._parser, attr)
+                   for attr in ("parse_one_normal_msg", "fmt_msg_type", "fmt_dropped_cnt")):
+            raise RuntimeError("Unsupported dictionary_parser version")
+        self._pending = b""
+        self._partial = ""
+
+    def _parse_one(self, data: bytes, offset: int):
+        """
+        Decode the message at 'offset' of 'data'.
+
+        :return: (offset of the next message, decoded text), or None while the message
+                 is incomplete
+        :raises ValueError: If no message starts at 'offset'
+        """
+        parser = self._parser
+        out = io.StringIO()
+        try:
+            msg_type = struct.unpack_from(parser.fmt_msg_type, data, offset)[0]
+            offset += struct.calcsize(parser.fmt_msg_type)
+            if msg_type == MSG_TYPE_DROPPED:
+                dropped = struct.unpack_from(parser.fmt_dropped_cnt, data, offset)[0]
+                offset += struct.calcsize(parser.fmt_dropped_cnt)
+                return offset, f"--- {dropped} messages dropped ---\n"
+            if msg_type != MSG_TYPE_NORMAL:
+                raise ValueError(f"Unknown message type {msg_type}")
+            with contextlib.redirect_stdout(out):
+                end = parser.parse_one_normal_msg(data, offset)
+        except (struct.error, IndexError):
+            # Header or arguments past the end of 'data'
+            return None
+        except (KeyError, TypeError) as e:
+            # Unknown string or source, or arguments not matching the format string
+            raise ValueError(f"Undecodable message: {e}") from e
+        # Arguments past the end of 'data' decode as truncated rather than failing
+        if end is None or end > len(data):
+            return None
+        return end, out.getvalue()
+
+    def feed(self, data: bytes) -> list:
+        """ Decode received bytes, returns the completed log lines """
+        self._pending += data
+        decoded = []
+        raw = bytearray()
+        offset = 0
+        while offset < len(self._pending):
+            try:
+                parsed = self._parse_one(self._pending, offset)
+                if parsed is None and len(self._pending) - offset > MAX_PENDING:
+                    raise ValueError("No message is this long")
+            except ValueError:
+                # Text, or a corrupt byte, retry at the next one
+                raw.append(self._pending[offset])
+                offset += 1
+                continue
+            if parsed is None:
+                break
+            if raw:
+                decoded.append(self._text(raw))
+                raw = bytearray()
+            offset, piece = parsed
+            decoded.append(piece)
+        if raw:
+            decoded.append(self._text(raw))
+        self._pending = self._pending[offset:]
+        if not decoded:
+            return []
+        lines = (self._partial + "".join(decoded)).split("\n")
+        self._partial = lines.pop()
+        return [ANSI_ESCAPE_RE.sub("", line).rstrip() for line in lines]
+
+    def flush(self) -> list:
+        """
+        Drop an incomplete message, e.g. when the port went away as the rest of it is
+        lost, and return the partial line received before as the last one
+        """
+        self._pending = b""
+        partial, self._partial = ANSI_ESCAPE_RE.sub("", self._partial).rstrip(), ""
+        return [partial] if partial else []
+
+    @staticmethod
+    def _text(data: bytearray) -> str:
+        return CONTROL_RE.sub("", data.decode("utf-8", errors="ignore"))
@@ -3,6 +3,9 @@
 # SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
 ##########################################################################################
 
+import asyncio
+import concurrent.futures
+import functools
 import os
 import zipfile
 import io
@@ -10,12 +13,15 @@ import re
 import json
 import time
 import random
+import threading
 import requests
 from enum import Enum
 from typing import Union
 from datetime import datetime, timedelta, timezone
 from utils.logger import get_logger
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from urllib3.util.retry import Retry
 
 logger = get_logger()
 
@@ -28,11 +34,42 @@ class NRFCloudFOTAError(Exception):
     pass
 
 BASEURL = os.getenv('BASEURL', "nrfcloud.com")
+# Keep-alive connections per host, and the number of requests AsyncNRFCloud runs at once
+HTTP_MAX_CONNECTIONS = 8
+# Retries of failed connections and of idempotent requests answered with these status
+# codes, waiting HTTP_BACKOFF * 2 ** (retry - 1) seconds, or as long as Retry-After says
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_RETRY_STATUS = [429, 500, 502, 503, 504]
+# Default look-back of get_messages() and get_location_history()
+DEFAULT_HISTORY = 300
+# Each MessageStream poll fetches again from this many seconds before the newest message
+# seen, for messages stored late with an older receivedAt, duplicates are dropped
+MESSAGE_OVERLAP = 10
+# Execution states of FOTA jobs that are not finished yet for a device
+FOTA_PENDING_STATES = ["QUEUED", "IN_PROGRESS", "DOWNLOADING"]
+# Concurrent requests when cancelling FOTA jobs, at most HTTP_MAX_CONNECTIONS are pooled
+FOTA_CANCEL_WORKERS = 8
+# Seconds a device shadow is served from the ShadowCache before it is requested again
+SHADOW_TTL = 2
 
 class NRFCloud():
-    def __init__(self, api_key: str, url: str=f"https://api.{BASEURL}/v1", timeout: int=10) -> None:
-        """ Initalizes the class """
+    def __init__(
+        self, api_key: str, url: str=f"https://api.{BASEURL}/v1", timeout: int=10,
+        max_connections: int=HTTP_MAX_CONNECTIONS, retries: int=HTTP_RETRIES
+    ) -> None:
+        """
+        Initalizes the class
+
+        :param timeout: Seconds per request and attempt, or a (connect, read) tuple
+        :param max_connections: Keep-alive connections kept per host
+        :param retries: Retries with backoff of failed connections and of idempotent
+                        requests failing with a HTTP_RETRY_STATUS code
+        """
         self.url = url
+        # Claiming and provisioning commands, passed as base_url so that concurrent calls
+        # through AsyncNRFCloud do not see a swapped self.url
+        self.provisioning_url = f"https://api.provisioning.{BASEURL}/v1"
         # Time format used by nrfcloud.com
         self.time_fmt = '%Y-%m-%dT%H:%M:%S.%fZ'
         self.default_headers = {
@@ -42,30 +79,41 @@ class NRFCloud():
         }
         self.session = requests.Session()
         self.session.headers.update(self.default_headers)
+        retry = Retry(
+            total=retries,
+            backoff_factor=HTTP_BACKOFF,
+            status_forcelist=HTTP_RETRY_STATUS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         self.timeout = timeout
+        self.shadows = ShadowCache(self)
 
-    def _get(self, path: str, **kwargs) -> dict:
-        r = self.session.get(url=self.url + path, **kwargs, timeout=self.timeout)
+    def _get(self, path: str, base_url: str=None, raw: bool=False, **kwargs):
+        # JSON of the response, with 'raw' the response itself, e.g. for its headers
+        r = self.session.get(url=(base_url or self.url) + path, **kwargs, timeout=self.timeout)
         r.raise_for_status()
-        return r.json()
+        return r if raw else r.json()
 
-    def _post(self, path: str, **kwargs):
-        r = self.session.post(self.url + path, **kwargs, timeout=self.timeout)
+    def _post(self, path: str, base_url: str=None, **kwargs):
+        r = self.session.post((base_url or self.url) + path, **kwargs, timeout=self.timeout)
         r.raise_for_status()
         return r
 
-    def _put(self, path: str, **kwargs):
-        r = self.session.put(self.url + path, **kwargs, timeout=self.timeout)
+    def _put(self, path: str, base_url: str=None, **kwargs):
+        r = self.session.put((base_url or self.url) + path, **kwargs, timeout=self.timeout)
         r.raise_for_status()
         return r
 
-    def _delete(self, path: str, **kwargs):
-        r = self.session.delete(self.url + path, **kwargs, timeout=self.timeout)
+    def _delete(self, path: str, base_url: str=None, **kwargs):
+        r = self.session.delete((base_url or self.url) + path, **kwargs, timeout=self.timeout)
         r.raise_for_status()
         return r
 
-    def _patch(self, path: str, **kwargs):
-        r = self.session.patch(self.url + path, **kwargs, timeout=self.timeout)
+    def _patch(self, path: str, base_url: str=None, **kwargs):
+        r = self.session.patch((base_url or self.url) + path, **kwargs, timeout=self.timeout)
         r.raise_for_status()
         return r
 
@@ -81,13 +129,7 @@ class NRFCloud():
             "tags": ["nrf-cloud-onboarding"]
         })
 
-        # Use the provisioning API endpoint for unclaiming
-        original_url = self.url
-        self.url = f"https://api.provisioning.{BASEURL}/v1"
-        try:
-            self._post(path=f"/claimed-devices", data=data)
-        finally:
-            self.url = original_url
+        self._post(path=f"/claimed-devices", base_url=self.provisioning_url, data=data)
 
     def unclaim_device(self, device_id: str) -> int:
         """
@@ -96,14 +138,8 @@ class NRFCloud():
         :param device_id: Device ID
         :return: HTTP status code from the delete call
         """
-        # Use the provisioning API endpoint for unclaiming
-        original_url = self.url
-        self.url = f"https://api.provisioning.{BASEURL}/v1"
-        try:
-            response = self._delete(path=f"/claimed-devices/{device_id}")
-            return response.status_code
-        finally:
-            self.url = original_url
+        response = self._delete(path=f"/claimed-devices/{device_id}", base_url=self.provisioning_url)
+        return response.status_code
 
     def add_provisioning_command(self, device_id: str, command: str) -> None:
         """
@@ -116,36 +152,56 @@ class NRFCloud():
 
         data = command  # command is already a JSON string containing all needed data
 
-        # Use the provisioning API endpoint for unclaiming
-        original_url = self.url
-        self.url = f"https://api.provisioning.{BASEURL}/v1"
-        try:
-            self._post(path=f"/claimed-devices/{device_id}/provisioning", data=data)
-        finally:
-            self.url = original_url
+        self._post(path=f"/claimed-devices/{device_id}/provisioning", base_url=self.provisioning_url, data=data)
+
+    def _paginate(self, path: str, params: dict=None):
+        """ Items of a paged listing, fetching the next page only when it is reached """
+        params = dict(params or {})
+        while True:
+            page = self._get(path=path, params=params)
+            yield from page["items"]
+            if not page.get("pageNextToken"):
+                return
+            params["pageNextToken"] = page["pageNextToken"]
 
     def get_devices(self, path: str="", params=None) -> dict:
         return self._get(path=f"/devices{path}", params=params)
 
-    def get_device(self, device_id: str, params=None) -> dict:
+    def get_device(self, device_id: str, params=None, max_age: float=0) -> dict:
         """
         Get all information about particular device on nrfcloud.com
 
         :param device_id: Device ID
-        :return: Json structure of result from nrfcloud.com
+        :param max_age: Seconds a shadow fetched earlier may be old, with 0 it is
+                        revalidated with nrfcloud.com, see ShadowCache
+        :return: Json structure of result from nrfcloud.com, do not modify it
+        """
+        if params:
+            return self.get_devices(path=f"/{device_id}", params=params)
+        return self.shadows.get(device_id, max_age=max_age)
+
+    def get_device_field(self, device_id: str, path: Union[str, list], max_age: float=None, **kwargs):
+        """
+        Single field of a device shadow, e.g. "state.reported.device.deviceInfo.appVersion",
+        from a shadow at most 'max_age' seconds old, default SHADOW_TTL. Checks of several
+        fields within that time cost one request.
+
+        :param default: Returned if the field is missing, otherwise KeyError is raised
         """
-        return self.get_devices(path=f"/{device_id}", params=params)
+        return self.shadows.field(device_id, path, max_age=max_age, **kwargs)
 
-    def get_messages(self, device: str=None, appname: str=None, max_records: int=50, start: float=time.time()-300) -> list:
+    def get_messages(self, device: str=None, appname: str=None, max_records: int=50, start: float=None) -> list:
         """
-        Get device messages.
+        Get device messages, newest first. To poll for new messages use message_stream().
 
         :param device: Limit result to messages from particular device
         :param appname: Filter by APPID
         :param max_records: Limit number of messages to fetch
-        :param start: start time in seconds since epoch
+        :param start: start time in seconds since epoch, default 5 minutes ago
         :return: List of (timestamp, message)
         """
+        if start is None:
+            start = time.time() - DEFAULT_HISTORY
         end = datetime.now(timezone.utc).strftime(self.time_fmt)
         start = datetime.fromtimestamp(start, timezone.utc).strftime(self.time_fmt)
         params = {
@@ -166,14 +222,16 @@ class NRFCloud():
         return [(timestamp(x), x['message'])
             for x in messages['items']]
 
-    def get_location_history(self, device: str=None, max_records: int=50, start: float=time.time()-300) -> list:
+    def get_location_history(self, device: str=None, max_records: int=50, start: float=None) -> list:
         """
         Get previously resolved locations, e.g. cell locations.
         :param device: Limit result to messages from particular device
         :param max_records: Limit number of messages to fetch
-        :param start: start time in seconds since epoch
+        :param start: start time in seconds since epoch, default 5 minutes ago
         :return: List of location objects
         """
+        if start is None:
+            start = time.time() - DEFAULT_HISTORY
 
         end = datetime.now(timezone.utc).strftime(self.time_fmt)
         start = datetime.fromtimestamp(start, timezone.utc).strftime(self.time_fmt)
@@ -191,6 +249,14 @@ class NRFCloud():
 
         return locations['items']
 
+    def message_stream(self, device: str=None, appname: str=None, start: float=None) -> "MessageStream":
+        """
+        Cursor over device messages from 'start' on, see MessageStream
+
+        :param start: start time in seconds since epoch, default now
+        """
+        return MessageStream(self, device=device, appname=appname, start=start)
+
     def check_message_age(self, message: dict, hours: int=0, minutes: int=0, seconds: int=0) -> bool:
         """
         Check age of message, return False if message older than parameters
@@ -218,7 +284,9 @@ class NRFCloud():
                 }
             }
         })
-        return self._patch(f"/devices/{device_id}/state", data=data)
+        r = self._patch(f"/devices/{device_id}/state", data=data)
+        self.shadows.invalidate(device_id)
+        return r
 
     def patch_add_provisioning_command_to_shadow(self, device_id: str, command: int) -> None:
         """
@@ -232,7 +300,9 @@ class NRFCloud():
                 "command": [command, random.randint(1, 100)]
             }
         })
-        return self._patch(f"/devices/{device_id}/state", data=data)
+        r = self._patch(f"/devices/{device_id}/state", data=data)
+        self.shadows.invalidate(device_id)
+        return r
 
     def patch_delete_command_entry_from_shadow(self, device_id: str) -> None:
         """
@@ -249,7 +319,123 @@ class NRFCloud():
                 "command": None,
             }
         })
-        return self._patch(f"/devices/{device_id}/state", data=data)
+        r = self._patch(f"/devices/{device_id}/state", data=data)
+        self.shadows.invalidate(device_id)
+        return r
+
+class ShadowCache():
+    """
+    Device shadows fetched through one NRFCloud client. A shadow younger than the
+    max_age of a request is served from memory. Older ones are revalidated with
+    If-None-Match and the ETag of the cached copy, and a 304 answer reuses that copy.
+    Concurrent readers of one device share a single request.
+    """
+
+    _missing = object()
+
+    def __init__(self, cloud: NRFCloud, ttl: float=SHADOW_TTL) -> None:
+        self.cloud = cloud
+        self.ttl = ttl
+        # Device ID to (time.monotonic() of the response, ETag, shadow)
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        # Requests sent, and the ones answered with 304 Not Modified
+        self.requests = 0
+        self.not_modified = 0
+
+    def get(self, device_id: str, max_age: float=None) -> dict:
+        max_age = self.ttl if max_age is None else max_age
+        asked = time.monotonic()
+        entry = self._entries.get(device_id)
+        if entry and asked - entry[0] < max_age:
+            return entry[2]
+        with self._lock:
+            lock = self._locks.setdefault(device_id, threading.Lock())
+        with lock:
+            entry = self._entries.get(device_id)
+            # Answered while this reader waited for another one's request
+            if entry and (entry[0] >= asked or time.monotonic() - entry[0] < max_age):
+                return entry[2]
+            headers = {"If-None-Match": entry[1]} if entry and entry[1] else {}
+            r = self.cloud._get(f"/devices/{device_id}", headers=headers, raw=True)
+            self.requests += 1
+            if r.status_code == 304 and entry:
+                self.not_modified += 1
+                etag, shadow = r.headers.get("ETag", entry[1]), entry[2]
+            else:
+                etag, shadow = r.headers.get("ETag"), r.json()
+            self._entries[device_id] = (time.monotonic(), etag, shadow)
+            return shadow
+
+    def field(self, device_id: str, path: Union[str, list], max_age: float=None, default=_missing):
+        """ Value at 'path', dot separated keys or a list of keys and indexes """
+        value = self.get(device_id, max_age)
+        for key in path.split(".") if isinstance(path, str) else path:
+            try:
+                value = value[key]
+            except (KeyError, IndexError, TypeError):
+                if default is self._missing:
+                    raise KeyError(f"{path} not in shadow of {device_id}") from None
+                return default
+        return value
+
+    def invalidate(self, device_id: str) -> None:
+        """ Make the next read revalidate, e.g. after changing the desired state """
+        entry = self._entries.get(device_id)
+        if entry:
+            self._entries[device_id] = (float("-inf"), entry[1], entry[2])
+
+
+class MessageStream():
+    """
+    Incremental reader of device messages. Every poll() only asks for messages from the
+    newest one seen on, minus MESSAGE_OVERLAP seconds, and yields the ones it has not
+    yielded before, oldest first. Pages are fetched as the generator is consumed, so
+    stopping early saves the remaining requests. Messages are told apart by their ID,
+    or by time, topic and content where the API does not return one.
+    """
+
+    def __init__(
+        self, cloud: NRFCloud, device: str=None, appname: str=None, start: float=None,
+        page_limit: int=100
+    ) -> None:
+        self.cloud = cloud
+        self.params = {"pageSort": "asc", "pageLimit": page_limit}
+        if device:
+            self.params["deviceId"] = device
+        if appname:
+            self.params["appId"] = appname
+        # receivedAt of the newest message yielded
+        self.cursor = datetime.fromtimestamp(time.time() if start is None else start, timezone.utc)
+        self._overlap = timedelta(0)
+        # Keys of messages yielded within the overlap window, by receivedAt
+        self._seen = {}
+
+    @staticmethod
+    def _key(item: dict):
+        message_id = item.get("messageId") or item.get("id")
+        if message_id:
+            return message_id
+        return (item["receivedAt"], item.get("topic"), json.dumps(item["message"], sort_keys=True))
+
+    def poll(self):
+        """ Generator of new (timestamp, message) tuples, like get_messages() returns """
+        start = self.cursor - self._overlap
+        self._overlap = timedelta(seconds=MESSAGE_OVERLAP)
+        self._seen = {key: t for key, t in self._seen.items() if t >= start}
+        params = dict(self.params)
+        params["start"] = start.strftime(self.cloud.time_fmt)
+        params["end"] = datetime.now(timezone.utc).strftime(self.cloud.time_fmt)
+        for item in self.cloud._paginate("/messages", params):
+            received = datetime.strptime(item["receivedAt"], self.cloud.time_fmt).replace(tzinfo=timezone.utc)
+            key = self._key(item)
+            if key in self._seen:
+                continue
+            self._seen[key] = received
+            self.cursor = max(self.cursor, received)
+            yield received.replace(tzinfo=None), item["message"]
+
 
 class NRFCloudFOTA(NRFCloud):
     def upload_firmware(
@@ -360,6 +546,27 @@ class NRFCloudFOTA(NRFCloud):
             params["pageNextToken"] = pageNextToken
         return self._get("/fota-jobs", params=params)
 
+    def iter_fota_jobs(self, page_limit: int=100):
+        """ FOTA jobs of the account, the next page is fetched only when it is reached """
+        return self._paginate("/fota-jobs", {"pageLimit": page_limit})
+
+    def iter_fota_job_executions(self, device_id: str, page_limit: int=100):
+        """ Executions of FOTA jobs on one device, filtered by nRF Cloud """
+        return self._paginate(f"/fota-job-executions/{device_id}", {"pageLimit": page_limit})
+
+    def incomplete_job_ids(self, uuid: str) -> list:
+        """ IDs of the FOTA jobs still pending on device 'uuid' """
+        try:
+            return [e["jobId"] for e in self.iter_fota_job_executions(uuid) if e["status"] in FOTA_PENDING_STATES]
+        except HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+        logger.info("FOTA job executions not available, scanning all FOTA jobs")
+        return [
+            job["jobId"] for job in self.iter_fota_jobs()
+            if job["status"] in ["IN_PROGRESS", "QUEUED"] and uuid in job["target"]["deviceIds"][0]
+        ]
+
     def delete_fota_job(self, job_id: str):
         return self._delete(f"/fota-jobs/{job_id}")
 
@@ -436,24 +643,36 @@ class NRFCloudFOTA(NRFCloud):
             self.delete_fota_job(job_id)
         return None
 
-    def cancel_incomplete_jobs(self, uuid):
-        fota_jobs = self.list_fota_jobs(pageLimit=100)
-        items = fota_jobs['items']
-        while "pageNextToken" in fota_jobs:
-            fota_jobs = self.list_fota_jobs(pageLimit=100, pageNextToken=fota_jobs["pageNextToken"])
-            items = items + fota_jobs["items"]
-        logger.debug("Listing jobs:")
-        for job in items:
-            if 'COMPLETE' in job['status']:
-                continue
-            if job['status'] in ["IN_PROGRESS", "QUEUED"]  and uuid in job['target']['deviceIds'][0]:
-                logger.debug(f"Job {job['jobId']} not completed for device {uuid}")
-                logger.info(f"Cancelling in progress job {job['jobId']}")
+    def cancel_incomplete_jobs(self, uuid, max_workers: int=FOTA_CANCEL_WORKERS) -> dict:
+        """
+        Cancel the executions of all pending FOTA jobs on device 'uuid', up to
+        'max_workers' at a time.
+
+        :return: Dict of job ID to the seconds its cancellation took, failed ones left out
+        """
+        start = time.monotonic()
+        job_ids = self.incomplete_job_ids(uuid)
+        logger.info(f"Found {len(job_ids)} incomplete FOTA jobs for {uuid} in {time.monotonic() - start:.2f} s")
+        if not job_ids:
+            return {}
+
+        def cancel(job_id):
+            t = time.monotonic()
+            self.patch_execution_state(uuid=uuid, job_id=job_id, status="CANCELLED")
+            return time.monotonic() - t
+
+        durations = {}
+        with concurrent.futures.ThreadPoolExecutor(min(max_workers, len(job_ids))) as executor:
+            futures = {executor.submit(cancel, job_id): job_id for job_id in job_ids}
+            for future in concurrent.futures.as_completed(futures):
+                job_id = futures[future]
                 try:
-                    self.patch_execution_state(uuid=uuid, job_id=job['jobId'], status="CANCELLED")
+                    durations[job_id] = future.result()
                 except Exception as e:
-                    logger.warning(f"Failed to cancel fota job due to exception: {e}, skipping.")
+                    logger.warning(f"Failed to cancel fota job {job_id} due to exception: {e}, skipping.")
                     continue
+                logger.info(f"Cancelled in progress job {job_id} in {durations[job_id]:.2f} s")
+        return durations
 
     def patch_execution_state(self, uuid: str, job_id: str, status):
         """
@@ -466,3 +685,49 @@ class NRFCloudFOTA(NRFCloud):
             "status": status
         })
         return self._patch(f"/fota-job-executions/{uuid}/{job_id}", data=data)
+
+
+class AsyncNRFCloud():
+    """
+    Awaitable NRFCloudFOTA, for driving cloud checks of many devices from one event loop:
+
+        async with AsyncNRFCloud(api_key) as cloud:
+            shadows = await asyncio.gather(*(cloud.get_device(d) for d in device_ids))
+
+    Every public method of the wrapped client is available as a coroutine with the same
+    arguments. Calls run on a thread pool of 'max_concurrency' workers that share the
+    client's pooled, retrying session, so at most that many requests are in flight and
+    the rest wait their turn. 'client' is the underlying sync NRFCloud(FOTA).
+    """
+
+    def __init__(
+        self, api_key: str=None, max_concurrency: int=HTTP_MAX_CONNECTIONS,
+        client: NRFCloud=None, **kwargs
+    ) -> None:
+        if client is None:
+            client = NRFCloudFOTA(api_key, max_connections=max_concurrency, **kwargs)
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_concurrency, thread_name_prefix="nrfcloud")
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(attr, *args, **kwargs))
+
+        return call
+
+    async def __aenter__(self) -> "AsyncNRFCloud":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.client.session.close()
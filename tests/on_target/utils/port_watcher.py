@@ -0,0 +1,228 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Union
+sys.path.append(os.getcwd())
+from utils.logger import get_logger
+
+logger = get_logger()
+
+SERIAL_BY_ID = "/dev/serial/by-id"
+# Directory rescan interval where inotify is not available
+PORT_POLL_INTERVAL = 0.1
+
+# From <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_EVENT = struct.Struct("iIII")
+WATCH_MASK = IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+
+class Inotify:
+    """ Minimal non-blocking inotify instance through ctypes, Linux only """
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._rm_watch(self.fd, wd)
+
+    def read(self) -> list:
+        """ Pending events as (watch descriptor, mask) tuples """
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, length = IN_EVENT.unpack_from(data, pos)
+                events.append((wd, mask))
+                pos += IN_EVENT.size + length
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PortWatcher:
+    """
+    Cached listing of a device directory such as /dev/serial/by-id, kept up to date by
+    inotify on 'loop', or by rescanning every PORT_POLL_INTERVAL seconds where inotify
+    is not available. The directory itself may come and go, like by-id does when the
+    last USB serial device is unplugged.
+
+    Use SerialEngine.port_watcher() rather than creating one directly.
+    """
+
+    def __init__(self, directory: str, loop: asyncio.AbstractEventLoop) -> None:
+        self.directory = directory
+        self.loop = loop
+        # Full paths of the directory entries, replaced as a whole on every change
+        self.entries = frozenset()
+        self._cond = threading.Condition()
+        self._waiters = {}
+        self._next_handle = 0
+        self._inotify = None
+        self._dir_wd = None
+        self._ancestor_wd = None
+        self._poll_timer = None
+        try:
+            self._inotify = Inotify()
+        except (OSError, AttributeError) as e:
+            logger.info(f"inotify not available ({e}), polling {directory}")
+        self._call(self._start)
+
+    def _call(self, func, *args) -> None:
+        # Run func(*args) on the loop and wait for it, or directly from within the loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            func(*args)
+            return
+        asyncio.run_coroutine_threadsafe(self._run(func, *args), self.loop).result()
+
+    @staticmethod
+    async def _run(func, *args) -> None:
+        func(*args)
+
+    def _start(self) -> None:
+        if self._inotify:
+            self._update_watches()
+            self.loop.add_reader(self._inotify.fd, self._on_events)
+        else:
+            self._poll_timer = self.loop.call_later(PORT_POLL_INTERVAL, self._poll)
+        self._rescan()
+
+    def _update_watches(self) -> None:
+        # Watch the directory, or the closest existing parent until it is created
+        if self._dir_wd is None:
+            try:
+                self._dir_wd = self._inotify.add_watch(self.directory, WATCH_MASK | IN_ONLYDIR)
+            except OSError as e:
+                if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                    raise
+        if self._dir_wd is not None:
+            if self._ancestor_wd is not None:
+                self._inotify.rm_watch(self._ancestor_wd)
+                self._ancestor_wd = None
+            return
+        if self._ancestor_wd is None:
+            parent = os.path.dirname(self.directory)
+            while not os.path.isdir(parent):
+                parent = os.path.dirname(parent)
+            self._ancestor_wd = self._inotify.add_watch(parent, IN_CREATE | IN_MOVED_TO | IN_ONLYDIR)
+
+    def _on_events(self) -> None:
+        for wd, mask in self._inotify.read():
+            if mask & IN_IGNORED:
+                # Watched directory removed
+                if wd == self._dir_wd:
+                    self._dir_wd = None
+                elif wd == self._ancestor_wd:
+                    self._ancestor_wd = None
+        self._update_watches()
+        self._rescan()
+
+    def _poll(self) -> None:
+        self._rescan()
+        self._poll_timer = self.loop.call_later(PORT_POLL_INTERVAL, self._poll)
+
+    def _rescan(self) -> None:
+        try:
+            entries = frozenset(os.path.join(self.directory, e) for e in os.listdir(self.directory))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            entries = frozenset()
+        if entries == self.entries:
+            return
+        appeared = entries - self.entries
+        with self._cond:
+            self.entries = entries
+            self._cond.notify_all()
+        for handle, (path, callback) in list(self._waiters.items()):
+            if path in appeared:
+                self._fire(handle)
+
+    def ports(self, name: str = "") -> list:
+        """ Sorted paths of the entries containing 'name' """
+        return sorted(path for path in self.entries if name in path)
+
+    def wait_for(self, name: str, timeout: float) -> Union[str, None]:
+        """ First entry containing 'name', waiting up to 'timeout' seconds for one """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                ports = self.ports(name)
+                if ports:
+                    return ports[0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def when_present(self, path: str, callback) -> int:
+        """
+        Call callback() on the loop once 'path' is in the directory, right away if it is.
+        Must be called on the loop.
+
+        :return: Handle for cancel()
+        """
+        self._next_handle += 1
+        self._waiters[self._next_handle] = (path, callback)
+        if path in self.entries:
+            self.loop.call_soon(self._fire, self._next_handle)
+        return self._next_handle
+
+    def _fire(self, handle: int) -> None:
+        waiter = self._waiters.pop(handle, None)
+        if waiter:
+            waiter[1]()
+
+    def cancel(self, handle: int) -> None:
+        self._waiters.pop(handle, None)
+
+    def close(self) -> None:
+        self._call(self._close)
+
+    def _close(self) -> None:
+        if self._poll_timer:
+            self._poll_timer.cancel()
+        if self._inotify:
+            self.loop.remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        self._waiters.clear()
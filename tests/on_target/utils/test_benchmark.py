@@ -0,0 +1,38 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import pytest
+from benchmark import BenchmarkResults, compare, percentile, phase_durations
+
+def test_percentile():
+    """Test nearest-rank percentiles"""
+    values = [5, 1, 4, 2, 3]
+    assert percentile(values, 50) == 3
+    assert percentile(values, 95) == 5
+    assert percentile([7], 95) == 7
+
+def test_phase_durations():
+    """Test that milestones turn into consecutive phases plus the total"""
+    milestones = [("Connected to LTE", 10.0, 10.0), ("Authorized", 12.5, 2.5)]
+    assert phase_durations(milestones) == {
+        "reset -> Connected to LTE": 10.0,
+        "Connected to LTE -> Authorized": 2.5,
+        "reset -> Authorized": 12.5,
+    }
+    with pytest.raises(ValueError, match="Authorized"):
+        phase_durations([("Connected to LTE", 10.0, 10.0), ("Authorized", None, None)])
+
+def test_compare(tmp_path):
+    """Test that compare flags phases slower than the threshold"""
+    baseline = BenchmarkResults("sample", "v1")
+    results = BenchmarkResults("sample", "v2")
+    for seconds in [10, 11, 12]:
+        baseline.add({"attach": seconds, "auth": 2})
+        results.add({"attach": seconds * 1.1, "auth": 3})
+    baseline.save(str(tmp_path / "baseline.json"))
+    regressions = compare(results.to_dict(), baseline.to_dict(), threshold=0.2)
+    assert len(regressions) == 2
+    assert all(r.startswith("auth: ") for r in regressions)
+    assert compare(results.to_dict(), baseline.to_dict(), threshold=0.6) == []
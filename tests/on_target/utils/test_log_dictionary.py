@@ -0,0 +1,149 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import contextlib
+import io
+import json
+import os
+import struct
+import sys
+
+import pytest
+import log_dictionary
+from log_dictionary import ANSI_ESCAPE_RE, DictionaryLogDecoder, import_dictionary_parser
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "data")
+# log_dictionary.json of a build with CONFIG_LOG_DICTIONARY_SUPPORT and the binary log
+# its UART carried, captured with UartBinary
+DICTIONARY = os.path.join(DATA, "log_dictionary.json")
+CAPTURE = os.path.join(DATA, "log_dictionary.bin")
+
+
+# Stand-in for Zephyr's dictionary_parser with the interface DictionaryLogDecoder uses:
+# a message is a string id and a length prefixed %s argument
+PARSER_PACKAGE = {
+    "__init__.py": """
+import struct
+
+
+class Parser:
+    fmt_msg_type = "<B"
+    fmt_dropped_cnt = "<H"
+
+    def __init__(self, database):
+        self.strings = database["strings"]
+
+    def parse_one_normal_msg(self, data, offset):
+        string_id, length = struct.unpack_from("<BB", data, offset)
+        print(self.strings[str(string_id)] % data[offset + 2:offset + 2 + length].decode())
+        return offset + 2 + length
+
+
+def get_parser(database):
+    return Parser(database)
+""",
+    "log_database.py": """
+import json
+
+
+class LogDatabase:
+    @staticmethod
+    def read_json_database(path):
+        with open(path) as f:
+            return json.load(f)
+""",
+}
+
+
+@pytest.fixture
+def dictionary(tmp_path, monkeypatch):
+    # log_dictionary.json for the dictionary_parser of PARSER_PACKAGE, found through ZEPHYR_BASE
+    scripts = tmp_path / "scripts" / "logging" / "dictionary"
+    (scripts / "dictionary_parser").mkdir(parents=True)
+    for name, source in PARSER_PACKAGE.items():
+        (scripts / "dictionary_parser" / name).write_text(source)
+    monkeypatch.setenv("ZEPHYR_BASE", str(tmp_path))
+    monkeypatch.syspath_prepend(str(scripts))
+    for module in ("dictionary_parser", "dictionary_parser.log_database"):
+        monkeypatch.delitem(sys.modules, module, raising=False)
+    path = tmp_path / "log_dictionary.json"
+    path.write_text(json.dumps({"strings": {"1": "<inf> app: %s"}}))
+    yield str(path)
+    for module in ("dictionary_parser", "dictionary_parser.log_database"):
+        if str(tmp_path) in (getattr(sys.modules.get(module), "__file__", None) or ""):
+            del sys.modules[module]
+
+def message(text: str) -> bytes:
+    return bytes([log_dictionary.MSG_TYPE_NORMAL, 1, len(text)]) + text.encode()
+
+def test_decoder_split_messages(dictionary):
+    """Test that messages split across reads are decoded once complete, and only once"""
+    decoder = DictionaryLogDecoder(dictionary)
+    data = message("first") + message("second") + struct.pack("<BH", log_dictionary.MSG_TYPE_DROPPED, 3)
+    lines = []
+    for i in range(0, len(data), 3):
+        lines += decoder.feed(data[i:i + 3])
+    assert lines == ["<inf> app: first", "<inf> app: second", "--- 3 messages dropped ---"]
+    assert decoder._pending == b""
+
+def test_decoder_keeps_tail(dictionary):
+    """Test that continuous output keeps only the incomplete message pending"""
+    decoder = DictionaryLogDecoder(dictionary)
+    msg = message("x" * 200)
+    lines = []
+    for _ in range(1000):
+        lines += decoder.feed(msg[:100])
+        assert len(decoder._pending) == 100
+        lines += decoder.feed(msg[100:])
+    assert len(lines) == 1000
+
+def test_decoder_resync(dictionary):
+    """Test that a corrupt byte or an unknown string only costs the message it hits"""
+    decoder = DictionaryLogDecoder(dictionary)
+    data = b"\x07" + b"".join(message(f"line {i}") for i in range(100))
+    data += bytes([log_dictionary.MSG_TYPE_NORMAL, 9, 2]) + b"x\n" + message("after")
+    lines = []
+    for i in range(0, len(data), 5):
+        lines += decoder.feed(data[i:i + 5])
+    assert lines[:100] == [f"<inf> app: line {i}" for i in range(100)]
+    assert lines[-1] == "<inf> app: after"
+
+def test_decoder_text(dictionary):
+    """Test that shell and AT output between messages passes as text lines"""
+    decoder = DictionaryLogDecoder(dictionary)
+    data = message("booted") + b"\x1b[1;32muart:~$ \x1b[mat AT\r\nOK\r\n" + message("connected")
+    lines = []
+    for i in range(0, len(data), 3):
+        lines += decoder.feed(data[i:i + 3])
+    assert lines == ["<inf> app: booted", "uart:~$ at AT", "OK", "<inf> app: connected"]
+
+def test_decoder_flush(dictionary):
+    """Test that flush() drops a cut off message and returns the partial line"""
+    decoder = DictionaryLogDecoder(dictionary)
+    assert decoder.feed(b"uart:~$ " + message("lost")[:3]) == []
+    assert decoder.flush() == ["uart:~$"]
+    assert decoder.feed(message("after")) == ["<inf> app: after"]
+
+def test_decoder_capture():
+    """Test that a captured binary log decodes the same in small reads as in one piece"""
+    modules = import_dictionary_parser()
+    if modules is None:
+        pytest.skip("Zephyr dictionary_parser not found, set ZEPHYR_BASE")
+    if not (os.path.isfile(DICTIONARY) and os.path.isfile(CAPTURE)):
+        pytest.skip("Log dictionary capture not available")
+    with open(CAPTURE, "rb") as f:
+        data = f.read()
+    dictionary_parser, LogDatabase = modules
+    reference = io.StringIO()
+    with contextlib.redirect_stdout(reference):
+        dictionary_parser.get_parser(LogDatabase.read_json_database(DICTIONARY)).parse_log_data(data)
+    expected = [line.rstrip() for line in ANSI_ESCAPE_RE.sub("", reference.getvalue()).split("\n")[:-1]]
+    assert expected
+    for size in (len(data), 64, 7, 1):
+        decoder = DictionaryLogDecoder(DICTIONARY)
+        lines = []
+        for i in range(0, len(data), size):
+            lines += decoder.feed(data[i:i + size])
+        assert lines == expected
@@ -0,0 +1,250 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import asyncio
+import json
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import nrfcloud
+import pytest
+from nrfcloud import AsyncNRFCloud, NRFCloud, NRFCloudFOTA
+
+
+class FakeCloud:
+    """nRF Cloud REST API stand-in, 'routes' maps (method, path) to handler(request)"""
+
+    def __init__(self) -> None:
+        self.routes = {}
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        cloud = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.body = self.rfile.read(length) if length else b""
+                path, _, query = self.path.partition("?")
+                self.route = path[len("/v1"):]
+                self.query = dict(urllib.parse.parse_qsl(query))
+                with cloud._lock:
+                    cloud.requests.append((self.command, self.route, self.query))
+                    cloud.in_flight += 1
+                    cloud.max_in_flight = max(cloud.max_in_flight, cloud.in_flight)
+                try:
+                    handler = cloud.routes.get((self.command, self.route))
+                    status, body, headers = handler(self) if handler else (404, {}, {})
+                finally:
+                    with cloud._lock:
+                        cloud.in_flight -= 1
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def cloud():
+    fake = FakeCloud()
+    yield fake
+    fake.close()
+
+def test_async_concurrency(cloud):
+    """Test that AsyncNRFCloud runs calls concurrently up to max_concurrency"""
+    def device(request):
+        time.sleep(0.2)
+        return 200, {"id": request.route.split("/")[-1]}, {}
+
+    for i in range(8):
+        cloud.routes[("GET", f"/devices/dev{i}")] = device
+
+    async def main():
+        async with AsyncNRFCloud("key", max_concurrency=4, url=cloud.url) as client:
+            return await asyncio.gather(*(client.get_device(f"dev{i}") for i in range(8)))
+
+    start = time.monotonic()
+    shadows = asyncio.run(main())
+    assert [s["id"] for s in shadows] == [f"dev{i}" for i in range(8)]
+    assert time.monotonic() - start < 0.7
+    assert cloud.max_in_flight == 4
+
+def test_retry_backoff(cloud, monkeypatch):
+    """Test that idempotent requests are retried on 503 and honour Retry-After"""
+    monkeypatch.setattr(nrfcloud, "HTTP_BACKOFF", 0.01)
+    answers = [(503, {}, {"Retry-After": "0"}), (503, {}, {}), (200, {"id": "dev"}, {})]
+    cloud.routes[("GET", "/devices/dev")] = lambda request: answers.pop(0)
+    client = NRFCloudFOTA("key", url=cloud.url)
+    assert client.get_device("dev") == {"id": "dev"}
+    assert len(cloud.requests) == 3
+    cloud.routes[("POST", "/fota-jobs")] = lambda request: (503, {}, {})
+    with pytest.raises(nrfcloud.HTTPError):
+        client.create_fota_job("dev", "bundle")
+    assert len(cloud.requests) == 4
+
+TIME_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+def paged(items, request):
+    """Page of 'items' for request like nRF Cloud does, with pageNextToken"""
+    limit = int(request.query.get("pageLimit", 10))
+    offset = int(request.query.get("pageNextToken", 0))
+    page = {"items": items[offset:offset + limit], "total": len(items)}
+    if offset + limit < len(items):
+        page["pageNextToken"] = str(offset + limit)
+    return page
+
+def add_message(messages, text, age=0.0):
+    received = datetime.now(timezone.utc) - timedelta(seconds=age)
+    messages.append({
+        "receivedAt": received.strftime(TIME_FMT),
+        "topic": "d/dev/d2c",
+        "message": {"sample_message": text},
+    })
+
+def serve_messages(cloud, messages):
+    def handler(request):
+        items = sorted(
+            (m for m in messages if request.query["start"] <= m["receivedAt"] <= request.query["end"]),
+            key=lambda m: m["receivedAt"],
+        )
+        return 200, paged(items, request), {}
+
+    cloud.routes[("GET", "/messages")] = handler
+
+def test_message_stream_1_incremental(cloud):
+    """Test that a message stream yields every message once, also ones stored late"""
+    messages = []
+    serve_messages(cloud, messages)
+    client = NRFCloud("key", url=cloud.url)
+    stream = client.message_stream("dev", start=time.time() - 60)
+    add_message(messages, "old", age=120)
+    for i in range(3):
+        add_message(messages, f"hello {i}", age=30 - i)
+    assert [m["sample_message"] for _, m in stream.poll()] == ["hello 0", "hello 1", "hello 2"]
+    assert list(stream.poll()) == []
+    # Stored late, within the overlap behind the newest message seen
+    add_message(messages, "late", age=29.5)
+    add_message(messages, "new")
+    assert [m["sample_message"] for _, m in stream.poll()] == ["late", "new"]
+    add_message(messages, "too late", age=29)
+    assert list(stream.poll()) == []
+    assert cloud.requests[-1][2]["deviceId"] == "dev"
+
+def test_message_stream_2_lazy_pages(cloud):
+    """Test that pages are fetched only as far as the stream is consumed"""
+    messages = []
+    serve_messages(cloud, messages)
+    for i in range(5):
+        add_message(messages, f"hello {i}", age=10 - i)
+    stream = NRFCloud("key", url=cloud.url).message_stream(start=time.time() - 60)
+    stream.params["pageLimit"] = 2
+    poll = stream.poll()
+    assert next(poll)[1]["sample_message"] == "hello 0"
+    assert len(cloud.requests) == 1
+    assert [m["sample_message"] for _, m in poll] == ["hello 1", "hello 2", "hello 3", "hello 4"]
+    assert len(cloud.requests) == 3
+
+def test_cancel_incomplete_jobs_1_executions(cloud):
+    """Test that pending executions of one device are listed by the server and cancelled in parallel"""
+    states = ["SUCCEEDED", "FAILED", "CANCELLED", "QUEUED", "IN_PROGRESS"] + ["SUCCEEDED"] * 5
+    executions = [{"jobId": f"job{i}", "status": states[i % 10]} for i in range(250)]
+    cloud.routes[("GET", "/fota-job-executions/dev")] = lambda request: (200, paged(executions, request), {})
+    cancelled = []
+
+    def patch(request):
+        time.sleep(0.02)
+        cancelled.append((request.route.split("/")[-1], json.loads(request.body)["status"]))
+        return 200, {}, {}
+
+    for e in executions:
+        cloud.routes[("PATCH", f"/fota-job-executions/dev/{e['jobId']}")] = patch
+    client = NRFCloudFOTA("key", url=cloud.url)
+    start = time.monotonic()
+    durations = client.cancel_incomplete_jobs("dev", max_workers=8)
+    # 50 cancellations of at least 20 ms each
+    assert time.monotonic() - start < 1
+    expected = sorted(e["jobId"] for e in executions if e["status"] in ["QUEUED", "IN_PROGRESS"])
+    assert sorted(durations) == expected
+    assert sorted(job for job, _ in cancelled) == expected
+    assert {status for _, status in cancelled} == {"CANCELLED"}
+    assert all(d >= 0.02 for d in durations.values())
+    assert sum(1 for method, route, _ in cloud.requests if method == "GET") == 3
+
+def test_cancel_incomplete_jobs_2_scan_fallback(cloud):
+    """Test that all FOTA jobs are scanned where executions can not be listed per device"""
+    jobs = [
+        {"jobId": "job0", "status": "COMPLETED", "target": {"deviceIds": ["dev"]}},
+        {"jobId": "job1", "status": "IN_PROGRESS", "target": {"deviceIds": ["other"]}},
+        {"jobId": "job2", "status": "QUEUED", "target": {"deviceIds": ["dev"]}},
+    ]
+    cloud.routes[("GET", "/fota-jobs")] = lambda request: (200, paged(jobs, request), {})
+    cloud.routes[("PATCH", "/fota-job-executions/dev/job2")] = lambda request: (200, {}, {})
+    client = NRFCloudFOTA("key", url=cloud.url)
+    assert list(client.cancel_incomplete_jobs("dev")) == ["job2"]
+
+def serve_shadow(cloud, shadow, delay=0.0):
+    def handler(request):
+        time.sleep(delay)
+        etag = f'"{shadow["version"]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return 304, None, {"ETag": etag}
+        return 200, shadow, {"ETag": etag}
+
+    cloud.routes[("GET", "/devices/dev")] = handler
+
+def test_shadow_cache_1_ttl_and_etag(cloud, monkeypatch):
+    """Test that shadow fields are served from the cache within the TTL, then revalidated"""
+    shadow = {"version": 1, "state": {"reported": {"device": {"deviceInfo": {
+        "appVersion": "1.0.0", "modemFirmware": "mfw_nrf91x1_2.0.2"}}}}}
+    serve_shadow(cloud, shadow)
+    client = NRFCloudFOTA("key", url=cloud.url)
+    client.shadows.ttl = 0.2
+    info = "state.reported.device.deviceInfo"
+    assert client.get_device_field("dev", f"{info}.appVersion") == "1.0.0"
+    assert client.get_device_field("dev", f"{info}.modemFirmware") == "mfw_nrf91x1_2.0.2"
+    assert client.get_device_field("dev", ["state", "desired"], default=None) is None
+    with pytest.raises(KeyError):
+        client.get_device_field("dev", f"{info}.imei")
+    assert len(cloud.requests) == 1
+    time.sleep(0.2)
+    assert client.get_device("dev")["version"] == 1
+    assert client.shadows.not_modified == 1
+    shadow["version"] = 2
+    shadow["state"]["reported"]["device"]["deviceInfo"]["appVersion"] = "1.0.1"
+    assert client.get_device_field("dev", f"{info}.appVersion", max_age=0) == "1.0.1"
+    assert client.shadows.requests == 3
+
+def test_shadow_cache_2_single_flight(cloud):
+    """Test that concurrent readers of one shadow share a single request"""
+    serve_shadow(cloud, {"version": 1}, delay=0.2)
+
+    async def main():
+        async with AsyncNRFCloud("key", url=cloud.url) as client:
+            return await asyncio.gather(*(client.get_device("dev") for _ in range(8)))
+
+    assert asyncio.run(main()) == [{"version": 1}] * 8
+    assert len(cloud.requests) == 1
@@ -0,0 +1,83 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import os
+import threading
+import time
+from unittest.mock import Mock
+
+import port_watcher
+import pytest
+import uart
+from port_watcher import PortWatcher
+from uart import SerialEngine
+
+@pytest.fixture(params=["inotify", "poll"])
+def watch(request, monkeypatch):
+    if request.param == "poll":
+        monkeypatch.setattr(port_watcher, "Inotify", Mock(side_effect=OSError("not supported")))
+    watchers = []
+
+    def create(directory):
+        watcher = PortWatcher(str(directory), SerialEngine.get().loop)
+        watchers.append(watcher)
+        return watcher
+
+    yield create
+    for watcher in watchers:
+        watcher.close()
+
+def test_port_watcher_1_wait_for(watch, tmp_path):
+    """Test that wait_for() returns a port as soon as it is created"""
+    watcher = watch(tmp_path)
+    path = tmp_path / "usb-Nordic_Semiconductor_Thingy_91_X_UART_1234-if01"
+    assert watcher.wait_for("1234", timeout=0) is None
+    threading.Timer(0.1, path.touch).start()
+    start = time.monotonic()
+    assert watcher.wait_for("1234", timeout=2) == str(path)
+    assert time.monotonic() - start < 0.5
+    assert watcher.ports("UART") == [str(path)]
+
+def test_port_watcher_2_directory_comes_and_goes(watch, tmp_path):
+    """Test that the watcher follows a directory that is removed and created again"""
+    directory = tmp_path / "by-id"
+    watcher = watch(directory)
+    assert watcher.ports() == []
+    hits = []
+    path = str(directory / "port")
+    SerialEngine.get().call(watcher.when_present, path, lambda: hits.append(time.monotonic()))
+    directory.mkdir()
+    (directory / "port").touch()
+    assert watcher.wait_for("port", timeout=2) == path
+    time.sleep(0.2)
+    assert len(hits) == 1
+    os.remove(path)
+    directory.rmdir()
+    time.sleep(0.3)
+    assert watcher.ports() == []
+    directory.mkdir()
+    (directory / "port").touch()
+    assert watcher.wait_for("port", timeout=2) == path
+
+def test_port_watcher_3_created_from_loop(tmp_path, monkeypatch):
+    """Test that the loop thread can ask for a watcher while another thread creates one"""
+    engine = SerialEngine()
+    # The class uart.py uses, imported as utils.port_watcher
+    start = uart.PortWatcher._start
+
+    def start_and_ask(watcher):
+        start(watcher)
+        if watcher.directory == str(tmp_path / "a"):
+            # Like Uart._schedule_reopen() on the loop
+            engine.port_watcher(str(tmp_path / "b"))
+
+    monkeypatch.setattr(uart.PortWatcher, "_start", start_and_ask)
+    t = threading.Thread(target=engine.port_watcher, args=[str(tmp_path / "a")], daemon=True)
+    t.start()
+    t.join(5)
+    assert not t.is_alive()
+    assert sorted(engine._port_watchers) == [str(tmp_path / "a"), str(tmp_path / "b")]
+    for watcher in engine._port_watchers.values():
+        watcher.close()
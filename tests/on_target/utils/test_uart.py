@@ -3,11 +3,34 @@
 # SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
 ##########################################################################################
 
+import asyncio
+import gzip
+import os
+import pty
+import re
+import threading
+import tty
 import time
 from unittest.mock import Mock, patch
 
 import pytest
-from uart import Uart
+import serial
+import trace_index
+import uart
+from uart import (
+    ATError,
+    DeviceFault,
+    FaultDetector,
+    InactivityWatchdog,
+    OrderedMatcher,
+    PatternAutomaton,
+    StrMatcher,
+    TraceWriter,
+    Uart,
+    UartBinary,
+    UartLog,
+    open_trace,
+)
 
 
 def counter():
@@ -16,35 +39,43 @@ def counter():
         yield i
         i += 1
 
-@patch("uart.Uart.__init__")
-def mocked_uart(uart_init):
-    uart_init.return_value = None
-    u = Uart("uart")
-    u._evt = Mock()
-    u._evt.is_set.return_value = False
-    return u
+@pytest.fixture
+def pty_port():
+    # Raw pty standing in for the DUT, yields its device side fd and the port to open
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    yield master_fd, os.ttyname(slave_fd)
+    os.close(master_fd)
+    os.close(slave_fd)
+
+@pytest.fixture
+def pty_uart(pty_port):
+    # Uart capturing from an idle pty, the tests put lines into its log directly
+    u = Uart(pty_port[1], name="uart")
+    yield u
+    u.stop()
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_1(time_sleep, time_time):
+def test_wait_1(time_sleep, time_time, pty_uart):
     """Test that wait_for_str() works for list"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\n"
     u.wait_for_str(["foo", "bar", "baz"])
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_2_out_of_order(time_sleep, time_time):
+def test_wait_2_out_of_order(time_sleep, time_time, pty_uart):
     """Test that wait_for_str() works for out of order list"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\n"
     u.wait_for_str(["baz", "foo", "bar"], timeout=3)
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_3_missing(time_sleep, time_time):
+def test_wait_3_missing(time_sleep, time_time, pty_uart):
     """Test that wait_for_str() asserts when string is missing"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\n"
     with pytest.raises(AssertionError) as ex_info:
         u.wait_for_str(["baz", "foo", "bar", "1234"], timeout=3)
@@ -52,17 +83,17 @@ def test_wait_3_missing(time_sleep, time_time):
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_ordered_1(time_sleep, time_time):
+def test_wait_ordered_1(time_sleep, time_time, pty_uart):
     """Test that wait_for_str_ordered() works for list"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\n"
     u.wait_for_str_ordered(["foo", "bar", "baz"], timeout=3)
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_ordered_2_missing(time_sleep, time_time):
+def test_wait_ordered_2_missing(time_sleep, time_time, pty_uart):
     """Test that wait_for_str_ordered() asserts when string is missing"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\n"
     with pytest.raises(AssertionError) as ex_info:
         u.wait_for_str_ordered(["foo", "bar", "baz", "1234"], timeout=3)
@@ -70,9 +101,9 @@ def test_wait_ordered_2_missing(time_sleep, time_time):
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_ordered_3_out_of_order(time_sleep, time_time):
+def test_wait_ordered_3_out_of_order(time_sleep, time_time, pty_uart):
     """Test that wait_for_str_ordered() asserts when strings are out of order"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\n"
     with pytest.raises(AssertionError) as ex_info:
         u.wait_for_str_ordered(["foo", "baz", "bar"], timeout=3)
@@ -80,17 +111,17 @@ def test_wait_ordered_3_out_of_order(time_sleep, time_time):
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_ordered_4_multiple(time_sleep, time_time):
+def test_wait_ordered_4_multiple(time_sleep, time_time, pty_uart):
     """Test that wait_for_str_ordered() works for multiple identical strings"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\nfoo123\nfoo123\nbar123\n"
     u.wait_for_str_ordered(["foo", "foo", "foo"], timeout=3)
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_ordered_5_overflow(time_sleep, time_time):
+def test_wait_ordered_5_overflow(time_sleep, time_time, pty_uart):
     """Test that wait_for_str_ordered() asserts when too many identical strings"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\nfoo123\nfoo123\nbar123\n"
     with pytest.raises(AssertionError) as ex_info:
         u.wait_for_str_ordered(["foo", "foo", "foo", "foo"], timeout=3)
@@ -98,9 +129,9 @@ def test_wait_ordered_5_overflow(time_sleep, time_time):
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_ordered_6_out_of_order(time_sleep, time_time):
+def test_wait_ordered_6_out_of_order(time_sleep, time_time, pty_uart):
     """Test that wait_for_str_ordered() asserts when strings are out of order"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\nfoo123\nfoo123\nbar123\n"
     with pytest.raises(AssertionError) as ex_info:
         u.wait_for_str_ordered(["foo", "bar", "foo", "baz"], timeout=3)
@@ -108,9 +139,9 @@ def test_wait_ordered_6_out_of_order(time_sleep, time_time):
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_ordered_7_none(time_sleep, time_time):
+def test_wait_ordered_7_none(time_sleep, time_time, pty_uart):
     """Test that wait_for_str_ordered() asserts when no strings are found"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\nfoo123\nfoo123\nbar123\n"
     with pytest.raises(AssertionError) as ex_info:
         u.wait_for_str_ordered(["abc", "def", "ghi", "jkl"], timeout=2)
@@ -118,18 +149,31 @@ def test_wait_ordered_7_none(time_sleep, time_time):
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_8_get_current_size(time_sleep, time_time):
+def test_wait_ordered_8_empty(time_sleep, time_time, pty_uart):
+    """Test that empty strings match right away like str.find() does"""
+    u = pty_uart
+    u.log = "foo123\nbar123\n"
+    u.wait_for_str("", timeout=0)
+    u.wait_for_str(["", "bar"], timeout=0)
+    u.wait_for_str_ordered([""], timeout=0)
+    u.wait_for_str_ordered(["foo", "", "bar"], timeout=0)
+    with pytest.raises(AssertionError):
+        u.wait_for_str(["", "baz"], timeout=2)
+
+@patch("time.time", side_effect=counter())
+@patch("time.sleep")
+def test_wait_8_get_current_size(time_sleep, time_time, pty_uart):
     """Test that wait_for_str() returns current log size"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\n"
     current_log_size = u.wait_for_str(["bar"], timeout=3)
     assert current_log_size == len(u.log)
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_9_start_position(time_sleep, time_time):
+def test_wait_9_start_position(time_sleep, time_time, pty_uart):
     """Test that wait_for_str() starts from given position"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo123\nbar123\nbaz123\n"
     bar_pos = u.log.find("bar")
     with pytest.raises(AssertionError) as ex_info:
@@ -139,26 +183,599 @@ def test_wait_9_start_position(time_sleep, time_time):
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_10_extract_one_value(time_sleep, time_time):
+def test_wait_10_extract_one_value(time_sleep, time_time, pty_uart):
     """Test that extract_value() works for one value"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo: 123.45\n bar: 23.45 \n  baz: 0.1234\n"
     assert float(u.extract_value(r"bar: (\d.+)")[0]) == 23.45
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_11_extract_three_values(time_sleep, time_time):
+def test_wait_11_extract_three_values(time_sleep, time_time, pty_uart):
     """Test that extract_value() works for multiple values"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo: 123.45 bar: 23.45  baz: 0.1234"
     extrated_values = u.extract_value(r"foo: (\d.+) bar: (\d.+) baz: (\d.+)")
     assert [float(x) for x in extrated_values] == [123.45, 23.45, 0.1234]
 
 @patch("time.time", side_effect=counter())
 @patch("time.sleep")
-def test_wait_12_extract_missing_values(time_sleep, time_time):
+def test_wait_12_extract_missing_values(time_sleep, time_time, pty_uart):
     """Test that extract_value() returns None when values are missing"""
-    u = mocked_uart()
+    u = pty_uart
     u.log = "foo: 123.45 baz: 23.45  bar: 0.1234"
     extrated_values = u.extract_value(r"foo: (\d.+) foo: (\d.+) foo: (\d.+)")
     assert extrated_values is None
+
+def test_extract_dict(monkeypatch, pty_uart):
+    """Test that extract_dict() returns named groups and resumes on later calls"""
+    monkeypatch.setattr(uart, "LOG_SEARCH_OVERLAP", 16)
+    u = pty_uart
+    pattern = r"Modem FW:\s+(?P<version>mfw_nrf9..._\d\.\d\.\d)"
+    for i in range(20):
+        u._append_line(f"line {i}")
+    assert u.extract_dict(pattern) is None
+    matcher = u._regex_matchers[(re.compile(pattern), 0)]
+    assert matcher.resume > 0
+    u._append_line("nrf_cloud_info: Modem FW:     mfw_nrf91x1_2.0.2")
+    u._append_line("nrf_cloud_info: Modem FW:     mfw_nrf91x1_2.0.3")
+    assert u.extract_dict(pattern) == {"version": "mfw_nrf91x1_2.0.2"}
+    assert u.extract_value(pattern) == ("mfw_nrf91x1_2.0.2",)
+    assert u.whole_log[matcher.position:].startswith("Modem FW:     mfw_nrf91x1_2.0.2")
+
+def test_wait_13_wakes_on_new_line(pty_uart):
+    """Test that wait_for_str() returns as soon as the matching line is appended"""
+    u = pty_uart
+    u.log = ""
+    threading.Timer(0.1, u._append_line, args=["foo123"]).start()
+    start = time.monotonic()
+    u.wait_for_str("foo", timeout=5)
+    assert time.monotonic() - start < 1
+
+def test_feed_1_chunked_lines(pty_uart):
+    """Test that _feed() splits chunks into lines and keeps partial lines pending"""
+    u = pty_uart
+    u.log = ""
+    pending = bytearray()
+    u._feed(pending, b"foo123\r\nbar")
+    assert u.log == "\nfoo123"
+    assert pending == b"bar"
+    u._feed(pending, b"123\r\nbaz\xff123\r\n")
+    assert u.log == "\nfoo123\nbar123\nbaz123"
+    assert pending == b""
+
+def test_log_1_blocks():
+    """Test that UartLog finds, searches and slices across block boundaries"""
+    log = UartLog(block_size=8)
+    for line in ["foo123", "bar123", "baz123", "foo456"]:
+        log.append_line(line)
+    text = "\nfoo123\nbar123\nbaz123\nfoo456"
+    assert log.text() == text
+    assert log.text(5, 17) == text[5:17]
+    assert log.find("3\nbaz") == text.find("3\nbaz")
+    assert log.find("foo", 2) == text.find("foo", 2)
+    assert log.count("123") == 3
+    pos, match = log.search(re.compile(r"bar(\d+)\nbaz"), 3)
+    assert match.group(1) == "123"
+    assert pos + match.start() == text.find("bar")
+    assert log.line_index(text.find("baz")) == 2
+
+def test_log_5_search_anchors(monkeypatch):
+    """Test that UartLog.search anchors like a search of the whole text, not of each block"""
+    monkeypatch.setattr(uart, "LOG_SEARCH_OVERLAP", 6)
+    log = UartLog(block_size=8)
+    for line in ["foo123", "bar123", "baz123", "foo456"]:
+        log.append_line(line)
+    text = "\nfoo123\nbar123\nbaz123\nfoo456"
+    patterns = [r"\d+$", r"^\nfoo", r"^bar", r"(?m)^ba\w", r"(?m)\d$", r"\d\Z", r"(?<=3\n)baz", r"\bbar"]
+    for pattern in patterns:
+        regex = re.compile(pattern)
+        for origin in (0, 8):
+            for start in (origin, origin + 3, 15):
+                expected = regex.search(text[origin:], start - origin)
+                found = log.search(regex, start, origin)
+                assert (found and found[0] + found[1].start()) == (expected and origin + expected.start()), \
+                    (pattern, origin, start)
+    assert log.search(re.compile(r"^bar"), 8)[1].group() == "bar"
+
+def test_log_2_flush(pty_uart):
+    """Test that flush() only moves the start of log and keeps whole_log"""
+    u = pty_uart
+    u.log = ""
+    u._append_lines(["foo123", "bar123"])
+    u.flush()
+    u._append_line("baz123")
+    assert u.log == "\nbaz123"
+    assert u.get_size() == len(u.log)
+    assert u.whole_log == "\nfoo123\nbar123\nbaz123"
+    with pytest.raises(AssertionError):
+        u.wait_for_str("foo", timeout=0)
+
+def test_matcher_1_incremental():
+    """Test that matchers resume from where they stopped, including straddling matches"""
+    log = UartLog(block_size=4)
+    ordered = OrderedMatcher(log, ["foo", "bar", "foo"])
+    unordered = StrMatcher(log, ["bar123", "foo"])
+    log.append("\nfoo1")
+    assert not ordered.update()
+    assert not unordered.update()
+    assert ordered.missing == "bar"
+    assert unordered.missing == ["bar123"]
+    log.append("\nba")
+    assert not ordered.update()
+    assert not unordered.update()
+    log.append("r123\nfo")
+    assert not ordered.update()
+    assert unordered.update()
+    log.append("o")
+    assert ordered.update()
+
+def test_automaton_1_overlapping():
+    """Test that PatternAutomaton finds overlapping patterns across scanned pieces"""
+    automaton = PatternAutomaton(["ASSERT", "SSE", "Booting", "ASSERTION"])
+    state, hits = automaton.scan("x ASSE")
+    assert hits == [(6, "SSE")]
+    state, hits = automaton.scan("RTION Booting", state)
+    assert hits == [(2, "ASSERT"), (5, "ASSERTION"), (13, "Booting")]
+
+def test_watch_1_callback(pty_uart):
+    """Test that watchers are called for patterns in new log lines"""
+    u = pty_uart
+    u.log = ""
+    hits = []
+    handle = u.watch(["ASSERT", "Booting"], lambda pattern, pos: hits.append((pattern, pos)))
+    u._append_lines(["*** Booting nRF Connect SDK ***", "foo123", "ASSERTION FAIL"])
+    assert hits == [("Booting", u.whole_log.find("Booting")), ("ASSERT", u.whole_log.find("ASSERT"))]
+    u.unwatch(handle)
+    u._append_line("ASSERTION FAIL")
+    assert len(hits) == 2
+
+def test_fault_1_interrupts_wait(pty_uart):
+    """Test that an assertion in the log interrupts wait_for_str() with DeviceFault"""
+    u = pty_uart
+    u.log = ""
+    detector = FaultDetector(u)
+    threading.Timer(0.1, u._append_lines, args=[["foo123", "ASSERTION FAIL @ main.c:42"]]).start()
+    start = time.monotonic()
+    with pytest.raises(DeviceFault) as ex_info:
+        u.wait_for_str("bar", timeout=5)
+    assert time.monotonic() - start < 1
+    assert ex_info.value.kind == "assert"
+    assert "main.c:42" in ex_info.value.context
+    assert detector.faults == [("assert", u.whole_log.find("ASSERT"))]
+
+def test_fault_2_reboot_loop(pty_uart):
+    """Test that more than max_boots boots since flush() are a reboot loop"""
+    u = pty_uart
+    u.log = ""
+    FaultDetector(u, max_boots=2)
+    u._append_lines(["*** Booting nRF Connect SDK v2.9.0 ***"] * 2)
+    u.wait_for_str("Booting", timeout=0)
+    u.flush()
+    u._append_lines(["*** Booting nRF Connect SDK v2.9.0 ***"] * 2)
+    u.wait_for_str("Booting", timeout=0)
+    u._append_line("*** Booting nRF Connect SDK v2.9.0 ***")
+    with pytest.raises(DeviceFault, match="reboot loop"):
+        u.wait_for_str("foo", timeout=0)
+    u.flush()
+    u._append_line("foo123")
+    u.wait_for_str("foo", timeout=0)
+
+def test_fault_3_boot_window(pty_uart):
+    """Test that boots spread out further than boot_window are not a reboot loop"""
+    u = pty_uart
+    u.log = ""
+    FaultDetector(u, max_boots=2, boot_window=60)
+    for t in (0, 40, 80, 120):
+        u._append_lines(["*** Booting nRF Connect SDK v2.9.0 ***"], t=t)
+    u.wait_for_str("Booting", timeout=0)
+    u._append_lines(["*** Booting nRF Connect SDK v2.9.0 ***"], t=130)
+    with pytest.raises(DeviceFault, match="reboot loop"):
+        u.wait_for_str("foo", timeout=0)
+
+def test_fault_4_silence_withdrawn(pty_port, monkeypatch):
+    """Test that a silence abort fails the running wait, and not the next once output resumed"""
+    monkeypatch.setattr(uart, "WATCHDOG_INTERVAL", 0.05)
+    master_fd, port = pty_port
+    u = Uart(port, name="uart", watchdog=InactivityWatchdog(0.2, ("abort",)))
+    try:
+        start = time.monotonic()
+        with pytest.raises(DeviceFault, match="hang"):
+            u.wait_for_str("Booting", timeout=5)
+        assert time.monotonic() - start < 1
+        os.write(master_fd, b"*** Booting nRF Connect SDK v2.9.0 ***\r\n")
+        while u.whole_log_find("Booting") < 0 and time.monotonic() - start < 5:
+            time.sleep(0.01)
+        u.wait_for_str("Booting", timeout=0)
+        assert u.watchdog.silences == 1
+    finally:
+        u.stop()
+
+def test_fault_5_silence_rearmed(pty_port, monkeypatch):
+    """Test that a wait started while the DUT stays silent gets a silence window of its own"""
+    monkeypatch.setattr(uart, "WATCHDOG_INTERVAL", 0.05)
+    master_fd, port = pty_port
+    u = Uart(port, name="uart", watchdog=InactivityWatchdog(0.3, ("abort",)))
+    try:
+        with pytest.raises(DeviceFault, match="hang"):
+            u.wait_for_str("Booting", timeout=5)
+        threading.Timer(0.1, os.write, args=[master_fd, b"*** Booting nRF Connect SDK v2.9.0 ***\r\n"]).start()
+        u.wait_for_str("Booting", timeout=2)
+        start = time.monotonic()
+        with pytest.raises(DeviceFault, match="hang"):
+            u.wait_for_str("foo", timeout=5)
+        assert time.monotonic() - start < 1
+        assert u.watchdog.silences == 2
+    finally:
+        u.stop()
+
+def test_log_3_spill(tmp_path):
+    """Test that UartLog spills old blocks to disk and still searches the whole log"""
+    path = tmp_path / "uart.txt"
+    log = UartLog(block_size=16, max_memory=32, spill_path=str(path))
+    lines = [f"line {i} æøå" for i in range(50)]
+    for line in lines:
+        log.append_line(line)
+    text = "".join("\n" + line for line in lines)
+    assert log._memory <= 32 + 16
+    assert log._spilled > 0
+    assert log.text() == text
+    assert log.find("line 3 ") == text.find("line 3 ")
+    assert log.count("æ") == 50
+    assert log.lines_around(text.find("line 10 "), 1, 1) == "\n".join(lines[9:12])
+    log.sync()
+    assert path.read_text(encoding="utf-8") == text
+    log.append_line("line 50")
+    assert log.text().endswith("line 49 æøå\nline 50")
+    log.close()
+
+def test_log_4_spill_reopen(tmp_path):
+    """Test that a closed UartLog streams its text from the spill file and can grow again"""
+    path = tmp_path / "uart.txt"
+    log = UartLog(block_size=16, max_memory=32, spill_path=str(path))
+    lines = [f"line {i}" for i in range(50)]
+    for line in lines:
+        log.append_line(line)
+    text = "".join("\n" + line for line in lines)
+    log.sync()
+    log.close()
+    assert log._spill_file is None
+    pieces = list(log.iter_text())
+    assert max(len(piece) for piece in pieces) <= 32
+    assert "".join(pieces) == text
+    assert "".join(log.iter_text(5, 40)) == text[5:40]
+    log.append_line("line 50")
+    log.sync()
+    log.close()
+    assert path.read_text(encoding="utf-8") == text + "\nline 50"
+
+def test_wait_for_async():
+    """Test that the awaitable wait_for wakes up on lines from the serial engine"""
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    u = Uart(os.ttyname(slave_fd))
+
+    async def waits():
+        threading.Timer(0.1, os.write, args=[master_fd, b"foo\r\nbar\r\n"]).start()
+        await asyncio.gather(
+            u.wait_for(["bar", "foo"], timeout=2),
+            u.wait_for(["foo", "bar"], ordered=True, timeout=2),
+        )
+        with pytest.raises(AssertionError, match="baz missing"):
+            await u.wait_for(["bar", "baz"], ordered=True, timeout=0.2)
+
+    try:
+        asyncio.run(waits())
+    finally:
+        u.stop()
+        os.close(master_fd)
+        os.close(slave_fd)
+    assert u.log == "\nfoo\nbar"
+
+def test_milestones(pty_uart):
+    """Test that milestones reports receive times relative to flush and to each other"""
+    u = pty_uart
+    u._append_lines(["boot"], t=5)
+    with patch("time.monotonic", return_value=10):
+        u.flush()
+    u._append_lines(["Connected to LTE"], t=12.5)
+    u._append_lines(["foo", "Authorized"], t=13)
+    u._append_lines(["Connected to LTE"], t=20)
+    assert u.milestones(["Connected to LTE", "Authorized", "Sent"]) == [
+        ("Connected to LTE", 2.5, 2.5), ("Authorized", 3, 0.5), ("Sent", None, None)]
+    assert u.milestones(["Authorized", "Connected to LTE"], ordered=False) == [
+        ("Authorized", 3, 3), ("Connected to LTE", 2.5, -0.5)]
+    assert u.milestones(["Authorized", "Connected to LTE"])[1] == ("Connected to LTE", 10, 7)
+    assert u.milestones(["Connected to LTE", "Authorized"], since=12) == [
+        ("Connected to LTE", 0.5, 0.5), ("Authorized", 1, 0.5)]
+    u.wait_for_str_ordered(["Connected to LTE", "Authorized"])
+    assert u.timings == [{"milestone": "Connected to LTE", "time": 2.5, "delta": 2.5},
+                         {"milestone": "Authorized", "time": 3, "delta": 0.5}]
+
+def test_milestones_matched(pty_uart):
+    """Test that waits record the occurrences they matched, after start_pos"""
+    u = pty_uart
+    with patch("time.monotonic", return_value=0):
+        u.flush()
+    u._append_lines(["Connected to LTE", "Authorized"], t=2)
+    u._append_lines(["Connected to LTE", "Authorized"], t=5)
+    assert u.time_at(0) == 2
+    assert u.time_at(u.whole_log.rindex("Authorized")) == 5
+    u.wait_for_str(["Authorized", ""], start_pos=u.whole_log.index("Authorized") + 1)
+    assert u.timings == [{"milestone": "Authorized", "time": 5, "delta": 5},
+                         {"milestone": "", "time": 2, "delta": -3}]
+
+def test_write_flushed():
+    """Test that write reports when the data has been flushed to the port"""
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    u = Uart(os.ttyname(slave_fd))
+    try:
+        before = time.monotonic()
+        flushed = u.write(b"AT\r\n").result(2)
+        assert before <= flushed <= time.monotonic()
+        assert os.read(master_fd, 16) == b"AT\r\n"
+    finally:
+        u.stop()
+        os.close(master_fd)
+        os.close(slave_fd)
+    with pytest.raises(RuntimeError):
+        u.write(b"AT\r\n").result(2)
+
+def test_write_backpressure():
+    """Test that a write the device does not read yet leaves the engine loop serving other ports"""
+    ports = [pty.openpty() for _ in range(2)]
+    for _, slave_fd in ports:
+        tty.setraw(slave_fd)
+    writing, reading = [Uart(os.ttyname(slave_fd)) for _, slave_fd in ports]
+    payload = os.urandom(256 * 1024)
+    try:
+        flushed = writing.write(payload)
+        time.sleep(0.2)
+        assert not flushed.done()
+        os.write(ports[1][0], b"still reading\r\n")
+        reading.wait_for_str("still reading", timeout=1)
+        received = bytearray()
+        while len(received) < len(payload):
+            received += os.read(ports[0][0], 64 * 1024)
+        flushed.result(2)
+        assert received == payload
+        assert not any(t.name.startswith("uart-writer") for t in threading.enumerate())
+    finally:
+        for u in (writing, reading):
+            u.stop()
+        for fds in ports:
+            for fd in fds:
+                os.close(fd)
+
+def test_write_chunked_echo():
+    """Test that write_chunked grows its chunks while the device echoes them"""
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    u = Uart(os.ttyname(slave_fd))
+    received = bytearray()
+    payload = b"0123456789abcdef" * 256
+
+    def echo():
+        while len(received) < len(payload):
+            data = os.read(master_fd, 1024)
+            received.extend(data)
+            os.write(master_fd, data)
+
+    t = threading.Thread(target=echo, daemon=True)
+    t.start()
+    try:
+        u.write_chunked(payload).result(10)
+        t.join(5)
+    finally:
+        u.stop()
+        os.close(master_fd)
+        os.close(slave_fd)
+    assert received == payload
+    # The fixed 16 byte chunks with 100 ms pauses managed 160 B/s
+    assert u.write_throughput > 1000
+    assert u._chunk_size == u.rx_buffer == uart.WRITE_CHUNK_MAX
+
+def test_write_chunked_dropped(pty_port):
+    """Test that write_chunked stays within rx_buffer and fails when an echo goes missing"""
+    master_fd, port = pty_port
+    u = Uart(port, rx_buffer=32)
+    received = bytearray()
+
+    def echo():
+        # Echoes 48 bytes interleaved with log output, then drops its input
+        while len(received) < 48:
+            data = os.read(master_fd, 1024)
+            assert len(data) <= 32
+            received.extend(data)
+            os.write(master_fd, data[:4] + b"\r\n<inf> app: foo\r\n" + data[4:])
+
+    t = threading.Thread(target=echo, daemon=True)
+    t.start()
+    try:
+        with pytest.raises(serial.serialutil.SerialException, match="offset 48"):
+            u.write_chunked(b"0123456789abcdef" * 8).result(10)
+        t.join(5)
+    finally:
+        u.stop()
+    assert received == b"0123456789abcdef" * 3
+
+def test_log_decoder(pty_uart):
+    """Test that a log decoder turns received bytes into log lines"""
+    u = pty_uart
+    u.log_decoder = Mock()
+    u.log_decoder.feed.side_effect = [[], ["[00:00:05.116,058] <inf> app: Connected to LTE"]]
+    u._on_data(b"\x01\x02")
+    u._on_data(b"\x03")
+    assert u.log_decoder.feed.call_count == 2
+    u.wait_for_str("Connected to LTE", timeout=0)
+
+@pytest.fixture
+def answering_uart(pty_uart):
+    # Uart whose device answers each written command with the given lines
+    def answering(responses):
+        u = pty_uart
+
+        def write(data):
+            cmd = data.decode().strip()
+            u._append_lines([cmd] + responses.get(cmd, []))
+
+        u.write = Mock(side_effect=write)
+        return u
+
+    return answering
+
+def test_at_cmd_1(answering_uart):
+    """Test that at_cmd returns intermediate responses and skips echo and log lines"""
+    u = answering_uart({"AT+CGSN=1": ["[00:00:01.000,000] <inf> app: foo", "+CGSN: \"3520\"", "", "OK"]})
+    response = u.at_cmd("AT+CGSN=1")
+    assert response.ok
+    assert response.lines == ["+CGSN: \"3520\""]
+    assert response.duration >= 0
+    u.write.assert_called_once_with(b"AT+CGSN=1\r\n")
+
+def test_at_cmd_2(answering_uart):
+    """Test that at_cmd raises ATError on error result codes"""
+    u = answering_uart({"AT+CFUN=9": ["ERROR"], "at AT+COPS?": ["uart:~$ +CME ERROR: 3"]})
+    with pytest.raises(ATError, match="ERROR"):
+        u.at_cmd("AT+CFUN=9")
+    with pytest.raises(ATError) as e:
+        u.at_cmd("at AT+COPS?")
+    assert e.value.response.result == "+CME ERROR: 3"
+
+def test_at_cmd_colored_prompt(answering_uart):
+    """Test that at_cmd finds result codes behind a shell prompt with ANSI colors"""
+    u = answering_uart({
+        "at AT+CFUN?": ["+CFUN: 4", "\x1b[1;32muart:~$ \x1b[mOK"],
+        "at AT+CFUN=9": ["\x1b[1;32muart:~$ \x1b[m\x1b[1;31mERROR\x1b[0m"],
+    })
+    assert u.at_cmd("at AT+CFUN?").lines == ["+CFUN: 4"]
+    with pytest.raises(ATError, match="ERROR"):
+        u.at_cmd("at AT+CFUN=9")
+
+def test_at_cmd_xfactoryreset_fails(answering_uart):
+    """Test that xfactoryreset raises when the modem does not take the commands"""
+    u = answering_uart({"AT": ["OK"], "AT+CFUN=4": ["ERROR"]})
+    with pytest.raises(ATError):
+        u.xfactoryreset()
+
+def test_at_cmd_3(answering_uart):
+    """Test that at_cmds runs commands in sequence with per-command timeouts"""
+    u = answering_uart({"AT": ["OK"], "AT+CFUN=4": ["OK"]})
+    responses = u.at_cmds(["AT", ("AT+CFUN=4", 1)])
+    assert [r.cmd for r in responses] == ["AT", "AT+CFUN=4"]
+    with pytest.raises(uart.UartLogTimeout):
+        u.at_cmds(["AT", ("AT%XFACTORYRESET=0", 0.3)])
+
+def test_at_cmd_4(answering_uart):
+    """Test that at_cmd resends the command until the device answers"""
+    u = answering_uart({})
+    u.write.side_effect = lambda data: u.write.call_count == 2 and u._append_lines(["OK"])
+    response = u.at_cmd("AT", resend_interval=0.2)
+    assert u.write.call_count == 2
+    assert 0.2 <= response.duration < 1
+
+@pytest.mark.parametrize("compression", [None, "gzip:1"])
+def test_trace_index_extract(tmp_path, monkeypatch, compression):
+    """Test that trace bytes between two log milestones are extracted through the index"""
+    monkeypatch.setattr(uart, "TRACE_FRAME_SIZE", 1000)
+    writer = TraceWriter(str(tmp_path / "trace.bin"), buffer_size=600, compression=compression, index=True)
+    data = os.urandom(6000)
+    log_lines = []
+    for i in range(0, len(data), 500):
+        # One log line per 500 bytes of trace
+        writer.submit_index([(float(i), i, len(log_lines))])
+        log_lines.append(f"milestone {i}")
+        buf = writer.get_buffer()
+        buf[:500] = data[i:i + 500]
+        writer.submit(buf, 500)
+    writer.close()
+    log = tmp_path / "uart.txt"
+    log.write_text("".join("\n" + line for line in log_lines))
+    assert trace_index.extract(writer.path, str(log), "milestone 1500", "milestone 3000") == data[1500:3500]
+    assert trace_index.extract(writer.path, str(log), "milestone 5500") == data[5500:]
+    index = trace_index.TraceIndex(writer.path + ".index")
+    assert index.offset_at_time(1700.0) == 1500
+    assert index.offset_at_time(1700.0, end=True) == 2000
+
+def test_binary_1_streams_to_file(tmp_path):
+    """Test that UartBinary streams captured data to its capture file"""
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    capture = tmp_path / "trace.bin"
+    u = UartBinary(os.ttyname(slave_fd), capture_file=str(capture))
+    try:
+        time.sleep(0.3)
+        data = bytes(range(256)) * 64
+        os.write(master_fd, data)
+        start = time.monotonic()
+        while u.get_size() < len(data) and time.monotonic() - start < 5:
+            time.sleep(0.05)
+        time.sleep(1)
+        # Data is on disk before the capture stops
+        assert capture.read_bytes() == data
+        u.flush()
+        os.write(master_fd, b"foo123")
+        time.sleep(0.3)
+    finally:
+        u.stop()
+        os.close(master_fd)
+        os.close(slave_fd)
+    assert u.get_size() == 6
+    u.save_to_file(str(tmp_path / "saved.bin"))
+    assert (tmp_path / "saved.bin").read_bytes() == b"foo123"
+    assert capture.read_bytes() == data + b"foo123"
+
+@pytest.mark.parametrize("compression", ["gzip:1", "zstd"])
+def test_binary_2_compressed_frames(tmp_path, monkeypatch, compression):
+    """Test that TraceWriter writes independently decompressible frames"""
+    if compression == "zstd" and uart.zstandard is None:
+        pytest.skip("zstandard not installed")
+    monkeypatch.setattr(uart, "TRACE_FRAME_SIZE", 1000)
+    writer = TraceWriter(str(tmp_path / "trace.bin"), buffer_size=600, compression=compression)
+    data = bytes(range(256)) * 10
+    for i in range(0, len(data), 600):
+        buf = writer.get_buffer()
+        chunk = data[i:i + 600]
+        buf[:len(chunk)] = chunk
+        writer.submit(buf, len(chunk))
+    writer.close()
+    with open_trace(writer.path, compression) as f:
+        assert f.read() == data
+    raw = open(writer.path, "rb").read()
+    frames = [line.split() for line in open(writer.path + ".frames")]
+    assert len(frames) == 3
+    codec = uart.trace_codec(compression)
+    for offset, length, raw_offset, raw_length in [map(int, frame) for frame in frames]:
+        with open(tmp_path / "frame", "wb") as f:
+            f.write(raw[offset:offset + length])
+        with codec.open_reader(str(tmp_path / "frame")) as f:
+            assert f.read() == data[raw_offset:raw_offset + raw_length]
+
+@pytest.mark.parametrize("compression", [None, "gzip:1"])
+def test_binary_3_save_over_capture_file(tmp_path, compression):
+    """Test that saving over the capture file keeps the data after flush() and its index"""
+    master_fd, slave_fd = pty.openpty()
+    tty.setraw(slave_fd)
+    capture = str(tmp_path / "trace.bin")
+    u = UartBinary(os.ttyname(slave_fd), capture_file=capture, compression=compression)
+    try:
+        time.sleep(0.3)
+        os.write(master_fd, b"before" * 100)
+        time.sleep(0.5)
+        u.flush()
+        os.write(master_fd, b"after")
+        time.sleep(0.5)
+    finally:
+        u.stop()
+        os.close(master_fd)
+        os.close(slave_fd)
+    # stop() closes the capture file
+    assert u._writer._file.closed
+    u.save_to_file(capture)
+    with open_trace(u.capture_file, compression) as f:
+        assert f.read() == b"after"
+    assert u.data == b"after"
+    offsets = [int(line.split()[1]) for line in open(u.capture_file + ".index")]
+    assert offsets == [0]
+    assert not [name for name in os.listdir(tmp_path) if ".saving" in name]
@@ -0,0 +1,151 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import os
+import time
+
+import pytest
+from uart import WRITE_CHUNK_MIN, ATError, DeviceFault, InactivityWatchdog, Uart, UartBinary
+from virtual_dut import VirtualDUT, log_timestamp
+
+LOG = os.path.join(os.path.dirname(__file__), "..", "benchmarks", "data", "nrf_cloud_coap_device_message.log")
+
+@pytest.fixture
+def dut():
+    with VirtualDUT(baudrate=1000000) as dut:
+        yield dut
+
+def test_log_timestamp():
+    """Test that Zephyr log timestamps are parsed to seconds"""
+    assert log_timestamp("[00:01:05.116,058] <inf> foo: bar") == pytest.approx(65.116058)
+    assert log_timestamp("*** Booting nRF Connect SDK ***") is None
+
+def test_replay_log(dut):
+    """Test that Uart waits on a replayed log with its recorded timing"""
+    dut.speed = 20
+    u = Uart(dut.port)
+    try:
+        dut.replay_log(LOG)
+        u.wait_for_str_ordered(
+            ["Connected to LTE", "nrf_cloud_coap_transport: Authorized", "Sent Hello World message with ID"],
+            timeout=10,
+        )
+    finally:
+        u.stop()
+    (_, lte, _), (_, auth, auth_delta), _ = u.milestones(
+        ["Connected to LTE", "nrf_cloud_coap_transport: Authorized", "Sent Hello World message with ID"])
+    # About 5.1 s into the recording at 20 times the speed
+    assert 0.2 < lte < 0.6
+    assert auth_delta > 0
+
+def test_at_commands(dut):
+    """Test that at_cmd talks to the virtual modem through the device shell"""
+    u = Uart(dut.port)
+    try:
+        u.xfactoryreset(shell=True)
+        assert u.at_cmd("AT+CGMR").lines == ["mfw_nrf91x1_2.0.2"]
+        with pytest.raises(ATError):
+            u.at_cmd("AT+FOO")
+    finally:
+        u.stop()
+    assert dut.received[:3] == ["at AT", "at AT+CFUN=4", "at AT%XFACTORYRESET=0"]
+
+def test_reconnect(dut):
+    """Test that Uart reopens a port that went away and came back"""
+    u = Uart(dut.port)
+    u.reconnect_interval = 0.1
+    try:
+        dut.write_line("before")
+        u.wait_for_str("before", timeout=2)
+        dut.unplug()
+        time.sleep(0.3)
+        dut.plug()
+        time.sleep(0.5)
+        dut.write_line("after")
+        u.wait_for_str("after", timeout=2)
+    finally:
+        u.stop()
+
+def test_reconnect_on_reappear(dut):
+    """Test that Uart reopens the port as soon as it reappears and marks the gap"""
+    u = Uart(dut.port)
+    try:
+        dut.write_line("before")
+        u.wait_for_str("before", timeout=2)
+        dut.write(b"partial")
+        time.sleep(0.1)
+        dut.unplug()
+        time.sleep(0.2)
+        dut.plug()
+        start = time.monotonic()
+        u.wait_for_str("port gone for", timeout=2)
+        assert time.monotonic() - start < 0.5
+        dut.write_line("after")
+        u.wait_for_str_ordered(["partial", "port gone for", "after"], timeout=2)
+    finally:
+        u.stop()
+
+def test_binary_replay(dut, tmp_path):
+    """Test that UartBinary captures a replayed trace"""
+    trace = tmp_path / "in.bin"
+    trace.write_bytes(os.urandom(20000))
+    u = UartBinary(dut.port, capture_file=str(tmp_path / "out.bin"))
+    try:
+        dut.replay_binary(str(trace), wait=True)
+        start = time.monotonic()
+        while u.get_size() < 20000 and time.monotonic() - start < 5:
+            time.sleep(0.05)
+    finally:
+        u.stop()
+    assert (tmp_path / "out.bin").read_bytes() == trace.read_bytes()
+
+def test_write_chunked_chatty():
+    """Test that write_chunked keeps pacing when log output arrives instead of the echo"""
+    with VirtualDUT(baudrate=1000000, echo=False) as dut:
+        u = Uart(dut.port)
+        try:
+            dut.replay_log("\n".join(f"<inf> app: chatty line {i}" for i in range(500)), line_interval=0.002)
+            u.write_chunked(b"0123456789abcdef" * 8).result(10)
+        finally:
+            u.stop()
+    assert u._chunk_size == WRITE_CHUNK_MIN
+    # 8 chunks, each followed by the fixed pause
+    assert u.write_throughput < 16 / 0.1 * 1.5
+
+def test_watchdog_silence(dut):
+    """Test that a silent DUT aborts the wait and is reset, and output resuming clears it"""
+    resets = []
+
+    def reset():
+        resets.append(time.monotonic())
+        dut.write_line("*** Booting nRF Connect SDK v2.9.0 ***")
+
+    u = Uart(dut.port, watchdog=InactivityWatchdog(1, ("warn", "abort", "reset"), reset))
+    try:
+        dut.write_line("foo123")
+        start = time.monotonic()
+        with pytest.raises(DeviceFault, match="hang"):
+            u.wait_for_str("bar", timeout=30)
+        assert time.monotonic() - start < 5
+        while u._silent and time.monotonic() - start < 10:
+            time.sleep(0.1)
+        u.wait_for_str("Booting", timeout=5)
+        assert len(resets) == 1
+        assert u.watchdog.silences == 1
+    finally:
+        u.stop()
+
+def test_watchdog_deadline(dut):
+    """Test that the overall deadline stops capturing even while the DUT keeps talking"""
+    u = Uart(dut.port, timeout=2, watchdog=InactivityWatchdog(1))
+    try:
+        dut.replay_log("\n".join(f"line {i}" for i in range(40)), line_interval=0.1)
+        start = time.monotonic()
+        while not u._evt.is_set() and time.monotonic() - start < 10:
+            time.sleep(0.1)
+        assert u._evt.is_set()
+        assert u.watchdog.silences == 0
+    finally:
+        u.stop()
@@ -0,0 +1,158 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+"""
+Extract the part of a modem trace captured between two UART log milestones.
+
+UartBinary writes '<trace>.index' next to every trace, mapping receive times and UART
+log line numbers to trace offsets. With the UART log of the same test, the bytes between
+two milestones can be cut out without decoding the whole trace:
+
+    python utils/trace_index.py outcomes/trace_test_foo.bin \\
+        --log outcomes/logs/uart_test_foo.txt \\
+        --start "FOTA download started" --end "FOTA download complete" \\
+        -o fota_window.bin
+"""
+
+import argparse
+import bisect
+import os
+import sys
+import zlib
+from typing import Union
+sys.path.append(os.getcwd())
+from utils.logger import get_logger
+from utils.uart import open_trace, zstandard
+
+logger = get_logger()
+
+
+class TraceIndex:
+    """ Entries of a '<trace>.index' file, sorted by offset """
+
+    def __init__(self, path: str) -> None:
+        self.times = []
+        self.offsets = []
+        self.lines = []
+        with open(path) as f:
+            for entry in f:
+                t, offset, line = entry.split()
+                self.times.append(float(t))
+                self.offsets.append(int(offset))
+                self.lines.append(int(line))
+
+    def offset_at_time(self, t: float, end: bool = False) -> Union[int, None]:
+        """
+        Trace offset for monotonic time 't', rounded outwards: for a start the last data
+        received before 't', for an end the first data received after it (None: to the end)
+        """
+        if end:
+            i = bisect.bisect_right(self.times, t)
+            return self.offsets[i] if i < len(self.offsets) else None
+        i = bisect.bisect_right(self.times, t) - 1
+        return self.offsets[i] if i >= 0 else 0
+
+    def offset_at_line(self, line: int, end: bool = False) -> Union[int, None]:
+        """ Like offset_at_time() for UART log line 'line', counted from 0 """
+        if end:
+            # First entry recorded after the line had arrived
+            i = bisect.bisect_right(self.lines, line)
+            return self.offsets[i] if i < len(self.offsets) else None
+        i = bisect.bisect_right(self.lines, line) - 1
+        return self.offsets[i] if i >= 0 else 0
+
+
+def find_line(log_path: str, msg: str, after: int = -1) -> int:
+    """ Index of the first UART log line after line 'after' containing 'msg' """
+    with open(log_path, encoding="utf-8", errors="ignore", newline="\n") as f:
+        # The saved log starts with the line separator of its first line
+        next(f, None)
+        for i, line in enumerate(f):
+            if i > after and msg in line:
+                return i
+    raise ValueError(f"{msg!r} not found in {log_path}")
+
+
+def _compression(path: str) -> Union[str, None]:
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def _decompress_frame(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return zlib.decompressobj(31).decompress(data)
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def read_range(path: str, start: int, end: int = None) -> bytes:
+    """
+    Uncompressed trace bytes [start, end) of a trace written by TraceWriter. Compressed
+    traces only decompress the frames covering the range when '<trace>.frames' exists.
+    """
+    compression = _compression(path)
+    if compression and os.path.isfile(path + ".frames"):
+        with open(path + ".frames") as f:
+            frames = [tuple(int(x) for x in entry.split()) for entry in f]
+        out = bytearray()
+        raw_end = 0
+        with open(path, "rb") as f:
+            for offset, length, raw_offset, raw_length in frames:
+                raw_end = raw_offset + raw_length
+                if raw_end <= start or (end is not None and raw_offset >= end):
+                    continue
+                f.seek(offset)
+                data = _decompress_frame(f.read(length), compression)
+                out += data[max(start - raw_offset, 0):None if end is None else end - raw_offset]
+            if end is None or end > raw_end:
+                # Frame still open when the capture stopped
+                f.seek(frames[-1][0] + frames[-1][1] if frames else 0)
+                tail = f.read()
+                if tail:
+                    data = _decompress_frame(tail, compression)
+                    lo = max(start - raw_end, 0)
+                    out += data[lo:None if end is None else end - raw_end]
+        return bytes(out)
+    with open_trace(path, compression) as f:
+        remaining = start
+        while remaining:
+            skipped = len(f.read(min(remaining, 1024 * 1024)))
+            if not skipped:
+                break
+            remaining -= skipped
+        return f.read() if end is None else f.read(end - start)
+
+
+def extract(trace: str, log: str, start_msg: str, end_msg: str = None) -> bytes:
+    """ Trace bytes captured from the first 'start_msg' log line to the next 'end_msg' """
+    index = TraceIndex(trace + ".index")
+    start_line = find_line(log, start_msg)
+    start = index.offset_at_line(start_line)
+    end = None
+    if end_msg:
+        end = index.offset_at_line(find_line(log, end_msg, start_line), end=True)
+    logger.info(f"Extracting trace bytes {start} to {'end' if end is None else end} of {trace}")
+    return read_range(trace, start, end)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("trace", help="Trace captured by UartBinary, .bin, .bin.gz or .bin.zst")
+    parser.add_argument("--log", required=True, help="UART log of the same test")
+    parser.add_argument("--start", required=True, help="Log milestone starting the window")
+    parser.add_argument("--end", help="Log milestone ending the window, default end of trace")
+    parser.add_argument("-o", "--output", required=True, help="Uncompressed .bin to write")
+    args = parser.parse_args()
+
+    data = extract(args.trace, args.log, args.start, args.end)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    logger.info(f"Wrote {len(data)} bytes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@
 # SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
 ##########################################################################################
 
+import asyncio
+import concurrent.futures
 import threading
 import serial
 import time
@@ -10,12 +12,86 @@ import queue
 import os
 import sys
 import re
+import bisect
+import collections
+import functools
+import mmap
+import shutil
+import termios
+import tempfile
+import weakref
+import zlib
+import gzip
+from array import array
 sys.path.append(os.getcwd())
 from utils.logger import get_logger
+from utils.port_watcher import SERIAL_BY_ID, PortWatcher
 from typing import Union
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 DEFAULT_UART_TIMEOUT = 60 * 15
 DEFAULT_WAIT_FOR_STR_TIMEOUT = 60 * 10
+# Upper bound for a single serial read, and for a line without a line ending
+READ_BLOCK_SIZE = 4096
+MAX_LINE_LENGTH = 64 * 1024
+# UartLog seals appended text into blocks of about this many characters
+LOG_BLOCK_SIZE = 16 * 1024
+# Characters carried over from the previous block when regex searching across blocks
+LOG_SEARCH_OVERLAP = 4096
+# UartBinary capture buffers, handed to the writer thread when full or after the interval
+TRACE_BUFFER_SIZE = 256 * 1024
+TRACE_FLUSH_INTERVAL = 0.5
+# Uncompressed bytes per independently decompressible frame of a compressed trace
+TRACE_FRAME_SIZE = 4 * 1024 * 1024
+# Minimum seconds between entries of the trace index, see trace_index.py
+TRACE_INDEX_INTERVAL = 0.1
+# write_chunked() without hardware flow control: chunk size adapts between WRITE_CHUNK_MIN
+# and the device's receive buffer, growing while the device echoes each chunk back within
+# WRITE_ECHO_TIMEOUT plus its time on the wire, and falling back to WRITE_CHUNK_GAP pauses
+# when it does not echo. WRITE_CHUNK_MAX is the default receive buffer, the size of
+# Zephyr's CONFIG_SHELL_BACKEND_SERIAL_RX_RING_BUFFER_SIZE
+WRITE_CHUNK_MIN = 16
+WRITE_CHUNK_MAX = 64
+WRITE_CHUNK_GAP = 0.1
+WRITE_ECHO_TIMEOUT = 0.05
+# Shortest interval at which a write polls the output queue of the port until it drained
+WRITE_DRAIN_POLL = 0.001
+# AT commands are resent at this interval until a final result code arrives, which
+# covers a device that is still booting
+AT_CMD_TIMEOUT = 10
+AT_CMD_RESEND_INTERVAL = 2
+# Reopen attempts of a port that is present but fails to open back off between these
+RECONNECT_RETRY_MIN = 0.05
+# Seconds between checks of the overall deadline and the InactivityWatchdog of a Uart
+WATCHDOG_INTERVAL = 1
+WATCHDOG_ACTIONS = ("warn", "reset", "abort")
+# Fault signatures in DUT output by kind, see FaultDetector
+FAULT_PATTERNS = {
+    "assert": ["ASSERT"],
+    "fatal error": [
+        ">>> ZEPHYR FATAL ERROR",
+        "***** HARD FAULT *****",
+        "***** BUS FAULT *****",
+        "***** MPU FAULT *****",
+        "***** USAGE FAULT *****",
+        "***** SECURE FAULT *****",
+    ],
+    "modem crash": ["Modem has crashed", "Modem fault"],
+}
+# Application boot banners, more than MAX_BOOTS of them since the last flush() and within
+# BOOT_WINDOW seconds count as a reboot loop. A FOTA flow boots up to four times in that
+# time: test flash, reset, and applying the application and modem images
+BOOT_PATTERNS = ["*** Booting nRF Connect SDK", "*** Booting Zephyr OS"]
+MAX_BOOTS = 8
+BOOT_WINDOW = 300
+# Final result code of an AT command, optionally behind a shell prompt. Lines are matched
+# with ANSI escape sequences removed, as the shell colors its prompt and clears lines
+AT_FINAL_RESULT_RE = re.compile(r"^(?:\S*:~\$ )?(OK|ERROR|\+CM[ES] ERROR: ?.*)$")
+ANSI_ESCAPE_RE = re.compile(r"\x1b(?:\[[0-?]*[ -/]*[@-~]|[@-Z\\-_])")
 
 logger = get_logger()
 
@@ -23,67 +99,903 @@ class UartLogTimeout(Exception):
     pass
 
 
+class DeviceFault(Exception):
+    """ The DUT crashed or got stuck in a reboot loop while the test was waiting """
+
+    def __init__(self, kind: str, uart_name: str, context: str) -> None:
+        super().__init__(f"DUT {kind} on {uart_name or 'uart'}:\n{context}")
+        self.kind = kind
+        self.context = context
+
+
+class ATResponse:
+    """ Outcome of one AT command: final result code, intermediate response lines, duration in seconds """
+
+    def __init__(self, cmd: str, result: str, lines: list, duration: float) -> None:
+        self.cmd = cmd
+        self.result = result
+        self.lines = lines
+        self.duration = duration
+
+    @property
+    def ok(self) -> bool:
+        return self.result == "OK"
+
+    def __repr__(self) -> str:
+        return f"ATResponse({self.cmd!r}, {self.result!r}, {self.lines!r}, {self.duration:.3f})"
+
+
+class ATError(Exception):
+    """ AT command ended with ERROR, +CME ERROR or +CMS ERROR """
+
+    def __init__(self, response: ATResponse) -> None:
+        super().__init__(f"AT command \"{response.cmd}\" failed: {response.result}")
+        self.response = response
+
+
+class UartLog:
+    """
+    Append-only text store for UART output.
+
+    Appended text is collected in a tail list and sealed into blocks of about
+    LOG_BLOCK_SIZE characters, so appending is O(1) and the full text is only joined
+    when someone asks for it as a string. All positions are absolute offsets into
+    everything appended since the log was created.
+
+    With 'spill_path' set, sealed blocks are written to that append-only file once more
+    than 'max_memory' characters are held in memory, oldest first. Spilled blocks are
+    read back through a memory map, so searching still covers the whole log. sync()
+    writes out everything, leaving the complete log in the file.
+    """
+
+    def __init__(
+        self, block_size: int = LOG_BLOCK_SIZE, max_memory: int = None, spill_path: str = None
+    ) -> None:
+        self.block_size = block_size
+        self.max_memory = max_memory
+        self.spill_path = spill_path
+        self._lock = threading.RLock()
+        # Sealed blocks, None for blocks that were spilled to disk
+        self._blocks = []
+        self._block_starts = []
+        self._tail = []
+        self._tail_start = 0
+        self._tail_len = 0
+        # Absolute offset of the first character of every line added with append_line(),
+        # and its time.monotonic() receive time
+        self._line_starts = array("Q")
+        self._line_times = array("d")
+        # Last string built by text(), as (start, text). Not kept when memory is bounded
+        self._cache = (0, "")
+        # Characters held by sealed blocks in memory
+        self._memory = 0
+        self._spilled = 0
+        # Byte offset of every spilled block in the spill file, plus its end
+        self._spill_offsets = array("Q", [0])
+        self._spill_file = None
+        self._spill_map = None
+        self._spill_cache = (-1, "")
+
+    def __len__(self) -> int:
+        return self._tail_start + self._tail_len
+
+    def append(self, text: str) -> None:
+        with self._lock:
+            self._tail.append(text)
+            self._tail_len += len(text)
+            if self._tail_len >= self.block_size:
+                self._seal()
+
+    def _seal(self) -> None:
+        block = "".join(self._tail)
+        self._blocks.append(block)
+        self._block_starts.append(self._tail_start)
+        self._tail = []
+        self._tail_start += len(block)
+        self._tail_len = 0
+        self._memory += len(block)
+        if self.spill_path and self.max_memory is not None:
+            # Always keep the newest block in memory
+            while self._memory > self.max_memory and self._spilled < len(self._blocks) - 1:
+                self._spill_block()
+
+    def _open_spill(self) -> None:
+        if self._spilled == 0:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            self._spill_file = open(self.spill_path, "w+b")
+        else:
+            # Reopened after close()
+            self._spill_file = open(self.spill_path, "r+b")
+            self._spill_file.seek(self._spill_offsets[-1])
+
+    def _spill_block(self) -> None:
+        if self._spill_file is None:
+            self._open_spill()
+        block = self._blocks[self._spilled]
+        data = block.encode("utf-8")
+        self._spill_file.write(data)
+        self._spill_offsets.append(self._spill_offsets[-1] + len(data))
+        self._blocks[self._spilled] = None
+        self._memory -= len(block)
+        self._spilled += 1
+
+    def _block(self, i: int) -> str:
+        block = self._blocks[i]
+        if block is not None:
+            return block
+        if self._spill_cache[0] == i:
+            return self._spill_cache[1]
+        start, end = self._spill_offsets[i], self._spill_offsets[i + 1]
+        if self._spill_file is None:
+            self._open_spill()
+        if self._spill_map is None or len(self._spill_map) < end:
+            self._spill_file.flush()
+            if self._spill_map is not None:
+                self._spill_map.close()
+            self._spill_map = mmap.mmap(self._spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+        block = self._spill_map[start:end].decode("utf-8")
+        self._spill_cache = (i, block)
+        return block
+
+    @property
+    def bounded(self) -> bool:
+        return bool(self.spill_path) and self.max_memory is not None
+
+    def sync(self) -> None:
+        """ Write every block to the spill file so that it holds the complete log """
+        if not self.spill_path:
+            return
+        with self._lock:
+            if self._tail:
+                self._seal()
+            while self._spilled < len(self._blocks):
+                self._spill_block()
+            if self._spill_file is not None:
+                self._spill_file.flush()
+
+    def close(self) -> None:
+        # Release the spill file, it is reopened if spilled text is read or more is spilled
+        with self._lock:
+            if self._spill_map is not None:
+                self._spill_map.close()
+                self._spill_map = None
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+
+    def append_line(self, line: str, t: float = None) -> None:
+        with self._lock:
+            self._line_starts.append(len(self) + 1)
+            self._line_times.append(time.monotonic() if t is None else t)
+            self.append("\n" + line)
+
+    def line_count(self) -> int:
+        return len(self._line_starts)
+
+    def line_index(self, pos: int) -> int:
+        """ Index of the line containing absolute position 'pos' """
+        return max(bisect.bisect_right(self._line_starts, pos) - 1, 0)
+
+    def time_at(self, pos: int) -> Union[float, None]:
+        """ Receive time of the line containing absolute position 'pos' """
+        if not self._line_times:
+            return None
+        return self._line_times[self.line_index(pos)]
+
+    def lines_around(self, pos: int, before: int = 5, after: int = 5) -> str:
+        """ Lines surrounding absolute position 'pos' """
+        with self._lock:
+            if not self._line_starts:
+                return self.text(max(pos - 1024, 0), pos + 1024)
+            index = self.line_index(pos)
+            first = max(index - before, 0)
+            last = index + after + 1
+            end = self._line_starts[last] - 1 if last < len(self._line_starts) else len(self)
+            return self.text(self._line_starts[first], end)
+
+    def _pieces(self, start: int, end: int):
+        # Yield (position, text) pieces covering [start, end)
+        if start >= end:
+            return
+        i = max(bisect.bisect_right(self._block_starts, start) - 1, 0)
+        for i in range(i, len(self._blocks)):
+            block_start = self._block_starts[i]
+            if block_start >= end:
+                return
+            block = self._block(i)
+            lo = max(start - block_start, 0)
+            hi = min(end - block_start, len(block))
+            if lo < hi:
+                yield block_start + lo, block[lo:hi]
+        if self._tail and end > self._tail_start:
+            if len(self._tail) > 1:
+                self._tail = ["".join(self._tail)]
+            tail = self._tail[0]
+            lo = max(start - self._tail_start, 0)
+            hi = min(end - self._tail_start, len(tail))
+            if lo < hi:
+                yield self._tail_start + lo, tail[lo:hi]
+
+    def iter_text(self, start: int = 0, end: int = None):
+        """
+        Text between absolute positions 'start' and 'end' in pieces of at most one block,
+        spilled blocks are read back one at a time
+        """
+        end = len(self) if end is None else end
+        while start < end:
+            with self._lock:
+                piece = next(self._pieces(start, min(end, len(self))), None)
+            if piece is None:
+                return
+            pos, text = piece
+            yield text
+            start = pos + len(text)
+
+    def text(self, start: int = 0, end: int = None) -> str:
+        """ Text between absolute positions 'start' and 'end' """
+        with self._lock:
+            end = len(self) if end is None else min(end, len(self))
+            cache_start, cache = self._cache
+            if cache_start == start and start + len(cache) <= end:
+                # Only join what was appended since the last call
+                text = cache + "".join(p for _, p in self._pieces(start + len(cache), end))
+            else:
+                text = "".join(p for _, p in self._pieces(start, end))
+            if end == len(self) and not self.bounded:
+                self._cache = (start, text)
+            return text
+
+    def find(self, sub: str, start: int = 0, end: int = None) -> int:
+        """ Absolute position of the first 'sub' in [start, end), -1 if not found """
+        with self._lock:
+            end = len(self) if end is None else min(end, len(self))
+            overlap = len(sub) - 1
+            carry = ""
+            for pos, piece in self._pieces(start, end):
+                window = carry + piece if carry else piece
+                i = window.find(sub)
+                if i >= 0:
+                    return pos - len(carry) + i
+                carry = window[-overlap:] if overlap > 0 else ""
+            return -1
+
+    def count(self, sub: str, start: int = 0) -> int:
+        count = 0
+        pos = self.find(sub, start)
+        while pos >= 0:
+            count += 1
+            pos = self.find(sub, pos + max(len(sub), 1))
+        return count
+
+    def _chunks(self, start: int):
+        # Yield (position, text) of whole blocks, and the tail, from the one holding 'start'
+        i = max(bisect.bisect_right(self._block_starts, start) - 1, 0)
+        for i in range(i, len(self._blocks)):
+            yield self._block_starts[i], self._block(i)
+        if self._tail:
+            if len(self._tail) > 1:
+                self._tail = ["".join(self._tail)]
+            yield self._tail_start, self._tail[0]
+
+    def search(self, regex: re.Pattern, start: int = 0, origin: int = None):
+        """
+        Search compiled 'regex' from absolute position 'start' without joining the log,
+        like regex.search() on the text from absolute position 'origin' on, 'start'
+        by default: ^ only matches at 'origin' and $ only at the end of the log.
+
+        Blocks are searched in place, one at a time in a window with LOG_SEARCH_OVERLAP
+        characters of the neighbouring blocks on both sides, so a match may not reach
+        further than that into the next block.
+
+        :return: (position of the searched window, match) or None
+        """
+        origin = start if origin is None else origin
+        start = max(start, origin)
+        with self._lock:
+            end = len(self)
+            chunks = self._chunks(max(start - LOG_SEARCH_OVERLAP, origin))
+            prev = ""
+            cur = next(chunks, None)
+            if cur is None:
+                # Empty log, only empty matches
+                match = regex.search("")
+                return (origin, match) if match else None
+            while cur is not None:
+                pos, block = cur
+                nxt = next(chunks, None)
+                if start < pos + len(block) or nxt is None:
+                    # Nothing before 'origin' is part of the window
+                    head = max(origin - pos, 0)
+                    before = prev[len(prev) - min(LOG_SEARCH_OVERLAP, len(prev), max(pos - origin, 0)):]
+                    after = nxt[1][:LOG_SEARCH_OVERLAP] if nxt else ""
+                    window = before + block[head:] + after
+                    base = pos + head - len(before)
+                    match = regex.search(window, max(start - base, len(before)))
+                    # Matches from the next block are found with its own context, and $
+                    # matches at the end of the window only when that is the end of the log
+                    if match and (nxt is None or match.start() < pos + len(block) - base) and (
+                            base + len(window) == end or match.end() < len(window) - 1):
+                        return base, match
+                prev = block
+                cur = nxt
+            return None
+
+
+class PatternAutomaton:
+    """
+    Aho-Corasick automaton over a set of literal patterns.
+
+    scan() finds every occurrence of every pattern, overlapping ones included, in a
+    single pass over the text regardless of the number of patterns. Text can be fed in
+    pieces by passing the returned state back in, so matches straddling pieces are found.
+    """
+
+    def __init__(self, patterns: list) -> None:
+        self.patterns = list(dict.fromkeys(p for p in patterns if p))
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for pattern in self.patterns:
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (pattern,)
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+        # Lets scan() skip text that cannot start a match while at the root
+        first = "".join(self._goto[0])
+        self._first = re.compile(f"[{re.escape(first)}]") if first else None
+
+    def scan(self, text: str, state: int = 0) -> tuple:
+        """
+        Scan 'text' starting from automaton 'state'
+
+        :return: (new state, list of (end offset in text, pattern))
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = []
+        i = 0
+        n = len(text)
+        while i < n:
+            if state == 0:
+                if self._first is None:
+                    break
+                m = self._first.search(text, i)
+                if not m:
+                    break
+                i = m.start()
+            ch = text[i]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern in out[state]:
+                hits.append((i + 1, pattern))
+            i += 1
+        return state, hits
+
+
+class LogWatchers:
+    """
+    Literal watchers fed with new log text through one shared PatternAutomaton.
+
+    Subscribing or unsubscribing rebuilds the automaton, feeding costs one pass over the
+    text however many watchers and patterns are registered.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subs = {}
+        self._next_handle = 0
+        self._callbacks = {}
+        self._automaton = None
+        self._state = 0
+
+    def subscribe(self, patterns: list, callback) -> int:
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._subs[handle] = (list(patterns), callback)
+            self._rebuild()
+            return handle
+
+    def unsubscribe(self, handle: int) -> None:
+        with self._lock:
+            if self._subs.pop(handle, None):
+                self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._callbacks = {}
+        for patterns, callback in self._subs.values():
+            for pattern in patterns:
+                self._callbacks.setdefault(pattern, []).append(callback)
+        self._automaton = PatternAutomaton(list(self._callbacks)) if self._callbacks else None
+        self._state = 0
+
+    def feed(self, text: str, pos: int) -> None:
+        # 'pos' is the absolute log position of the start of 'text'
+        with self._lock:
+            if self._automaton is None:
+                return
+            self._state, hits = self._automaton.scan(text, self._state)
+            calls = [(cb, pattern, pos + end - len(pattern))
+                     for end, pattern in hits for cb in self._callbacks[pattern]]
+        for callback, pattern, match_pos in calls:
+            callback(pattern, match_pos)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_regex(pattern: Union[str, re.Pattern]) -> re.Pattern:
+    """ Compiled 'pattern', cached so that waits and extractions in loops compile once """
+    return re.compile(pattern)
+
+
+def echoed(chunk: bytes, received: bytes) -> bool:
+    """ Whether all bytes of 'chunk' are in 'received' in order, possibly interleaved """
+    if chunk in received:
+        return True
+    it = iter(received)
+    return all(b in it for b in chunk)
+
+
+class RegexMatcher:
+    """
+    Incremental regex search for wait_for_str_re() and extract_value().
+
+    A failed update() remembers how far the log was searched, the next one only covers
+    the text appended since plus LOG_SEARCH_OVERLAP characters for matches straddling
+    the two. Once found, the match is kept, the log being append-only.
+    """
+
+    def __init__(self, log: UartLog, pattern: Union[str, re.Pattern], start: int = 0) -> None:
+        self.log = log
+        self.regex = compile_regex(pattern)
+        self.start = start
+        self.resume = start
+        self.match = None
+        # Absolute position of match position 0
+        self.match_base = 0
+
+    def update(self) -> bool:
+        if self.match is None:
+            end = len(self.log)
+            found = self.log.search(self.regex, self.resume, self.start)
+            if found:
+                self.match_base, self.match = found
+            else:
+                self.resume = max(self.resume, end - LOG_SEARCH_OVERLAP)
+        return self.match is not None
+
+    @property
+    def position(self) -> int:
+        """ Absolute position of the match """
+        return self.match_base + self.match.start()
+
+
+class StrMatcher:
+    """
+    Incremental matcher for wait_for_str(), every message may appear anywhere after 'start'.
+
+    All messages are found with one PatternAutomaton pass over the text appended since
+    the previous update(), the automaton state carries matches straddling updates.
+    """
+
+    def __init__(self, log: UartLog, msgs: list, start: int = 0) -> None:
+        self.log = log
+        self.msgs = list(msgs)
+        self.scanned = start
+        # An empty message matches right at 'start'
+        self.missing = [msg for msg in msgs if msg]
+        # Absolute position of the first occurrence of each message found
+        self.found = {msg: start for msg in msgs if not msg}
+        self._automaton = PatternAutomaton(msgs)
+        self._state = 0
+
+    @property
+    def done(self) -> bool:
+        return not self.missing
+
+    @property
+    def positions(self) -> list:
+        """ (msg, absolute position or None) for every message """
+        return [(msg, self.found.get(msg)) for msg in self.msgs]
+
+    def update(self) -> bool:
+        end = len(self.log)
+        if self.missing and end > self.scanned:
+            self._state, hits = self._automaton.scan(self.log.text(self.scanned, end), self._state)
+            for hit_end, pattern in hits:
+                self.found.setdefault(pattern, self.scanned + hit_end - len(pattern))
+            self.missing = [msg for msg in self.missing if msg not in self.found]
+        self.scanned = end
+        return self.done
+
+
+class OrderedMatcher:
+    """
+    Incremental matcher for wait_for_str_ordered(), messages must appear in the given order.
+
+    New text is scanned once for all messages with a PatternAutomaton. Occurrences that
+    may still satisfy a later milestone are kept until the pending one is found, so the
+    result matches searching each message from one past the previous match.
+    """
+
+    def __init__(self, log: UartLog, msgs: list, start: int = 0) -> None:
+        self.log = log
+        self.msgs = list(msgs)
+        self.index = 0
+        self.pos = start
+        self.scanned = start
+        self._automaton = PatternAutomaton(msgs)
+        self._state = 0
+        # (start position, pattern) of occurrences at or after self.pos
+        self._hits = []
+        # Absolute position of each message matched so far
+        self.found = []
+
+    @property
+    def done(self) -> bool:
+        return self.index >= len(self.msgs)
+
+    @property
+    def missing(self) -> Union[str, None]:
+        return None if self.done else self.msgs[self.index]
+
+    @property
+    def positions(self) -> list:
+        """ (msg, absolute position or None) for every message """
+        return [(msg, self.found[i] if i < len(self.found) else None)
+                for i, msg in enumerate(self.msgs)]
+
+    def update(self) -> bool:
+        end = len(self.log)
+        if not self.done and end > self.scanned:
+            self._state, hits = self._automaton.scan(self.log.text(self.scanned, end), self._state)
+            self._hits += [(self.scanned + hit_end - len(pattern), pattern)
+                           for hit_end, pattern in hits]
+        while not self.done:
+            msg = self.msgs[self.index]
+            if msg:
+                starts = [start for start, pattern in self._hits
+                          if pattern == msg and start >= self.pos]
+                if not starts:
+                    break
+                self.found.append(min(starts))
+            else:
+                # An empty message matches right at the current position
+                self.found.append(self.pos)
+            self.pos = self.found[-1] + 1
+            self.index += 1
+            pending = set(self.msgs[self.index:])
+            self._hits = [(start, pattern) for start, pattern in self._hits
+                          if start >= self.pos and pattern in pending]
+        self.scanned = end
+        return self.done
+
+
+class SerialEngine:
+    """
+    One asyncio event loop on one thread that serves every serial port of the process.
+
+    Ports are opened non-blocking and read with loop.add_reader(), writes and timers run
+    as loop callbacks and tasks. Any number of Uart and UartBinary instances share the
+    loop instead of each starting a reader thread and a watchdog Timer.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._t = threading.Thread(target=self.loop.run_forever, name="serial-engine", daemon=True)
+        self._t.start()
+        self._port_watchers = {}
+        self._port_watchers_lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> "SerialEngine":
+        """ Engine shared by the whole process, started on first use """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def in_loop(self) -> bool:
+        return threading.get_ident() == self._t.ident
+
+    def call(self, func, *args):
+        """ Run func(*args) on the loop thread and return its result """
+        if self.in_loop():
+            return func(*args)
+        fut = concurrent.futures.Future()
+
+        def run():
+            try:
+                fut.set_result(func(*args))
+            except BaseException as e:
+                fut.set_exception(e)
+
+        self.loop.call_soon_threadsafe(run)
+        return fut.result()
+
+    def run(self, coro, timeout: float = None):
+        """ Run coroutine on the loop from another thread and return its result """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def port_watcher(self, directory: str = SERIAL_BY_ID) -> PortWatcher:
+        """ Watcher of the device directory 'directory' on this loop, created on first use """
+        directory = os.path.abspath(directory)
+        with self._port_watchers_lock:
+            watcher = self._port_watchers.get(directory)
+        if watcher is not None:
+            return watcher
+        # Created without the lock, the constructor waits for the loop thread, which may
+        # be asking for a watcher itself
+        new = PortWatcher(directory, self.loop)
+        with self._port_watchers_lock:
+            watcher = self._port_watchers.setdefault(directory, new)
+        if watcher is not new:
+            new.close()
+        return watcher
+
+
+class FaultDetector:
+    """
+    Watches the log of a Uart for faults as lines arrive: assertions, fatal errors,
+    modem crashes and more than 'max_boots' boot banners within 'boot_window' seconds
+    since the last flush(). A fault interrupts the current and later waits of the Uart
+    with DeviceFault until the next flush(). All faults seen are kept in 'faults' as
+    (kind, position) tuples.
+
+    :param patterns: Dict of fault kind to literal patterns
+    """
+
+    def __init__(
+        self, uart: "Uart", patterns: dict = None, boot_patterns: list = None,
+        max_boots: int = MAX_BOOTS, boot_window: float = BOOT_WINDOW,
+    ) -> None:
+        self.uart = uart
+        self.max_boots = max_boots
+        self.boot_window = boot_window
+        patterns = FAULT_PATTERNS if patterns is None else patterns
+        self._kinds = {p: kind for kind, kind_patterns in patterns.items() for p in kind_patterns}
+        self._boot_patterns = set(BOOT_PATTERNS if boot_patterns is None else boot_patterns)
+        # Positions and receive times of the boot banners
+        self.boots = []
+        self._boot_times = []
+        self.faults = []
+        self._handle = uart.watch(list(self._kinds) + list(self._boot_patterns), self._on_hit)
+
+    def _on_hit(self, pattern: str, pos: int) -> None:
+        if pattern in self._boot_patterns:
+            t = self.uart.time_at(pos)
+            t = time.monotonic() if t is None else t
+            self.boots.append(pos)
+            self._boot_times.append(t)
+            boots = sum(1 for boot, boot_t in zip(self.boots, self._boot_times)
+                        if boot >= self.uart._log_start and boot_t >= t - self.boot_window)
+            if self.max_boots and boots > self.max_boots:
+                self._fault(f"reboot loop ({boots} boots)", pos)
+            return
+        self._fault(self._kinds[pattern], pos)
+
+    def _fault(self, kind: str, pos: int) -> None:
+        self.faults.append((kind, pos))
+        self.uart.report_fault(kind, pos)
+
+    def detach(self) -> None:
+        self.uart.unwatch(self._handle)
+
+
+class InactivityWatchdog:
+    """
+    What a Uart does when nothing has been received for 'silence' seconds, once per
+    silent period: "warn" logs a warning, "reset" runs 'reset' (e.g.
+    flash_tools.reset_device) on a worker thread and "abort" fails the current waits
+    with DeviceFault. An abort is withdrawn when output resumes before the next wait.
+
+    The overall deadline of the Uart is checked separately, a DUT that keeps talking
+    is only stopped by that.
+    """
+
+    def __init__(self, silence: float, actions: tuple = ("warn",), reset=None) -> None:
+        unknown = set(actions) - set(WATCHDOG_ACTIONS)
+        if unknown:
+            raise ValueError(f"Unknown watchdog actions {sorted(unknown)}, use {WATCHDOG_ACTIONS}")
+        if "reset" in actions and reset is None:
+            raise ValueError("Watchdog action 'reset' needs a reset function")
+        self.silence = silence
+        self.actions = tuple(actions)
+        self.reset = reset
+        # Silent periods seen
+        self.silences = 0
+
+
 class Uart:
+    # Seconds between attempts to reopen a port that went away
+    reconnect_interval = 5
+
     def __init__(
         self,
         uart: str,
         timeout: int = DEFAULT_UART_TIMEOUT,
         baudrate: int = 115200,
         name: str = "",
-        serial_timeout: int = 1,
+        log_file: str = None,
+        max_log_memory: int = None,
+        engine: SerialEngine = None,
+        rtscts: bool = False,
+        log_decoder=None,
+        watchdog: InactivityWatchdog = None,
+        rx_buffer: int = WRITE_CHUNK_MAX,
     ) -> None:
+        # 'timeout' is the overall deadline after which capturing stops, 'watchdog'
+        # acts on silence of the DUT before that
         self.baudrate = baudrate
         self.uart = uart
         self.name = name
-        self.serial_timeout = serial_timeout
-        self.log = ""
-        self.whole_log = ""
-        self._evt = threading.Event()
-        self._writeq = queue.Queue()
-        self._t = threading.Thread(target=self._uart)
-        self._t.start()
-        self._selfdestruct = threading.Timer(
-            timeout , self.selfdestruct
-        )
-        self._selfdestruct.start()
+        # Hardware flow control, write_chunked() then writes at line rate
+        self.rtscts = rtscts
+        # Receive buffer of the device in bytes, the largest chunk write_chunked() sends
+        self.rx_buffer = max(rx_buffer, WRITE_CHUNK_MIN)
+        # Effective rate in bytes per second of the last write_chunked()
+        self.write_throughput = None
+        # Turns binary log output, and text between it, into log lines, e.g.
+        # log_dictionary.DictionaryLogDecoder
+        self.log_decoder = log_decoder
+        # With log_file set the complete log is written there on stop(), and with
+        # max_log_memory also older parts of it while running
+        self.log_file = log_file
+        self._log = UartLog(max_memory=max_log_memory, spill_path=log_file)
+        # Start of the current log in self._log, moved forward by flush(), and when
+        self._log_start = 0
+        self._log_start_time = time.monotonic()
+        # Milestones of successful waits, see milestones()
+        self.timings = []
+        self._regex_matchers = {}
+        # (kind, position) reported by a FaultDetector, interrupts waits until flush()
+        self._fault = None
+        self.watchdog = watchdog
+        # time.monotonic() of the last data received
+        self.last_rx = time.monotonic()
+        self._silent = False
+        self._silence_fault = None
+        # time.monotonic() of the start of a wait that withdrew a silence fault while the
+        # DUT stayed silent, silence is measured from there
+        self._rearmed_at = 0
+        # Notified by the reader thread whenever a line is appended to the log
+        self._log_cond = threading.Condition()
+        self._log_gen = 0
+        self._watchers = LogWatchers()
+        # Callbacks run after every log update, used by the asyncio waits
+        self._listeners = set()
+        self._engine = engine or SerialEngine.get()
+        self._serial = None
+        self._pending = bytearray()
+        self._reconnect = None
+        self._reconnect_watch = None
+        self._reconnect_delay = None
+        # time.monotonic() at which the port went away
+        self._disconnected_at = None
+        # Bytes received since write_chunked() sent its current chunk, and the waiter for
+        # the chunk's echo among them
+        self._echo = None
+        self._echo_waiter = None
+        self.start(timeout)
 
-    def write(self, data: bytes) -> None:
-        chunked = False
-        self._writeq.put((data, chunked))
+    def write(self, data: bytes) -> concurrent.futures.Future:
+        """
+        Queue data for the engine loop, which sends it right away regardless of reads.
 
-    def write_chunked(self, data: bytes) -> None:
-        chunked = True
-        self._writeq.put((data, chunked))
+        :return: Future resolving to the time.monotonic() at which the data was drained
+                 to the port, or failing if the write failed or the Uart stopped
+        """
+        return self._queue_write(data, chunked=False)
 
-    def at_cmd_write(self, cmd: str) -> None:
-        start = time.time()
-        log_index = len(self.log)
-        count = 0
-        while not self._evt.is_set():
-            if count % 10 == 0:
+    def write_chunked(self, data: bytes) -> concurrent.futures.Future:
+        """
+        Like write(), but for payloads larger than the device's receive buffer. Uses
+        RTS/CTS when enabled, otherwise paces chunks by the device's echo. The effective
+        rate ends up in write_throughput. Fails with SerialException when the device
+        echoed earlier chunks but not a later one, as it then lost part of the data.
+        """
+        return self._queue_write(data, chunked=True)
+
+    def _queue_write(self, data: bytes, chunked: bool) -> concurrent.futures.Future:
+        fut = concurrent.futures.Future()
+        if self._evt.is_set():
+            fut.set_exception(RuntimeError(f"Uart {self.name} stopped"))
+        else:
+            self._engine.loop.call_soon_threadsafe(self._writeq.put_nowait, (data, chunked, fut))
+        return fut
+
+    def at_cmd(
+        self, cmd: str, timeout: float = AT_CMD_TIMEOUT,
+        resend_interval: float = AT_CMD_RESEND_INTERVAL,
+    ) -> ATResponse:
+        """
+        Send an AT command and wait for its final result code. Wakes up on every new
+        log line, the command is resent every resend_interval seconds until the device
+        answers.
+
+        :param cmd: Command, with "at " prefix when sent through the device shell
+        :return: ATResponse with the intermediate response lines and the duration
+        :raises ATError: On ERROR, +CME ERROR or +CMS ERROR
+        :raises UartLogTimeout: If no final result code arrives within timeout
+        """
+        self._withdraw_silence_fault()
+        start = time.monotonic()
+        deadline = start + timeout
+        scanned = len(self._log)
+        next_send = start
+        lines = []
+        while True:
+            gen = self._log_gen
+            now = time.monotonic()
+            if now >= next_send:
                 self.write(cmd.encode("utf-8") + b"\r\n")
-                log_index = len(self.log)
-            count += 1
-            time.sleep(0.2)
-            if "OK" in self.log[log_index:]:
-                break
-            if start + 10 < time.time():
+                next_send = now + resend_interval
+            end = len(self._log)
+            # The text starts with the newline that precedes every log line
+            for line in ANSI_ESCAPE_RE.sub("", self._log.text(scanned, end)).split("\n")[1:]:
+                m = AT_FINAL_RESULT_RE.match(line)
+                if m:
+                    response = ATResponse(cmd, m.group(1), lines, time.monotonic() - start)
+                    logger.debug(f"{self.name}: {cmd} -> {response.result} in {response.duration:.3f} s")
+                    if not response.ok:
+                        raise ATError(response)
+                    return response
+                # Skip the echo and the device's own log output
+                if line and not line.endswith(cmd) and not line.startswith("["):
+                    lines.append(line)
+            scanned = end
+            self._check_fault()
+            if self._evt.is_set():
+                raise RuntimeError(f"Uart {self.name} stopped while waiting for \"{cmd}\"")
+            if now >= deadline:
                 raise UartLogTimeout(f"AT command \"{cmd}\" timed out")
+            self._wait_for_update(gen, min(deadline, next_send) - now)
+
+    def at_cmds(self, cmds: list, timeout: float = AT_CMD_TIMEOUT) -> list:
+        """
+        Run AT commands in sequence, stopping at the first failure.
+
+        :param cmds: Commands, or (command, timeout) tuples for per-command timeouts
+        :return: List of ATResponse
+        """
+        responses = []
+        for cmd in cmds:
+            cmd, cmd_timeout = cmd if isinstance(cmd, tuple) else (cmd, timeout)
+            responses.append(self.at_cmd(cmd, timeout=cmd_timeout))
+        return responses
+
+    def at_cmd_write(self, cmd: str) -> None:
+        self.at_cmd(cmd)
 
     def xfactoryreset(self, shell = False) -> None:
-        try:
-            prefix = "at " if shell else ""
-            self.at_cmd_write(f"{prefix}AT")
-            self.at_cmd_write(f"{prefix}AT+CFUN=4")
-            self.at_cmd_write(f"{prefix}AT%XFACTORYRESET=0")
-        except UartLogTimeout:
-            logger.error("AT FACTORYRESET failed, continuing")
-
-    def _uart(self) -> None:
-        data = None
-        s = serial.Serial(
-            self.uart, baudrate=self.baudrate, timeout=self.serial_timeout
-        )
+        # Raises like at_cmd(), a test must not go on with a modem in unknown state
+        prefix = "at " if shell else ""
+        responses = self.at_cmds([f"{prefix}AT", f"{prefix}AT+CFUN=4", f"{prefix}AT%XFACTORYRESET=0"])
+        logger.info("AT FACTORYRESET done in " + ", ".join(f"{r.cmd} {r.duration:.2f} s" for r in responses))
+
+    # Port handling, these run on the engine loop
+
+    def _open(self) -> None:
+        s = serial.Serial(self.uart, baudrate=self.baudrate, timeout=0, rtscts=self.rtscts)
 
         if s.in_waiting:
             logger.warning(f"Uart {self.uart} has {s.in_waiting} bytes of unread data, resetting input buffer")
@@ -93,149 +1005,570 @@ class Uart:
             logger.warning(f"Uart {self.uart} has {s.out_waiting} bytes of unwritten data, resetting output buffer")
             s.reset_output_buffer()
 
-        line = ""
-        while not self._evt.is_set():
-            if not self._writeq.empty():
-                try:
-                    write_data, chunked = self._writeq.get_nowait()
-                    if isinstance(write_data, str):
-                        write_data = write_data.encode('utf-8')
-                    if chunked:
-                        # Write in chunks to avoid buffer overflows
-                        chunk_size = 16
-                        chunks = [write_data[i:i + chunk_size] for i in range(0, len(write_data), chunk_size)]
-                        for chunk in chunks:
-                            s.write(chunk)
-                            time.sleep(0.1)
-                    else:
-                        s.write(write_data)
-                    logger.debug(f"UART write {self.name}: {write_data}")
-                except queue.Empty:
-                    pass
+        self._serial = s
+        self._engine.loop.add_reader(s.fileno(), self._on_readable)
 
-            try:
-                read_byte = s.read(1)
-                data = read_byte.decode("utf-8")
-            except UnicodeDecodeError:
-                logger.debug(f"{self.name}: Got unexpected UART value")
-                logger.debug(f"{self.name}: Not decodeable data: {hex(ord(read_byte))}")
+    def _close_port(self) -> None:
+        if self._serial is None:
+            return
+        self._engine.loop.remove_reader(self._serial.fileno())
+        if self._writable is not None and not self._writable.done():
+            # Fails a write waiting for the port to accept more data
+            self._engine.loop.remove_writer(self._serial.fileno())
+            self._writable.set_exception(serial.serialutil.SerialException(f"{self.uart} closed"))
+        self._serial.close()
+        self._serial = None
+
+    def _on_readable(self) -> None:
+        try:
+            data = self._serial.read(READ_BLOCK_SIZE)
+        except serial.serialutil.SerialException:
+            self._on_disconnect()
+            return
+        if data:
+            self._on_data(data)
+
+    def _on_data(self, data: bytes) -> None:
+        self.last_rx = time.monotonic()
+        if self._silent:
+            self._silent = False
+            logger.info(f"{self.name}: Output resumed")
+        if self._echo is not None:
+            self._echo += data
+            if self._echo_waiter:
+                chunk, waiter = self._echo_waiter
+                if not waiter.done() and echoed(chunk, self._echo):
+                    waiter.set_result(None)
+        if self.log_decoder:
+            lines = self.log_decoder.feed(data)
+            if lines:
+                self._append_lines(lines)
+            return
+        self._feed(self._pending, data)
+
+    async def _wait_echo(self, chunk: bytes, timeout: float) -> bool:
+        # Wait until the bytes of 'chunk' show up in order among the bytes received since
+        # it was written, log output of the device may interleave with the echo
+        try:
+            if echoed(chunk, self._echo):
+                return True
+            waiter = self._engine.loop.create_future()
+            self._echo_waiter = (chunk, waiter)
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._echo = None
+            self._echo_waiter = None
+
+    def _on_disconnect(self) -> None:
+        logger.error(f"{self.name}: Caught SerialException, restarting")
+        self._disconnected_at = time.monotonic()
+        self._close_port()
+        if self._pending:
+            # Keep the partial line received before the port went away
+            self._append_line(self._pending.decode("utf-8", errors="ignore").strip())
+            self._pending.clear()
+        if self.log_decoder:
+            # A message cut off by the disconnect would swallow the first bytes received
+            # after the reconnect
+            lines = self.log_decoder.flush()
+            if lines:
+                self._append_lines(lines)
+        self._reconnect_delay = RECONNECT_RETRY_MIN
+        self._schedule_reopen()
+
+    def _schedule_reopen(self) -> None:
+        # Reopen as soon as the port reappears in its directory, with a timer as fallback
+        # for a port that is present but not ready yet
+        path = os.path.abspath(self.uart)
+        watcher = self._engine.port_watcher(os.path.dirname(path))
+        if path not in watcher.entries:
+            self._reconnect_watch = watcher.when_present(path, self._reopen)
+            delay = self.reconnect_interval
+        else:
+            delay = self._reconnect_delay
+            self._reconnect_delay = min(self._reconnect_delay * 2, self.reconnect_interval)
+        self._reconnect = self._engine.loop.call_later(delay, self._reopen)
+
+    def _cancel_reopen(self) -> None:
+        if self._reconnect:
+            self._reconnect.cancel()
+            self._reconnect = None
+        if self._reconnect_watch:
+            path = os.path.abspath(self.uart)
+            self._engine.port_watcher(os.path.dirname(path)).cancel(self._reconnect_watch)
+            self._reconnect_watch = None
+
+    def _reopen(self) -> None:
+        self._cancel_reopen()
+        if self._evt.is_set() or self._serial is not None:
+            return
+        try:
+            self._open()
+        except (FileNotFoundError, serial.serialutil.SerialException):
+            logger.warning(f"{self.uart} not available, retrying")
+            self._schedule_reopen()
+            return
+        self._log_gap(time.monotonic() - self._disconnected_at)
+
+    def _log_gap(self, gap: float) -> None:
+        # Marks the reconnect in the log, output of the DUT in between is lost
+        logger.info(f"{self.name}: Reopened {self.uart} after {gap:.3f} s")
+        self._append_line(f"--- {self.name or 'uart'}: port gone for {gap:.3f} s, output lost ---")
+
+    async def _write_loop(self) -> None:
+        # Writes are non-blocking on the engine loop, so neither reads nor other ports
+        # wait for them
+        while True:
+            write_data, chunked, fut = await self._writeq.get()
+            if isinstance(write_data, str):
+                write_data = write_data.encode('utf-8')
+            s = self._serial
+            if s is None:
+                logger.warning(f"UART write {self.name} dropped, port not open: {write_data}")
+                fut.set_exception(serial.serialutil.SerialException(f"{self.uart} not open"))
                 continue
-            except serial.serialutil.SerialException:
-                logger.error(f"{self.name}: Caught SerialException, restarting")
-                s.close()
-                while True:
-                    if self._evt.is_set():
-                        return
-                    time.sleep(5)
-                    try:
-                        s = serial.Serial(
-                            self.uart,
-                            baudrate=self.baudrate,
-                            timeout=self.serial_timeout,
-                        )
-                    except FileNotFoundError:
-                        logger.warning(f"{self.uart} not available, retrying")
-                        continue
-                    break
+            self._write_fut = fut
+            try:
+                if chunked:
+                    await self._write_paced(s, write_data)
+                else:
+                    await self._write_nonblocking(s, write_data)
+            except (serial.serialutil.SerialException, termios.error, OSError, AttributeError) as e:
+                logger.warning(f"UART write {self.name} failed: {write_data}")
+                fut.set_exception(e)
                 continue
+            finally:
+                self._write_fut = None
+            logger.debug(f"UART write {self.name}: {write_data}")
+            fut.set_result(time.monotonic())
 
-            if not data:
-                continue
+    async def _write_paced(self, s: serial.Serial, data: bytes) -> None:
+        # Write in chunks to avoid overflowing the device's receive buffer
+        start = time.monotonic()
+        if self.rtscts:
+            # The UART itself holds back data while the device deasserts CTS
+            await self._write_nonblocking(s, data)
+        pos = len(data) if self.rtscts else 0
+        echoing = False
+        while pos < len(data):
+            chunk = data[pos:pos + self._chunk_size]
+            self._echo = bytearray()
+            await self._write_nonblocking(s, chunk)
+            sent = time.monotonic()
+            # The echo needs about as long on the wire as the chunk itself
+            if await self._wait_echo(chunk, WRITE_ECHO_TIMEOUT + len(chunk) * 10 / self.baudrate):
+                echoing = True
+                self._chunk_size = min(self._chunk_size * 2, self.rx_buffer)
+            elif echoing:
+                raise serial.serialutil.SerialException(
+                    f"{self.uart}: no echo of {len(chunk)} bytes at offset {pos}, device dropped input")
+            else:
+                # No echo, at worst as slow as the fixed pacing
+                self._chunk_size = max(self._chunk_size // 2, WRITE_CHUNK_MIN)
+                await asyncio.sleep(sent + WRITE_CHUNK_GAP - time.monotonic())
+            pos += len(chunk)
+        elapsed = time.monotonic() - start
+        self.write_throughput = len(data) / elapsed if elapsed else None
+        logger.info(f"UART write {self.name}: {len(data)} bytes chunked in {elapsed:.2f} s"
+                    + (f", {self.write_throughput:.0f} B/s" if elapsed else ""))
 
-            line = line + data
-            if data != "\n":
-                continue
-            # Full line received
-            line = line.strip()
+    async def _write_nonblocking(self, s: serial.Serial, data: bytes) -> None:
+        # Write to the non-blocking port as it accepts data, then wait until the data
+        # has left the output buffer. Polled, tcdrain() would block the loop
+        loop = self._engine.loop
+        fd = s.fileno()
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(fd, view):]
+            except BlockingIOError:
+                pass
+            if not view:
+                break
+            writable = self._writable = loop.create_future()
+            loop.add_writer(fd, lambda: writable.done() or writable.set_result(None))
+            try:
+                await writable
+            finally:
+                loop.remove_writer(fd)
+                self._writable = None
+        while True:
+            queued = s.out_waiting
+            if not queued:
+                return
+            await asyncio.sleep(max(queued * 10 / self.baudrate, WRITE_DRAIN_POLL))
+
+    def _start(self, timeout: int) -> None:
+        self._writeq = asyncio.Queue()
+        self._write_fut = None
+        self._chunk_size = WRITE_CHUNK_MIN
+        self._writable = None
+        self._open()
+        self._write_task = self._engine.loop.create_task(self._write_loop())
+        self._deadline = time.monotonic() + timeout
+        self.last_rx = time.monotonic()
+        self._silent = False
+        self._watchdog_timer = self._engine.loop.call_later(WATCHDOG_INTERVAL, self._watchdog_tick)
+
+    def _stop(self) -> None:
+        if self._watchdog_timer:
+            self._watchdog_timer.cancel()
+            self._watchdog_timer = None
+        self._cancel_reopen()
+        self._write_task.cancel()
+        pending = [self._write_fut] if self._write_fut else []
+        while not self._writeq.empty():
+            pending.append(self._writeq.get_nowait()[2])
+        for fut in pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError(f"Uart {self.name} stopped"))
+        self._close_port()
+
+    def _watchdog_tick(self) -> None:
+        # Runs on the engine loop every WATCHDOG_INTERVAL seconds while capturing
+        self._watchdog_timer = None
+        now = time.monotonic()
+        if now >= self._deadline:
+            self.selfdestruct()
+            return
+        quiet = now - max(self.last_rx, self._rearmed_at)
+        if self.watchdog and not self._silent and quiet >= self.watchdog.silence:
+            self._silent = True
+            self._on_silence(quiet)
+        self._watchdog_timer = self._engine.loop.call_later(WATCHDOG_INTERVAL, self._watchdog_tick)
+
+    def _on_silence(self, quiet: float) -> None:
+        watchdog = self.watchdog
+        watchdog.silences += 1
+        if "warn" in watchdog.actions:
+            logger.warning(f"{self.name}: No output from DUT for {quiet:.0f} s")
+        if "abort" in watchdog.actions and self._fault is None:
+            self.report_fault(f"hang (no output for {quiet:.0f} s)", max(len(self._log) - 1, 0))
+            self._silence_fault = self._fault
+        if "reset" in watchdog.actions:
+            self._engine.loop.run_in_executor(None, self._reset_silent_dut)
+
+    def _reset_silent_dut(self) -> None:
+        logger.warning(f"{self.name}: Resetting silent DUT")
+        try:
+            self.watchdog.reset()
+        except Exception as e:
+            logger.error(f"{self.name}: Reset of silent DUT failed: {e}")
+
+    def _feed(self, pending: bytearray, data: bytes) -> None:
+        # Append received bytes to the partial line in 'pending' and log every full line
+        t = time.monotonic()
+        pending += data
+        end = pending.rfind(b"\n")
+        if end < 0:
+            if len(pending) < MAX_LINE_LENGTH:
+                return
+            # Runaway output without line endings, log it as is
+            end = len(pending) - 1
+        chunk = bytes(pending[:end + 1])
+        del pending[:end + 1]
+        try:
+            text = chunk.decode("utf-8")
+        except UnicodeDecodeError as e:
+            logger.debug(f"{self.name}: Got unexpected UART value")
+            logger.debug(f"{self.name}: Not decodeable data: {chunk[e.start:e.end].hex()}")
+            text = chunk.decode("utf-8", errors="ignore")
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        self._append_lines([line.strip() for line in lines], t)
+
+    def _append_line(self, line: str) -> None:
+        self._append_lines([line])
+
+    def _append_lines(self, lines: list, t: float = None) -> None:
+        t = time.monotonic() if t is None else t
+        for line in lines:
             logger.debug(f"{self.name}: {line}")
-            self.log = self.log + "\n" + line
-            self.whole_log = self.whole_log + "\n" + line
-            line = ""
-        s.close()
+        with self._log_cond:
+            for line in lines:
+                pos = len(self._log)
+                self._log.append_line(line, t)
+                self._watchers.feed("\n" + line, pos)
+            self._log_gen += 1
+            self._log_cond.notify_all()
+            for listener in list(self._listeners):
+                listener()
+
+    def watch(self, patterns: list, callback) -> int:
+        """
+        Call callback(pattern, position) for every occurrence of any of 'patterns' in
+        newly received log lines. Positions are relative to whole_log.
+
+        :return: Handle for unwatch()
+        """
+        return self._watchers.subscribe(patterns, callback)
+
+    def unwatch(self, handle: int) -> None:
+        self._watchers.unsubscribe(handle)
+
+    def _wait_for_update(self, gen: int, timeout: float) -> None:
+        # Block until a line newer than generation 'gen' is appended, a fault is
+        # reported, the thread stops or the timeout expires
+        with self._log_cond:
+            self._log_cond.wait_for(
+                lambda: self._log_gen != gen or self._fault is not None or self._evt.is_set(),
+                timeout=max(timeout, 0),
+            )
+
+    @property
+    def log(self) -> str:
+        # Log since the last flush(), joined on demand
+        return self._log.text(self._log_start)
+
+    @log.setter
+    def log(self, text: str) -> None:
+        self._log = UartLog()
+        self._log.append(text)
+        self._log_start = 0
+
+    @property
+    def whole_log(self) -> str:
+        # Everything received since the Uart was created, flush() does not affect it.
+        # This builds the complete log in memory, with max_log_memory set prefer
+        # iter_whole_log() and whole_log_find()
+        return self._log.text(0)
+
+    def iter_whole_log(self):
+        """ whole_log in pieces, streamed from log_file for the part spilled there """
+        return self._log.iter_text(0)
+
+    def whole_log_find(self, msg: str) -> int:
+        """ Position of the first 'msg' in whole_log, -1 if not found """
+        return self._log.find(msg, 0)
+
+    def time_at(self, pos: int) -> Union[float, None]:
+        """ Receive time of the line containing position 'pos' of whole_log """
+        return self._log.time_at(pos)
+
+    def lines_around(self, pos: int, before: int = 5, after: int = 5) -> str:
+        # Lines surrounding position 'pos' of whole_log
+        return self._log.lines_around(pos, before, after)
 
     def flush(self) -> None:
-        self.log = ""
+        self._log_start = len(self._log)
+        self._log_start_time = time.monotonic()
+        self._fault = None
+
+    def report_fault(self, kind: str, pos: int) -> None:
+        """ Make waits raise DeviceFault, the first fault since flush() is reported """
+        with self._log_cond:
+            if self._fault is None:
+                logger.error(f"{self.name}: DUT {kind}: {self._log.lines_around(pos, 0, 0)}")
+                self._fault = (kind, pos)
+            self._log_cond.notify_all()
+            for listener in list(self._listeners):
+                listener()
+
+    def _withdraw_silence_fault(self) -> None:
+        # Called as a wait starts: an abort for silence fails the waits running at the
+        # time, later ones get a silence window of their own
+        with self._log_cond:
+            if self._fault is not None and self._fault is self._silence_fault:
+                self._fault = None
+                if self._silent:
+                    self._rearmed_at = time.monotonic()
+                    self._silent = False
+
+    def _check_fault(self) -> None:
+        if self._fault:
+            kind, pos = self._fault
+            raise DeviceFault(kind, self.name, self.lines_around(pos))
+
+    def milestones(self, msgs: list, ordered: bool = True, since: float = None) -> list:
+        """
+        Receive times of the first occurrence of each of 'msgs' in the current log.
+
+        :param ordered: Look for each milestone after the previous one, as
+                        wait_for_str_ordered() does
+        :param since: time.monotonic() to measure from instead of the flush()
+        :return: List of (msg, seconds since flush() or 'since', seconds since the
+                 previous milestone), times are None for milestones not found
+        """
+        positions = []
+        pos = self._log_start
+        for msg in msgs:
+            found = self._log.find(msg, pos if ordered else self._log_start)
+            positions.append((msg, found if found >= 0 else None))
+            if ordered and found >= 0:
+                pos = found + 1
+        return self._milestone_times(positions, since)
+
+    def _milestone_times(self, positions: list, since: float = None) -> list:
+        # (msg, position) pairs to milestones() results
+        result = []
+        since = self._log_start_time if since is None else since
+        prev = since
+        for msg, pos in positions:
+            t = self._log.time_at(pos) if pos is not None else None
+            if t is None:
+                result.append((msg, None, None))
+                continue
+            result.append((msg, t - since, t - prev if prev is not None else None))
+            prev = t
+        return result
+
+    def _record_milestones(self, matcher: Union[StrMatcher, OrderedMatcher]) -> None:
+        # Keep the timing of every successful wait for the per-test summary, at the
+        # occurrences the wait matched
+        for msg, since_flush, delta in self._milestone_times(matcher.positions):
+            self.timings.append({"milestone": msg, "time": since_flush, "delta": delta})
 
     def selfdestruct(self):
         logger.critical(f"Uart SELFDESTRUCTED {self.name} ({self.uart})")
         self.stop()
 
     def stop(self) -> None:
-        self._selfdestruct.cancel()
         self._evt.set()
-        self._t.join()
+        self._engine.call(self._stop)
+        with self._log_cond:
+            self._log_cond.notify_all()
+            for listener in list(self._listeners):
+                listener()
+        self._log.sync()
+        self._log.close()
 
     def start(self, timeout: int = DEFAULT_UART_TIMEOUT) -> None:
-        # Start the UART thread after it has been stopped
+        # (Re)start capturing on the engine loop, also used by __init__
         self._evt = threading.Event()
-        self._writeq = queue.Queue()
-        self._t = threading.Thread(target=self._uart)
-        self._t.start()
-        self._selfdestruct = threading.Timer(timeout , self.selfdestruct)
-        self._selfdestruct.start()
+        self._engine.call(self._start, timeout)
 
     def get_size(self) -> int:
         # Return the current size of the log
-        return len(self.log)
+        return len(self._log) - self._log_start
+
+    async def wait_for(
+        self, msgs: Union[str, list], ordered: bool = False, error_msg: str = "",
+        timeout: float = DEFAULT_WAIT_FOR_STR_TIMEOUT, start_pos: int = 0,
+    ) -> int:
+        """
+        Awaitable counterpart of wait_for_str() and wait_for_str_ordered(), usable from
+        any event loop. Uses the same matchers, updated by the engine as lines arrive.
+
+        :return: Current log size
+        """
+        self._withdraw_silence_fault()
+        msgs = msgs if isinstance(msgs, (list, tuple)) else [msgs]
+        if ordered:
+            matcher = OrderedMatcher(self._log, msgs, self._log_start + start_pos)
+        else:
+            matcher = StrMatcher(self._log, msgs, self._log_start + start_pos)
+        fut = concurrent.futures.Future()
+
+        def check():
+            if fut.done():
+                return
+            if matcher.update():
+                fut.set_result(self.get_size())
+            elif self._fault:
+                kind, pos = self._fault
+                fut.set_exception(DeviceFault(kind, self.name, self.lines_around(pos)))
+            elif self._evt.is_set():
+                fut.set_exception(RuntimeError(f"Uart {self.name} stopped"))
+
+        with self._log_cond:
+            self._listeners.add(check)
+            check()
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), timeout)
+        except asyncio.TimeoutError:
+            order = " in the expected order" if ordered else ""
+            raise AssertionError(f"{matcher.missing} missing in UART log{order}. {error_msg}\n")
+        finally:
+            with self._log_cond:
+                self._listeners.discard(check)
 
     def wait_for_str_ordered(
         self, msgs: list, error_msg: str = "", timeout: int = DEFAULT_WAIT_FOR_STR_TIMEOUT
     ) -> None:
+        self._withdraw_silence_fault()
         start_t = time.time()
+        matcher = OrderedMatcher(self._log, msgs, self._log_start)
         while True:
-            missing = None
-            pos = 0
-            for msg in msgs:
-                try:
-                    pos = self.log.index(msg, pos)
-                except ValueError:
-                    missing = msg
-                    break
-                pos += 1
-            else:
+            gen = self._log_gen
+            if matcher.update():
+                self._record_milestones(matcher)
                 break
+            missing = matcher.missing
+            self._check_fault()
             if start_t + timeout < time.time():
                 raise AssertionError(
                     f"{missing if missing else msgs} missing in UART log in the expected order. {error_msg}"
                 )
             if self._evt.is_set():
                 raise RuntimeError(f"Uart thread stopped, log:\n{self.log}")
-            time.sleep(1)
+            self._wait_for_update(gen, start_t + timeout - time.time())
 
     def wait_for_str(self, msgs: Union[str, list], error_msg: str = "", timeout: int = DEFAULT_WAIT_FOR_STR_TIMEOUT, start_pos: int = 0) -> None:
+        self._withdraw_silence_fault()
         start_t = time.time()
         msgs = msgs if isinstance(msgs, (list, tuple)) else [msgs]
+        matcher = StrMatcher(self._log, msgs, self._log_start + start_pos)
 
         while True:
-            missing_msgs = [x for x in msgs if x not in self.log[start_pos:]]
-            if missing_msgs == []:
+            gen = self._log_gen
+            if matcher.update():
+                self._record_milestones(matcher)
                 return self.get_size()
+            self._check_fault()
             if start_t + timeout < time.time():
-                raise AssertionError(f"{missing_msgs} missing in UART log. {error_msg}\n")
+                raise AssertionError(f"{matcher.missing} missing in UART log. {error_msg}\n")
             if self._evt.is_set():
                 raise RuntimeError(f"Uart thread stopped, log:\n{self.log}")
-            time.sleep(1)
+            self._wait_for_update(gen, start_t + timeout - time.time())
 
     def wait_for_str_re(self, pattern: str, error_msg: str = "", timeout: int = DEFAULT_WAIT_FOR_STR_TIMEOUT, start_pos: int = 0):
+        self._withdraw_silence_fault()
         start_t = time.time()
-        regex = re.compile(pattern)
+        matcher = self._regex_matcher(pattern, start_pos)
 
         while True:
-            match = regex.search(self.log[start_pos:])
-            if match:
+            gen = self._log_gen
+            if matcher.update():
+                match = matcher.match
                 # Return the first group if groups exist, else the whole match
                 return match.groups() if match.groups() else match.group(0)
+            self._check_fault()
             if start_t + timeout < time.time():
                 raise AssertionError(f"Pattern '{pattern}' not found in UART log. {error_msg}\n")
             if self._evt.is_set():
                 raise RuntimeError(f"Uart thread stopped, log:\n{self.log}")
-            time.sleep(1)
+            self._wait_for_update(gen, start_t + timeout - time.time())
+
+    def _regex_matcher(self, pattern: Union[str, re.Pattern], start_pos: int) -> RegexMatcher:
+        # Matchers are kept per pattern and start, so repeated calls resume where the
+        # previous one stopped
+        key = (compile_regex(pattern), self._log_start + start_pos)
+        matcher = self._regex_matchers.get(key)
+        if matcher is None or matcher.log is not self._log:
+            if len(self._regex_matchers) >= 64:
+                self._regex_matchers.clear()
+            matcher = RegexMatcher(self._log, key[0], key[1])
+            self._regex_matchers[key] = matcher
+        return matcher
 
     def extract_value(self, pattern: str, start_pos: int = 0):
-        pattern = re.compile(pattern)
-        match = pattern.search(self.log[start_pos:])
-        if match:
-            return match.groups()
+        matcher = self._regex_matcher(pattern, start_pos)
+        if matcher.update():
+            return matcher.match.groups()
+        return None
+
+    def extract_dict(self, pattern: str, start_pos: int = 0) -> Union[dict, None]:
+        """
+        First match of 'pattern' in the log as a dict of its named groups, or None.
+        Like extract_value(), repeated calls only search newly received output.
+        """
+        matcher = self._regex_matcher(pattern, start_pos)
+        if matcher.update():
+            return matcher.match.groupdict()
         return None
 
     def wait_for_str_with_retries(
@@ -259,75 +1592,384 @@ class Uart:
                     logger.error(f"Failed waiting for {msgs} after {max_retries} retries")
                     raise
 
+class _GzipFrames:
+    suffix = ".gz"
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+
+    def new_frame(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def flush_block(self, frame) -> bytes:
+        return frame.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, frame) -> bytes:
+        return frame.flush(zlib.Z_FINISH)
+
+    def open_reader(self, path: str):
+        return gzip.open(path, "rb")
+
+
+class _ZstdFrames:
+    suffix = ".zst"
+
+    def __init__(self, level: int) -> None:
+        self._cctx = zstandard.ZstdCompressor(level=level)
+
+    def new_frame(self):
+        return self._cctx.compressobj()
+
+    def flush_block(self, frame) -> bytes:
+        return frame.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, frame) -> bytes:
+        return frame.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+    def open_reader(self, path: str):
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+
+
+def trace_codec(compression: str):
+    """
+    Frame codec for 'compression', given as "gzip" or "zstd" with an optional ":level"
+
+    :return: Codec object, None if compression is empty
+    """
+    if not compression:
+        return None
+    name, _, level = compression.partition(":")
+    if name == "gzip":
+        return _GzipFrames(int(level or 6))
+    if name == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd trace compression requires the zstandard package")
+        return _ZstdFrames(int(level or 3))
+    raise ValueError(f"Unknown trace compression '{compression}'")
+
+
+def open_trace(path: str, compression: str = None):
+    """ Open a trace written by TraceWriter for reading uncompressed data """
+    codec = trace_codec(compression)
+    return codec.open_reader(path) if codec else open(path, "rb")
+
+
+_trace_io = None
+_trace_io_lock = threading.Lock()
+
+
+def trace_io_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """ Single thread shared by all TraceWriters for file writes and compression """
+    global _trace_io
+    with _trace_io_lock:
+        if _trace_io is None:
+            _trace_io = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="trace-io")
+        return _trace_io
+
+
+class TraceWriter:
+    """
+    Background writer that streams captured trace data to a file.
+
+    The reader fills buffers taken from a small pool of preallocated bytearrays and
+    submits them. They are written and flushed in order on the trace I/O thread, then
+    returned to the pool, so the file holds everything captured so far even if the
+    test dies.
+
+    With 'compression' set, buffers are compressed on the trace I/O thread into
+    independent gzip members or zstd frames of about TRACE_FRAME_SIZE uncompressed
+    bytes. Every buffer is block-flushed, so a partial frame can still be decompressed
+    after a crash. The frames are listed in '<path>.frames' as
+    "offset length raw_offset raw_length" lines, so decode_trace.sh can decompress them
+    in parallel.
+
+    With 'index' set, entries passed to submit_index() are written to '<path>.index' as
+    "monotonic_time raw_offset uart_line" lines.
+    """
+
+    def __init__(
+        self, path: str, buffer_size: int = TRACE_BUFFER_SIZE, buffers: int = 4,
+        compression: str = None, index: bool = False,
+    ) -> None:
+        self.codec = trace_codec(compression)
+        self.path = path + self.codec.suffix if self.codec else path
+        self.buffer_size = buffer_size
+        # Uncompressed bytes written so far
+        self.written = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(self.path, "wb")
+        self._frames = open(self.path + ".frames", "w") if self.codec else None
+        self._index = open(self.path + ".index", "w") if index else None
+        self._frame = None
+        self._frame_offset = 0
+        self._frame_raw_offset = 0
+        self.closed = False
+        self._free = queue.Queue()
+        for _ in range(buffers):
+            self._free.put(bytearray(buffer_size))
+        self._executor = trace_io_executor()
+
+    def get_buffer(self) -> bytearray:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            # Disk is behind, grow the pool rather than block the reader
+            return bytearray(self.buffer_size)
+
+    def submit(self, buf: bytearray, length: int) -> None:
+        self._executor.submit(self._write, buf, length)
+
+    def submit_index(self, entries: list) -> None:
+        """ Queue (monotonic time, raw offset, UART log line) entries for the index """
+        self._executor.submit(self._write_index, entries)
+
+    def _write_index(self, entries: list) -> None:
+        try:
+            self._index.writelines(f"{t:.6f} {offset} {line}\n" for t, offset, line in entries)
+            self._index.flush()
+        except (OSError, ValueError) as e:
+            logger.error(f"Writing trace index {self.path}.index failed: {e}")
+
+    def drain(self) -> None:
+        """ Wait until everything submitted so far is written, ending the current frame """
+        self._executor.submit(self._finish_frame).result()
+
+    def _write(self, buf: bytearray, length: int) -> None:
+        try:
+            with memoryview(buf) as view:
+                if self.codec:
+                    self._write_compressed(view[:length])
+                else:
+                    self._file.write(view[:length])
+                    self.written += length
+            self._file.flush()
+        except (OSError, ValueError) as e:
+            logger.error(f"Writing trace {self.path} failed: {e}")
+        self._free.put(buf)
+
+    def _write_compressed(self, data: memoryview) -> None:
+        if self._frame is None:
+            self._frame = self.codec.new_frame()
+            self._frame_offset = self._file.tell()
+            self._frame_raw_offset = self.written
+        self._file.write(self._frame.compress(data))
+        self._file.write(self.codec.flush_block(self._frame))
+        self.written += len(data)
+        if self.written - self._frame_raw_offset >= TRACE_FRAME_SIZE:
+            self._finish_frame()
+
+    def _finish_frame(self) -> None:
+        if self._frame is None:
+            return
+        self._file.write(self.codec.finish(self._frame))
+        self._file.flush()
+        self._frame = None
+        offset = self._frame_offset
+        self._frames.write(f"{offset} {self._file.tell() - offset} "
+                           f"{self._frame_raw_offset} {self.written - self._frame_raw_offset}\n")
+        self._frames.flush()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.drain()
+        self._file.close()
+        if self._frames:
+            self._frames.close()
+        if self._index:
+            self._index.close()
+
+
 class UartBinary(Uart):
+    reconnect_interval = 1
+
     def __init__(
         self,
         uart: str,
         timeout: int = DEFAULT_UART_TIMEOUT,
-        serial_timeout: int = 5,
         baudrate: int = 1000000,
+        capture_file: str = None,
+        compression: str = None,
+        engine: SerialEngine = None,
+        log_uart: Uart = None,
     ) -> None:
-        self.data = b""
+        # Data is streamed to capture_file while capturing, or to a temporary file that
+        # save_to_file() copies from. 'compression' is passed to TraceWriter and adds
+        # the codec suffix to the file names.
+        # A '<capture>.index' sidecar maps receive times, and the line count of
+        # 'log_uart' when given, to offsets in the trace, see trace_index.py
+        temporary = capture_file is None
+        if temporary:
+            fd, capture_file = tempfile.mkstemp(prefix="trace_", suffix=".bin")
+            os.close(fd)
+        self.compression = compression
+        self.log_uart = log_uart
+        self._index_pending = []
+        self._index_time = 0
+        self._writer = TraceWriter(capture_file, compression=compression, index=True)
+        self.capture_file = self._writer.path
+        if temporary:
+            weakref.finalize(self, self._remove_files, capture_file, self.capture_file)
+        # Bytes captured since creation, and the count at the last flush()
+        self._captured = 0
+        self._flush_offset = 0
         super().__init__(
             uart=uart,
             timeout=timeout,
             baudrate=baudrate,
-            serial_timeout=serial_timeout,
+            engine=engine,
         )
 
-    def _uart(self) -> None:
-        s = serial.Serial(
-            self.uart, baudrate=self.baudrate, timeout=self.serial_timeout
-        )
-        if s.in_waiting:
-            logger.warning(f"Uart {self.uart} has {s.in_waiting} bytes of unread data, resetting input buffer")
-            s.reset_input_buffer()
+    def _start(self, timeout: int) -> None:
+        if self._writer.closed:
+            raise RuntimeError(f"{self.capture_file} closed, create a new UartBinary to capture again")
+        self._buf = self._writer.get_buffer()
+        self._view = memoryview(self._buf)
+        self._fill = 0
+        self._submit_timer = None
+        super()._start(timeout)
 
-        if s.out_waiting:
-            logger.warning(f"Uart {self.uart} has {s.out_waiting} bytes of unwritten data, resetting output buffer")
-            s.reset_output_buffer()
+    def _stop(self) -> None:
+        super()._stop()
+        self._submit()
 
-        while not self._evt.is_set():
-            try:
-                data = s.read(8192)
-            except serial.serialutil.SerialException:
-                logger.error("Caught SerialException, restarting")
-                s.close()
-                time.sleep(1)
-                s = serial.Serial(
-                    self.uart, baudrate=self.baudrate, timeout=self.serial_timeout
-                )
-                continue
-            if not data:
-                continue
-            self.data = self.data + data
-        s.close()
+    def _log_gap(self, gap: float) -> None:
+        # The trace itself has no room for a marker, note the gap in the UART log
+        if self.log_uart is None:
+            super()._log_gap(gap)
+            return
+        logger.info(f"{self.name}: Reopened {self.uart} after {gap:.3f} s")
+        self.log_uart._append_line(f"--- modem trace port gone for {gap:.3f} s, trace data lost ---")
+
+    def _on_readable(self) -> None:
+        try:
+            n = self._serial.readinto(self._view[self._fill:])
+        except serial.serialutil.SerialException:
+            self._on_disconnect()
+            return
+        if not n:
+            return
+        now = time.monotonic()
+        if now - self._index_time >= TRACE_INDEX_INTERVAL:
+            # Data from this offset on arrived at 'now', after that many log lines
+            self._index_time = now
+            line = self.log_uart._log.line_count() if self.log_uart else -1
+            self._index_pending.append((now, self._captured, line))
+        self._fill += n
+        self._captured += n
+        if self._fill == len(self._buf):
+            self._submit()
+        elif self._submit_timer is None:
+            # Get data to disk within TRACE_FLUSH_INTERVAL even when the buffer fills slowly
+            self._submit_timer = self._engine.loop.call_later(TRACE_FLUSH_INTERVAL, self._submit)
+
+    def _submit(self) -> None:
+        if self._submit_timer:
+            self._submit_timer.cancel()
+            self._submit_timer = None
+        if not self._fill:
+            return
+        self._view.release()
+        self._writer.submit(self._buf, self._fill)
+        if self._index_pending:
+            self._writer.submit_index(self._index_pending)
+            self._index_pending = []
+        self._buf = self._writer.get_buffer()
+        self._view = memoryview(self._buf)
+        self._fill = 0
+
+    def stop(self) -> None:
+        super().stop()
+        self._writer.close()
+
+    @staticmethod
+    def _remove_files(*paths) -> None:
+        for path in set(paths):
+            for name in [path, path + ".frames", path + ".index"]:
+                if os.path.exists(name):
+                    os.remove(name)
+
+    def _open_capture(self):
+        # Uncompressed capture data from the last flush()
+        f = open_trace(self.capture_file, self.compression)
+        if self.compression:
+            remaining = self._flush_offset
+            while remaining:
+                remaining -= len(f.read(min(remaining, TRACE_BUFFER_SIZE)))
+        else:
+            f.seek(self._flush_offset)
+        return f
+
+    @property
+    def data(self) -> bytes:
+        # Trace data since the last flush(), read back from the capture file
+        with self._open_capture() as f:
+            return f.read()
 
     def flush(self) -> None:
-        self.data = b""
+        self._flush_offset = self._captured
 
     def save_to_file(self, filename: str) -> None:
-        if len(self.data) == 0:
+        # Saves data captured since the last flush(), call after stop(). With compression
+        # the codec suffix is added to 'filename'
+        codec = self._writer.codec
+        if codec:
+            filename += codec.suffix
+        same_file = os.path.abspath(filename) == os.path.abspath(self.capture_file)
+        if self.get_size() == 0:
             logger.warning("No trace data to save")
+            if same_file:
+                self._writer.close()
+                self._remove_files(filename)
             return
-        with open(filename, "wb" ) as f:
-            f.write(self.data)
+        if same_file and self._flush_offset == 0:
+            return
+        # Written under temporary names and moved in place, so that saving over
+        # capture_file does not truncate what is being read
+        if not codec:
+            tmp = filename + ".saving"
+            with self._open_capture() as src, open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst, TRACE_BUFFER_SIZE)
+            sidecars = [".index"]
+        else:
+            # Recompress the part after flush() into frames of its own
+            writer = TraceWriter(filename[:-len(codec.suffix)] + ".saving", compression=self.compression)
+            tmp = writer.path
+            with self._open_capture() as src:
+                while True:
+                    buf = writer.get_buffer()
+                    length = src.readinto(buf)
+                    if not length:
+                        break
+                    writer.submit(buf, length)
+            writer.close()
+            sidecars = [".frames", ".index"]
+        self._save_index(tmp + ".index")
+        for suffix in sidecars:
+            os.replace(tmp + suffix, filename + suffix)
+        os.replace(tmp, filename)
+        if same_file:
+            self._captured -= self._flush_offset
+            self._flush_offset = 0
+
+    def _save_index(self, path: str) -> None:
+        # Index entries from the last flush() on, with offsets relative to it
+        with open(self.capture_file + ".index") as src, open(path, "w") as dst:
+            for entry in src:
+                t, offset, line = entry.split()
+                if int(offset) >= self._flush_offset:
+                    dst.write(f"{t} {int(offset) - self._flush_offset} {line}\n")
 
     def get_size(self) -> int:
-        return len(self.data)
+        return self._captured - self._flush_offset
 
 def wait_until_uart_available(name, timeout_seconds=60):
-    base_path = "/dev/serial/by-id"
-    while timeout_seconds > 0:
-        try:
-            serial_paths = [os.path.join(base_path, entry) for entry in os.listdir(base_path)]
-            for path in sorted(serial_paths):
-                if name in path:
-                    logger.info(f"UART found: {path}")
-                    return path
-        except (FileNotFoundError, PermissionError) as e:
-            logger.info(f"Uart not available yet (error: {e}), retrying...")
-        time.sleep(1)
-        timeout_seconds -= 1
-    logger.error(f"UART '{name}' not found within {timeout_seconds} seconds")
-    return None
+    path = SerialEngine.get().port_watcher(SERIAL_BY_ID).wait_for(name, timeout_seconds)
+    if path:
+        logger.info(f"UART found: {path}")
+    else:
+        logger.error(f"UART '{name}' not found within {timeout_seconds} seconds")
+    return path
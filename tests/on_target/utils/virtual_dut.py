@@ -0,0 +1,241 @@
+##########################################################################################
+# Copyright (c) 2025 Nordic Semiconductor
+# SPDX-License-Identifier: LicenseRef-Nordic-5-Clause
+##########################################################################################
+
+import argparse
+import os
+import pty
+import re
+import select
+import sys
+import tempfile
+import threading
+import time
+import tty
+from typing import Union
+sys.path.append(os.getcwd())
+from utils.logger import get_logger
+
+logger = get_logger()
+
+# Zephyr log timestamp, [hh:mm:ss.mmm,uuu]
+LOG_TIMESTAMP_RE = re.compile(r"^\[(\d+):(\d+):(\d+)\.(\d+),(\d+)\]")
+# Responses of a freshly reset modem, commands are matched without the "at " shell prefix
+DEFAULT_AT_RESPONSES = {
+    "AT": ["OK"],
+    "AT+CFUN=0": ["OK"],
+    "AT+CFUN=1": ["OK"],
+    "AT+CFUN=4": ["OK"],
+    "AT+CFUN?": ["+CFUN: 4", "OK"],
+    "AT%XFACTORYRESET=0": ["OK"],
+    "AT+CGMR": ["mfw_nrf91x1_2.0.2", "OK"],
+    "AT+CGSN=1": ["+CGSN: \"351358815340515\"", "OK"],
+}
+
+
+def log_timestamp(line: str) -> Union[float, None]:
+    """ Seconds since boot from a Zephyr log line, None for lines without a timestamp """
+    m = LOG_TIMESTAMP_RE.match(line)
+    if not m:
+        return None
+    h, mins, s, ms, us = (int(x) for x in m.groups())
+    return h * 3600 + mins * 60 + s + ms / 1000 + us / 1000000
+
+
+class VirtualDUT:
+    """
+    Device under test simulated on a pseudo-terminal, for exercising Uart and UartBinary
+    without hardware.
+
+    replay_log() plays back a recorded UART log, by default with the timing of its Zephyr
+    timestamps scaled by 'speed'. replay_binary() streams a trace. Output is paced at
+    'baudrate' with 10 bits per byte. Lines written to the DUT are echoed, and AT
+    commands get the responses in 'at_responses' or ERROR.
+
+    'port' is a symlink to the current pty. unplug() and plug() replace the pty behind it,
+    like a USB serial device that re-enumerates.
+    """
+
+    def __init__(
+        self, baudrate: int = 115200, speed: float = 1.0, at_responses: dict = None,
+        echo: bool = True,
+    ) -> None:
+        self.baudrate = baudrate
+        self.speed = speed
+        self.at_responses = dict(DEFAULT_AT_RESPONSES if at_responses is None else at_responses)
+        self.echo = echo
+        # Commands received, without line endings
+        self.received = []
+        self._dir = tempfile.mkdtemp(prefix="vdut_")
+        self.port = os.path.join(self._dir, "ttyDUT")
+        self._master = None
+        self._slave = None
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._replays = []
+        self.plug()
+        self._reader = threading.Thread(target=self._serve_input, name="vdut-input", daemon=True)
+        self._reader.start()
+
+    def __enter__(self) -> "VirtualDUT":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def plug(self) -> None:
+        master, slave = pty.openpty()
+        tty.setraw(slave)
+        tmp_link = self.port + ".new"
+        os.symlink(os.ttyname(slave), tmp_link)
+        os.replace(tmp_link, self.port)
+        self._master, self._slave = master, slave
+
+    def unplug(self) -> None:
+        """ Remove the port, readers get an error like on a USB disconnect """
+        with self._write_lock:
+            master, slave = self._master, self._slave
+            self._master = self._slave = None
+        if os.path.lexists(self.port):
+            os.remove(self.port)
+        if master is not None:
+            os.close(master)
+            os.close(slave)
+
+    def write(self, data: bytes) -> None:
+        # Paced at baudrate, data written while unplugged is lost
+        pos = 0
+        step = max(self.baudrate // 10 // 100, 1)
+        while pos < len(data) and not self._stop.is_set():
+            chunk = data[pos:pos + step]
+            with self._write_lock:
+                if self._master is not None:
+                    try:
+                        os.write(self._master, chunk)
+                    except OSError:
+                        pass
+            pos += len(chunk)
+            time.sleep(len(chunk) * 10 / self.baudrate)
+
+    def write_line(self, line: str) -> None:
+        self.write(line.encode("utf-8") + b"\r\n")
+
+    def replay_log(
+        self, log: str, line_interval: float = None, wait: bool = False
+    ) -> threading.Thread:
+        """
+        Play back 'log', the text or the path of a recorded UART log.
+
+        :param line_interval: Fixed seconds between lines instead of the log's timestamps
+        :param wait: Return only when the replay is done
+        """
+        if os.path.isfile(log):
+            with open(log, encoding="utf-8") as f:
+                log = f.read()
+        return self._start_replay(self._replay_lines, log.splitlines(), line_interval, wait=wait)
+
+    def replay_binary(self, data: Union[bytes, str], wait: bool = False) -> threading.Thread:
+        """ Stream 'data', bytes or the path of a .bin trace, at baudrate """
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                data = f.read()
+        return self._start_replay(self.write, data, wait=wait)
+
+    def _start_replay(self, target, *args, wait: bool = False) -> threading.Thread:
+        t = threading.Thread(target=target, args=args, name="vdut-replay", daemon=True)
+        self._replays.append(t)
+        t.start()
+        if wait:
+            t.join()
+        return t
+
+    def _replay_lines(self, lines: list, line_interval: float) -> None:
+        start = time.monotonic()
+        first = None
+        for line in lines:
+            if self._stop.is_set():
+                return
+            if line_interval is not None:
+                time.sleep(line_interval)
+            else:
+                stamp = log_timestamp(line)
+                if stamp is not None:
+                    first = stamp if first is None else first
+                    delay = start + (stamp - first) / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+            self.write_line(line)
+
+    def wait_replays(self, timeout: float = None) -> None:
+        for t in self._replays:
+            t.join(timeout)
+
+    def _serve_input(self) -> None:
+        line = b""
+        while not self._stop.is_set():
+            master = self._master
+            if master is None:
+                time.sleep(0.05)
+                continue
+            try:
+                if not select.select([master], [], [], 0.1)[0]:
+                    continue
+                data = os.read(master, 1024)
+            except (OSError, ValueError):
+                # Unplugged meanwhile
+                continue
+            if self.echo:
+                self.write(data)
+            line += data
+            while b"\n" in line or b"\r" in line:
+                end = min(i for i in (line.find(b"\r"), line.find(b"\n")) if i >= 0)
+                cmd, line = line[:end].decode("utf-8", errors="ignore").strip(), line[end + 1:]
+                if cmd:
+                    self._handle(cmd)
+
+    def _handle(self, cmd: str) -> None:
+        self.received.append(cmd)
+        if cmd.lower().startswith("at "):
+            # Device shell "at" command
+            cmd = cmd[3:].strip()
+        if not cmd.upper().startswith("AT"):
+            return
+        response = self.at_responses.get(cmd, ["ERROR"])
+        if callable(response):
+            response = response(cmd)
+        for line in response:
+            self.write_line(line)
+
+    def close(self) -> None:
+        self._stop.set()
+        self.wait_replays(1)
+        self._reader.join(1)
+        self.unplug()
+        os.rmdir(self._dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a recorded UART log or trace on a pty")
+    parser.add_argument("--log", help="UART log to replay")
+    parser.add_argument("--bin", help="Binary trace to replay")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor")
+    parser.add_argument("--line-interval", type=float, help="Fixed seconds between log lines")
+    args = parser.parse_args()
+
+    with VirtualDUT(baudrate=args.baudrate, speed=args.speed) as dut:
+        logger.info(f"Virtual DUT on {dut.port}, press Ctrl-C to stop")
+        try:
+            if args.log:
+                dut.replay_log(args.log, args.line_interval)
+            if args.bin:
+                dut.replay_binary(args.bin)
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()